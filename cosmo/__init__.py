@@ -4,6 +4,16 @@ SETTINGS = {
     'filesystem': {'source': os.environ['COSMO_FILES_SOURCE']},
     'output': os.environ['COSMO_OUTPUT'],
     'dark_programs': os.environ['DARK_PROGRAMS'],
+    'solar': {
+        'url': os.environ.get(
+            'COSMO_SOLAR_URL', 'https://services.swpc.noaa.gov/json/solar-cycle/observed-solar-cycle-indices.json'
+        ),
+        'cache': os.environ.get(
+            'COSMO_SOLAR_CACHE', os.path.join(os.environ['COSMO_OUTPUT'], 'noaa_solar_indices.json')
+        ),
+        'ttl': float(os.environ.get('COSMO_SOLAR_TTL', 24)),  # hours
+        'offline': os.environ.get('COSMO_SOLAR_OFFLINE', '0').lower() in ('1', 'true', 'yes')
+    },
     'sms': {
         'source': os.environ['COSMO_SMS_SOURCE'],
         'db_settings': {
@@ -6,8 +6,11 @@ import warnings
 import abc
 
 from glob import glob
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from dask.multiprocessing import get_context
 from astropy.io import fits
-from typing import Sequence, Union, List, Dict, Any
+from typing import Sequence, Union, List, Dict, Any, Iterator, Callable
 
 from . import SETTINGS
 
@@ -352,46 +355,140 @@ def get_jitter_data(jitter_file: str, primary_header_keys: Sequence[str] = None,
     return jit
 
 
+def reduce_file(filename: str, get_data: Callable[[str], Any], reducer: Callable[[Any], Any] = None) -> Any:
+    """Get the data from a file and reduce it. The reducer receives what get_data returns for the file and returns what
+    should be kept (or None to drop the file).
+    """
+    result = get_data(filename)
+
+    if result is None or reducer is None:
+        return result
+
+    return reducer(result)
+
+
+def batches(items: List[Any], batch_size: int) -> List[List[Any]]:
+    """Split a list into consecutive batches of at most batch_size items."""
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def iter_computed(tasks: List[Any], chunksize: int) -> Iterator[Any]:
+    """Compute dask delayed tasks with the multiprocessing scheduler chunksize tasks at a time, yielding the results of
+    each chunk (in order) while the next chunk is being computed. The chunks share a single process pool.
+    """
+    chunks = batches(tasks, chunksize)
+
+    if not chunks:
+        return
+
+    with get_context().Pool() as pool, ThreadPoolExecutor(max_workers=1) as prefetch:
+        compute = partial(dask.compute, scheduler='multiprocessing', pool=pool)
+        pending = prefetch.submit(compute, *chunks[0])
+
+        for chunk in chunks[1:]:
+            results = pending.result()
+            pending = prefetch.submit(compute, *chunk)
+
+            yield from (item for item in results if item is not None)
+
+        yield from (item for item in pending.result() if item is not None)
+
+
 def data_from_exposures(fitsfiles: List[str], header_request: REQUEST = None, table_request: REQUEST = None,
                         header_defaults: Dict[str, Any] = None, spt_header_request: REQUEST = None,
                         spt_table_request: REQUEST = None, spt_header_defaults: Dict[str, Any] = None,
-                        reference_request: Dict[str, Dict[str, Union[Sequence[str], REQUEST]]] = None):
-    """Get requested data from COS files and their corresponding reference files in parallel."""
-    delayed_results = [
-        dask.delayed(get_exposure_data)(
-            file,
-            header_request,
-            table_request,
-            header_defaults,
-            spt_header_request,
-            spt_table_request,
-            spt_header_defaults,
-            reference_request
-        ) for file in fitsfiles
-    ]
+                        reference_request: Dict[str, Dict[str, Union[Sequence[str], REQUEST]]] = None,
+                        reducer: Callable[[FileData], Any] = None):
+    """Get requested data from COS files and their corresponding reference files in parallel.
+
+    Optionally, the results can be reduced inside of the worker processes so that only what is kept is returned: the
+    reducer is applied to each file's data (returning None drops the file).
+    """
+    get_data = partial(
+        get_exposure_data,
+        header_request=header_request,
+        table_request=table_request,
+        header_defaults=header_defaults,
+        spt_header_request=spt_header_request,
+        spt_table_request=spt_table_request,
+        spt_header_defaults=spt_header_defaults,
+        reference_request=reference_request
+    )
+
+    delayed_results = [dask.delayed(reduce_file)(file, get_data, reducer) for file in fitsfiles]
 
     return [item for item in dask.compute(*delayed_results, scheduler='multiprocessing') if item is not None]
 
 
+def iter_data_from_exposures(fitsfiles: List[str], header_request: REQUEST = None, table_request: REQUEST = None,
+                             header_defaults: Dict[str, Any] = None, spt_header_request: REQUEST = None,
+                             spt_table_request: REQUEST = None, spt_header_defaults: Dict[str, Any] = None,
+                             reference_request: Dict[str, Dict[str, Union[Sequence[str], REQUEST]]] = None,
+                             chunksize: int = 256, reducer: Callable[[FileData], Any] = None) -> Iterator[FileData]:
+    """Get requested data from COS files and their corresponding reference files in parallel, yielding the results of
+    each chunk of chunksize files as soon as the chunk has been read. Results can be consumed (e.g. ingested) while the
+    next chunk is still being read. As with data_from_exposures, a reducer can be applied in the worker processes.
+    """
+    get_data = partial(
+        get_exposure_data,
+        header_request=header_request,
+        table_request=table_request,
+        header_defaults=header_defaults,
+        spt_header_request=spt_header_request,
+        spt_table_request=spt_table_request,
+        spt_header_defaults=spt_header_defaults,
+        reference_request=reference_request
+    )
+
+    yield from iter_computed([dask.delayed(reduce_file)(file, get_data, reducer) for file in fitsfiles], chunksize)
+
+
 def data_from_jitters(jitter_files: List[str], primary_header_keys: Sequence[str] = None,
                       ext_header_keys: Sequence[str] = None, table_keys: Sequence[str] = None,
-                      get_expstart: bool = True, reduce_to_stats: Dict[str, Sequence[str]] = None):
+                      get_expstart: bool = True, reduce_to_stats: Dict[str, Sequence[str]] = None,
+                      reducer: Callable[[List[dict]], List[dict]] = None):
     """Get data from COS Jitter Files in parallel. Optionally get a corresponding EXPSTART and reduce specified data
     keys to a representative statistic instead of returning the entire array.
+
+    As with data_from_exposures, a reducer can be applied inside of the worker processes. The reducer receives the list
+    of extension data for a file.
     """
-    delayed_results = [
-        dask.delayed(get_jitter_data)(
-            jitter_file,
-            primary_header_keys,
-            ext_header_keys,
-            table_keys,
-            get_expstart,
-            reduce_to_stats
-        ) for jitter_file in jitter_files
-    ]
+    get_data = partial(
+        get_jitter_data,
+        primary_header_keys=primary_header_keys,
+        ext_header_keys=ext_header_keys,
+        table_keys=table_keys,
+        get_expstart=get_expstart,
+        reduce_to_stats=reduce_to_stats
+    )
+
+    delayed_results = [dask.delayed(reduce_file)(jitter_file, get_data, reducer) for jitter_file in jitter_files]
 
     # Each jitter file will result in a list; need to unpack that list
     return [
         item for sublist in dask.compute(*delayed_results, scheduler='multiprocessing') if sublist is not None
         for item in sublist
     ]
+
+
+def iter_data_from_jitters(jitter_files: List[str], primary_header_keys: Sequence[str] = None,
+                           ext_header_keys: Sequence[str] = None, table_keys: Sequence[str] = None,
+                           get_expstart: bool = True, reduce_to_stats: Dict[str, Sequence[str]] = None,
+                           chunksize: int = 256, reducer: Callable[[List[dict]], List[dict]] = None) -> Iterator[dict]:
+    """Get data from COS Jitter Files in parallel, yielding each extension's data as soon as its chunk of chunksize
+    files has been read. As with data_from_jitters, a reducer can be applied in the worker processes.
+    """
+    get_data = partial(
+        get_jitter_data,
+        primary_header_keys=primary_header_keys,
+        ext_header_keys=ext_header_keys,
+        table_keys=table_keys,
+        get_expstart=get_expstart,
+        reduce_to_stats=reduce_to_stats
+    )
+
+    # Each jitter file results in a list; need to unpack that list
+    tasks = [dask.delayed(reduce_file)(jitter_file, get_data, reducer) for jitter_file in jitter_files]
+
+    for sublist in iter_computed(tasks, chunksize):
+        yield from sublist
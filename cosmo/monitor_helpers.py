@@ -1,23 +1,80 @@
 import pandas as pd
 import numpy as np
 import datetime
+import json
 
-from itertools import repeat
+from functools import lru_cache
+from itertools import repeat, chain
 from astropy.time import Time, TimeDelta
-from typing import Union, Tuple, Sequence, List
+from peewee import Model, chunked
+from typing import Union, Tuple, Sequence, List, Dict, NamedTuple, Type
 
+SQLITE_MAX_VARIABLES = 999  # Maximum number of bound parameters per statement for older SQLite builds
 
+
+def day_of_year_to_datetime(date: Union[float, str, datetime.datetime]) -> datetime.datetime:
+    """Convert day of the year (defined as yyyy.ddd where ddd is the day number of that year) to a datetime. Datetimes
+    are returned as-is.
+    """
+    if isinstance(date, datetime.datetime):
+        return date
+
+    return datetime.datetime.strptime(f'{date:.3f}' if isinstance(date, float) else date, '%Y.%j')
+
+
+@lru_cache(maxsize=None)
 def convert_day_of_year(date: Union[float, str]) -> Time:
     """Convert day of the year (defined as yyyy.ddd where ddd is the day number of that year) to an astropy Time object.
-    Some important dates for the COS team were recorded in this format.
-    """
-    return Time(
-         datetime.datetime.strptime(
-             f'{date:.3f}' if isinstance(date, float) else date,
-             '%Y.%j'
-         ),
-         format='datetime'
-    )
+    Some important dates for the COS team were recorded in this format. Results are cached, so the returned Time should
+    not be modified.
+    """
+    return Time(day_of_year_to_datetime(date), format='datetime')
+
+
+class EventCalendar:
+    """Table of named event dates and, optionally, groups of breakpoint intervals ("epochs") between dates. Dates can
+    be given as yyyy.ddd values or datetimes, and are converted once, when the calendar is created.
+
+    :param events: Event name -> date.
+    :param breakpoints: Group name -> list of (start, end) dates for each epoch. None is used for an open start or end.
+    """
+
+    def __init__(self, events: Dict[str, Union[float, str, datetime.datetime]],
+                 breakpoints: Dict[str, List[tuple]] = None):
+        self.names = list(events)
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+        self.datetimes = [day_of_year_to_datetime(date) for date in events.values()]
+        times = Time(self.datetimes, format='datetime') if self.datetimes else None
+
+        self.mjd = times.mjd if times is not None else np.array([])
+        self.byear = times.byear if times is not None else np.array([])
+        self.datetime64 = np.array(self.datetimes, dtype='datetime64[ns]')
+
+        self.epochs = {
+            group: (
+                np.array([-np.inf if start is None else convert_day_of_year(start).mjd for start, _ in intervals]),
+                np.array([np.inf if end is None else convert_day_of_year(end).mjd for _, end in intervals])
+            ) for group, intervals in (breakpoints or {}).items()
+        }
+
+    def mjd_of(self, name: str) -> float:
+        return self.mjd[self._index[name]]
+
+    def datetime_of(self, name: str) -> datetime.datetime:
+        return self.datetimes[self._index[name]]
+
+    def assign_epochs(self, group: str, mjd: Sequence) -> np.ndarray:
+        """Label each time (mjd) with the index of the group's epoch that contains it, or -1 if no epoch does. Epoch
+        starts must be in order.
+        """
+        mjd = np.asarray(mjd, dtype=float)
+        starts, ends = self.epochs[group]
+
+        epoch = np.searchsorted(starts, mjd, side='right') - 1
+        inside = (epoch >= 0) & (mjd <= ends[epoch.clip(0)])
+
+        return np.where(inside, epoch, -1)
 
 
 def fit_line(x: Sequence, y: Sequence) -> Tuple[np.poly1d, np.ndarray]:
@@ -27,28 +84,459 @@ def fit_line(x: Sequence, y: Sequence) -> Tuple[np.poly1d, np.ndarray]:
     return fit, fit(x)
 
 
-def explode_df(df: pd.DataFrame, list_keywords: list) -> pd.DataFrame:
+class LineFit(NamedTuple):
+    """Results of fit_lines. For whole-group fits, slope and intercept are Series indexed by the group labels. For
+    windowed fits, they have one value per point (the fit over the window that ends at that point).
+    """
+    slope: Union[pd.Series, np.ndarray]
+    intercept: Union[pd.Series, np.ndarray]
+    line: np.ndarray  # Fitted value at each point
+
+
+def fit_lines(x: Sequence, y: Sequence, groups: Sequence = None, weights: Sequence = None,
+              window: Union[str, int] = None) -> LineFit:
+    """Fit lines to y vs x for every group at once with (weighted) least squares. The fits are computed in closed form
+    from per-group sums (via np.bincount), rather than by fitting each group separately.
+
+    :param groups: Group label for each point. All points are treated as a single group if not given.
+    :param weights: Weight for each point. Points are equally weighted if not given.
+    :param window: None to fit each group as a whole, 'expanding' to fit each point with all of the points up to it in
+        its group, or a number of points for a rolling fit. Points are taken in the order that they're given.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    weights = np.ones_like(x) if weights is None else np.asarray(weights, dtype=float)
+
+    if groups is None:
+        codes, labels = np.zeros(len(x), dtype=int), pd.Index([0])
+
+    else:
+        codes, labels = pd.factorize(np.asarray(groups))
+
+    n_groups = len(labels)
+
+    # Center the values on the (weighted) group means to keep the sums well-conditioned (x can be in years)
+    sum_weights = np.bincount(codes, weights, n_groups)
+    group_x0 = np.bincount(codes, weights * x, n_groups) / sum_weights
+    group_y0 = np.bincount(codes, weights * y, n_groups) / sum_weights
+    x0, y0 = group_x0[codes], group_y0[codes]
+    dx, dy = x - x0, y - y0
+
+    terms = np.vstack([weights, weights * dx, weights * dy, weights * dx * dx, weights * dx * dy])
+
+    if window is None:
+        sums = np.vstack([np.bincount(codes, term, n_groups) for term in terms])
+
+    else:
+        # Cumulative sums over the points of each group (in order), differenced at the start of each window
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        position = np.arange(len(x))
+
+        cumulative = np.hstack([np.zeros((len(terms), 1)), np.cumsum(terms[:, order], axis=1)])
+
+        start = np.searchsorted(sorted_codes, sorted_codes, side='left')  # Position of the first point in the group
+        if window != 'expanding':
+            start = np.maximum(start, position - int(window) + 1)
+
+        sums = np.empty_like(terms)
+        sums[:, order] = cumulative[:, position + 1] - cumulative[:, start]
+
+    sw, sx, sy, sxx, sxy = sums
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = sw * sxx - sx ** 2
+
+        # Groups (or windows) with a single x value have no fit; the denominator is 0 to within rounding
+        denominator[denominator <= 1e-12 * sw * sxx] = np.nan
+
+        slope = (sw * sxy - sx * sy) / denominator
+        offset = (sy - slope * sx) / sw  # Intercept for the centered values
+
+        if window is None:
+            intercept = group_y0 + offset - slope * group_x0
+            line = y0 + offset[codes] + slope[codes] * dx
+
+            return LineFit(pd.Series(slope, index=labels), pd.Series(intercept, index=labels), line)
+
+        return LineFit(slope, y0 + offset - slope * x0, y0 + offset + slope * dx)
+
+
+class RaggedArray:
+    """Rows of different lengths stored as one flat array of values, with the start and stop position of each row.
+    Operations on every row (like dropping the first element of each row) are done with the positions and the flat
+    values rather than row by row. Rows are views of the values where possible.
+    """
+
+    def __init__(self, values: np.ndarray, starts: np.ndarray, stops: np.ndarray):
+        self.values = values
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, arrays: Sequence[Sequence], lengths: Sequence[int] = None) -> 'RaggedArray':
+        """Create a RaggedArray from a sequence of arrays (for example, an object-dtype column)."""
+        lengths = np.array([len(array) for array in arrays] if lengths is None else lengths, dtype=np.int64)
+        stops = np.cumsum(lengths)
+
+        values = np.concatenate([np.asarray(array) for array in arrays]) if stops.size and stops[-1] else np.array([])
+
+        return cls(values, stops - lengths, stops)
+
+    @classmethod
+    def from_json(cls, strings: Sequence[str]) -> 'RaggedArray':
+        """Create a RaggedArray from JSON array strings (how arrays are stored in the database) with a single parse."""
+        rows = json.loads(f'[{",".join(strings)}]')
+        lengths = np.array([len(row) for row in rows], dtype=np.int64)
+        stops = np.cumsum(lengths)
+
+        return cls(np.array(list(chain.from_iterable(rows))), stops - lengths, stops)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        return self.values[self.starts[row]:self.stops[row]]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.stops - self.starts
+
+    @property
+    def row_ids(self) -> np.ndarray:
+        """Row number of each element of flat."""
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    @property
+    def flat(self) -> np.ndarray:
+        """Values of all rows, in order. This is a view of the values if the rows are contiguous."""
+        if not len(self):
+            return self.values[:0]
+
+        if np.array_equal(self.starts[1:], self.stops[:-1]):
+            return self.values[self.starts[0]:self.stops[-1]]
+
+        # Position of each element: the start of its row plus its position in the row
+        lengths = self.lengths
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        return self.values[np.repeat(self.starts, lengths) + offsets]
+
+    def first(self) -> np.ndarray:
+        """The first element of each row. Raises a ValueError if any row is empty."""
+        if not (self.stops > self.starts).all():
+            raise ValueError('Rows without any elements do not have a first element.')
+
+        return self.values[self.starts]
+
+    def drop_first(self, n: int = 1) -> 'RaggedArray':
+        """Drop the first n elements of each row (without copying the values)."""
+        return RaggedArray(self.values, np.minimum(self.starts + n, self.stops), self.stops)
+
+    def subtract_first(self) -> 'RaggedArray':
+        """Subtract the first element of each row from all of the elements of the row."""
+        lengths = self.lengths
+        stops = np.cumsum(lengths)
+        nonempty = lengths > 0  # Empty rows don't have anything to subtract from
+
+        firsts = self.values[self.starts[nonempty]]
+
+        return RaggedArray(self.flat - np.repeat(firsts, lengths[nonempty]), stops - lengths, stops)
+
+    def match(self, keys: 'RaggedArray', rows: Sequence[int], targets: Sequence, default: float = np.nan
+              ) -> np.ndarray:
+        """Look up elements by key: for each row number and target, the element at the (first) position where the same
+        row of keys is equal to the target. Rows where keys and values aren't the same length (for example, reference
+        files that don't have the values column) and targets that aren't found get default.
+        """
+        matched = self.lengths == keys.lengths
+        keys = RaggedArray(keys.values, keys.starts[matched], keys.stops[matched])
+        values = RaggedArray(self.values, self.starts[matched], self.stops[matched])
+
+        table = pd.MultiIndex.from_arrays([np.flatnonzero(matched)[keys.row_ids], keys.flat])
+        unique = ~table.duplicated()
+
+        positions = table[unique].get_indexer(pd.MultiIndex.from_arrays([np.asarray(rows), np.asarray(targets)]))
+
+        # Not found (-1) is the default at the end
+        return np.append(values.flat[unique], default)[positions]
+
+    def to_series(self, index: pd.Index = None) -> pd.Series:
+        """Convert to an object-dtype Series with one array (view) per row."""
+        rows = np.empty(len(self), dtype=object)
+
+        for i in range(len(self)):
+            rows[i] = self[i]
+
+        return pd.Series(rows, index=index)
+
+
+class QuantileSketch:
+    """Mergeable sketch of the distribution of non-negative values with constant memory. Values are counted in
+    logarithmic buckets (as in DDSketch) so that quantiles have a relative error of at most alpha, and the count, mean,
+    variance, min and max are kept exactly. Values at or below zero_threshold are counted as zero.
+    """
+
+    def __init__(self, alpha: float = 0.01, zero_threshold: float = 1e-12):
+        self.alpha = alpha
+        self.zero_threshold = zero_threshold
+        self.gamma = (1 + alpha) / (1 - alpha)
+
+        self.keys = np.array([], dtype=np.int64)
+        self.counts = np.array([], dtype=np.int64)
+        self.zero_count = 0
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared differences from the mean
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _merge_buckets(self, keys: np.ndarray, counts: np.ndarray):
+        keys, inverse = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]), minlength=len(keys)).astype(
+            np.int64
+        )
+        self.keys = keys
+
+    def _merge_moments(self, count: int, mean: float, m2: float, minimum: float, maximum: float):
+        total = self.count + count
+
+        if not count:
+            return
+
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def add(self, values: Sequence[float]) -> 'QuantileSketch':
+        """Add values to the sketch."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+
+        if not values.size:
+            return self
+
+        if (values < 0).any():
+            raise ValueError('QuantileSketch only supports non-negative values')
+
+        positive = values[values > self.zero_threshold]
+        self.zero_count += values.size - positive.size
+
+        keys, counts = np.unique(np.ceil(np.log(positive) / np.log(self.gamma)).astype(np.int64), return_counts=True)
+        self._merge_buckets(keys, counts)
+
+        mean = values.mean()
+        self._merge_moments(values.size, mean, ((values - mean) ** 2).sum(), values.min(), values.max())
+
+        return self
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """Merge another sketch (with the same alpha) into this one."""
+        if not np.isclose(other.gamma, self.gamma):
+            raise ValueError('Only sketches with the same accuracy can be merged')
+
+        self._merge_buckets(other.keys, other.counts)
+        self.zero_count += other.zero_count
+        self._merge_moments(other.count, other.mean, other.m2, other.min, other.max)
+
+        return self
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (as pandas' std)."""
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def _bucket_values(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Representative value and count of each bucket (including the zero bucket), in order."""
+        values = np.concatenate([[0.0], 2 * self.gamma ** self.keys.astype(float) / (self.gamma + 1)])
+        counts = np.concatenate([[self.zero_count], self.counts])
+
+        return np.clip(values, max(self.min, 0), self.max), counts
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        """Estimate the value at quantile(s) q (between 0 and 1)."""
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+
+        values, counts = self._bucket_values()
+        ranks = np.asarray(q, dtype=float) * (self.count - 1)
+
+        result = values[np.minimum(np.searchsorted(np.cumsum(counts), ranks, side='right'), len(values) - 1)]
+
+        return result if np.ndim(q) else float(result)
+
+    def histogram(self, bins: int = 100, range: Tuple[float, float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate histogram of the values (as np.histogram), using the representative value of each bucket."""
+        values, counts = self._bucket_values()
+
+        return np.histogram(values, bins=bins, range=range or (self.min, self.max), weights=counts)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'alpha': self.alpha, 'zero_threshold': self.zero_threshold, 'keys': self.keys.tolist(),
+            'counts': self.counts.tolist(), 'zero_count': self.zero_count, 'count': self.count, 'mean': self.mean,
+            'm2': self.m2, 'min': self.min if self.count else None, 'max': self.max if self.count else None
+        })
+
+    @classmethod
+    def from_json(cls, string: str) -> 'QuantileSketch':
+        state = json.loads(string)
+
+        sketch = cls(state['alpha'], state['zero_threshold'])
+        sketch.keys = np.array(state['keys'], dtype=np.int64)
+        sketch.counts = np.array(state['counts'], dtype=np.int64)
+        sketch.zero_count = state['zero_count']
+        sketch.count, sketch.mean, sketch.m2 = state['count'], state['mean'], state['m2']
+
+        if sketch.count:
+            sketch.min, sketch.max = state['min'], state['max']
+
+        return sketch
+
+
+class SignedQuantileSketch:
+    """QuantileSketch for values of either sign. Non-negative values and the magnitudes of negative values are kept in
+    separate sketches (with the same accuracy), and the count, mean, variance, min and max are combined exactly.
+    """
+
+    def __init__(self, alpha: float = 0.01, zero_threshold: float = 1e-12):
+        self.positive = QuantileSketch(alpha, zero_threshold)
+        self.negative = QuantileSketch(alpha, zero_threshold)
+
+    def add(self, values: Sequence[float]) -> 'SignedQuantileSketch':
+        """Add values to the sketch."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+
+        self.positive.add(values[values >= 0])
+        self.negative.add(-values[values < 0])
+
+        return self
+
+    def merge(self, other: 'SignedQuantileSketch') -> 'SignedQuantileSketch':
+        """Merge another sketch (with the same alpha) into this one."""
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+
+        return self
+
+    @property
+    def _moments(self) -> QuantileSketch:
+        """Empty sketch with the moments of all of the values."""
+        moments = QuantileSketch(self.positive.alpha, self.positive.zero_threshold)
+        moments._merge_moments(
+            self.positive.count, self.positive.mean, self.positive.m2, self.positive.min, self.positive.max
+        )
+        moments._merge_moments(
+            self.negative.count, -self.negative.mean, self.negative.m2, -self.negative.max, -self.negative.min
+        )
+
+        return moments
+
+    @property
+    def count(self) -> int:
+        return self.positive.count + self.negative.count
+
+    @property
+    def mean(self) -> float:
+        return self._moments.mean if self.count else np.nan
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (as pandas' std)."""
+        return self._moments.std
+
+    @property
+    def min(self) -> float:
+        return self._moments.min
+
+    @property
+    def max(self) -> float:
+        return self._moments.max
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        """Estimate the value at quantile(s) q (between 0 and 1)."""
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+
+        positive_values, positive_counts = self.positive._bucket_values()
+        negative_values, negative_counts = self.negative._bucket_values()
+
+        # Negative buckets in increasing order of value, followed by the non-negative buckets
+        values = np.concatenate([-negative_values[::-1], positive_values])
+        counts = np.concatenate([negative_counts[::-1], positive_counts])
+        ranks = np.asarray(q, dtype=float) * (self.count - 1)
+
+        result = values[np.minimum(np.searchsorted(np.cumsum(counts), ranks, side='right'), len(values) - 1)]
+
+        return result if np.ndim(q) else float(result)
+
+    def to_json(self) -> str:
+        return json.dumps({'positive': self.positive.to_json(), 'negative': self.negative.to_json()})
+
+    @classmethod
+    def from_json(cls, string: str) -> 'SignedQuantileSketch':
+        state = json.loads(string)
+
+        sketch = cls()
+        sketch.positive = QuantileSketch.from_json(state['positive'])
+        sketch.negative = QuantileSketch.from_json(state['negative'])
+
+        return sketch
+
+
+def explode_ragged(df: pd.DataFrame, ragged: Dict[str, RaggedArray], columns: Sequence[str] = None) -> pd.DataFrame:
+    """Expand a dataframe to one row per element of the RaggedArrays given by ragged (which have one row per row of df
+    and must have the same row lengths). The values of the RaggedArrays are used directly, and the columns of df (or
+    only those given by columns) are repeated to match.
+    """
+    keys = list(ragged)
+    lengths = ragged[keys[0]].lengths
+
+    for key in keys[1:]:
+        if not np.array_equal(ragged[key].lengths, lengths):
+            raise ValueError('Elements in columns to be exploded are not the same length across rows.')
+
+    carried = [column for column in df.columns if column not in keys] if columns is None else list(columns)
+    rows = np.repeat(np.arange(len(df)), lengths)  # Position of the original row for each exploded row
+
+    exploded = {key: ragged[key].flat for key in keys}
+    exploded.update({column: df[column].array.take(rows) for column in carried})
+
+    return pd.DataFrame(exploded)
+
+
+def explode_df(df: pd.DataFrame, list_keywords: list, columns: Sequence[str] = None) -> pd.DataFrame:
     """If a dataframe contains arrays for the element of a column or columns given by list_keywords, expand the
     dataframe to one row per array element. Each row in list_keywords must be the same length.
+
+    Array columns are concatenated and the remaining columns (or only those given by columns) are repeated to match,
+    which preserves their dtypes.
     """
-    idx = df.index.repeat(df[list_keywords[0]].str.len())  # Repeat values based on the number of elements in the arrays
-    unpacked = pd.concat([pd.DataFrame({x: np.concatenate(df[x].values)}) for x in list_keywords], axis=1)
-    unpacked.index = idx  # assigns repeated index to the unpacked dataframe, unpacked.
+    lengths = df[list_keywords[0]].str.len().values  # Number of elements in the arrays of each row
 
-    # Join unpacked df to the original df and drop the old columns
-    exploded = unpacked.join(df.drop(list_keywords, 1), how='left').reset_index(drop=True)
+    for keyword in list_keywords[1:]:
+        if not np.array_equal(df[keyword].str.len().values, lengths):
+            raise ValueError('Elements in columns to be exploded are not the same length across rows.')
 
-    if exploded.isna().values.any():  # If there are NaNs, then it didn't make sense to "explode" the input df
+    if pd.isna(lengths).any():  # Elements that aren't arrays
         raise ValueError('Elements in columns to be exploded are not the same length across rows.')
 
-    return exploded
+    ragged = {keyword: RaggedArray.from_arrays(df[keyword].values, lengths) for keyword in list_keywords}
 
+    return explode_ragged(df, ragged, columns)
 
-def absolute_time(df: pd.DataFrame = None, expstart: Sequence = None, time: Sequence = None, time_key: str = None,
-                  time_format: str = 'sec') -> TimeDelta:
-    """Compute the time sequence relative to the start of the exposure (EXPSTART). Can be computed from a DataFrame that
-    contains an EXPSTART column and some other time array column, or from an EXPSTART array and time array pair.
-    """
+
+MJD_EPOCH = np.datetime64('1858-11-17T00:00:00', 'ns')  # MJD 0
+TIME_FORMAT_SECONDS = {'sec': 1, 'jd': 86400}  # Number of seconds per unit for the supported time formats
+
+
+def _absolute_time_input(df: pd.DataFrame = None, expstart: Sequence = None, time: Sequence = None,
+                         time_key: str = None) -> Tuple[Sequence, Sequence]:
+    """Validate the input for computing absolute times and return the expstart and time arrays."""
     # If no input is given raise an error
     if df is None and expstart is None and time is None:
         raise TypeError('Computing and absolute time requires either a dataframe or set of arrays')
@@ -65,12 +553,81 @@ def absolute_time(df: pd.DataFrame = None, expstart: Sequence = None, time: Sequ
         expstart = df.EXPSTART
         time = df.TIME if not time_key else df[time_key]
 
+    return expstart, time
+
+
+def absolute_time(df: pd.DataFrame = None, expstart: Sequence = None, time: Sequence = None, time_key: str = None,
+                  time_format: str = 'sec') -> TimeDelta:
+    """Compute the time sequence relative to the start of the exposure (EXPSTART). Can be computed from a DataFrame that
+    contains an EXPSTART column and some other time array column, or from an EXPSTART array and time array pair.
+    """
+    expstart, time = _absolute_time_input(df, expstart, time, time_key)
+
     zero_points = Time(expstart, format='mjd')
     time_delta = TimeDelta(time, format=time_format)
 
     return zero_points + time_delta
 
 
+def mjd_to_datetime64(mjd: Union[float, Sequence]) -> np.ndarray:
+    """Convert MJD values to datetime64[ns] without creating astropy Time objects. Time scales (and leap seconds) are
+    ignored, which is fine for plotting and binning; use astropy when the time scale matters.
+    """
+    mjd = np.asarray(mjd, dtype=float)
+    days = np.floor(mjd)
+
+    # Whole days and the fraction of the day are converted separately to keep sub-microsecond precision
+    nanoseconds = days.astype(np.int64) * 86400 * 10 ** 9 + np.round((mjd - days) * 86400e9).astype(np.int64)
+
+    return MJD_EPOCH + nanoseconds.astype('timedelta64[ns]')
+
+
+def mjd_to_byear(mjd: Union[float, Sequence]) -> np.ndarray:
+    """Convert MJD values to Besselian years (the same as astropy's Time.byear, without the time scale conversion)
+    without creating astropy Time objects.
+    """
+    return 1900. + (np.asarray(mjd, dtype=float) + 2400000.5 - 2415020.31352) / 365.242198781
+
+
+def absolute_datetime(df: pd.DataFrame = None, expstart: Sequence = None, time: Sequence = None,
+                      time_key: str = None, time_format: str = 'sec') -> np.ndarray:
+    """Fast version of absolute_time that returns datetime64[ns] values (equivalent to absolute_time().to_datetime()).
+    Takes the same input as absolute_time; expstart may also be a single value for all times.
+    """
+    expstart, time = _absolute_time_input(df, expstart, time, time_key)
+
+    nanoseconds = np.round(np.asarray(time, dtype=float) * TIME_FORMAT_SECONDS[time_format] * 1e9).astype(np.int64)
+
+    return mjd_to_datetime64(expstart) + nanoseconds.astype('timedelta64[ns]')
+
+
+def ragged_absolute_datetime(expstart: Sequence, times: Sequence[Sequence], time_format: str = 'sec'
+                             ) -> List[np.ndarray]:
+    """Compute absolute datetime64[ns] times for many exposures at once: one EXPSTART per exposure, each with its own
+    time array. Returns a list with one datetime array per exposure.
+    """
+    lengths = [len(time) for time in times]
+
+    if not sum(lengths):
+        return [np.array([], dtype='datetime64[ns]') for _ in lengths]
+
+    converted = absolute_datetime(
+        expstart=np.repeat(np.asarray(expstart, dtype=float), lengths),
+        time=np.concatenate([np.asarray(time, dtype=float) for time in times]),
+        time_format=time_format
+    )
+
+    return np.split(converted, np.cumsum(lengths)[:-1])
+
+
+def insert_records(model: Type[Model], records: List[dict]):
+    """Insert records in chunks that stay under the bound parameter limit."""
+    n_rows = max(1, SQLITE_MAX_VARIABLES // max(len(record) for record in records))
+
+    for chunk in chunked(records, n_rows):
+        model.insert_many(chunk).execute()
+
+
 def create_visibility(trace_lengths: List[int], visible_list: List[bool]) -> List[bool]:
     """Create visibility lists for plotly buttons. trace_lengths and visible_list must be in the correct order.
 
@@ -103,37 +660,9 @@ def v2v3(slew_x: Sequence, slew_y: Sequence) -> Tuple[Union[np.ndarray, pd.Serie
     return v2, v3
 
 
-def get_osm_data(datamodel, detector: str) -> pd.DataFrame:
-    """Query for OSM data and append any relevant new data to it."""
-    data = pd.DataFrame()
-
-    if datamodel.model is not None:
-        query = datamodel.model.select().where(datamodel.model.DETECTOR == detector)
-
-        # Need to convert the stored array columns back into... arrays
-        data = data.append(
-            datamodel.query_to_pandas(
-                query,
-                array_cols=[
-                    'TIME',
-                    'SHIFT_DISP',
-                    'SHIFT_XDISP',
-                    'SEGMENT',
-                    'XC_RANGE',
-                    'LAMPTAB_SEGMENT',
-                    'SEARCH_OFFSET',
-                    'FP_PIXEL_SHIFT'
-                ],
-            ),
-            sort=True,
-            ignore_index=True
-        )
-
-    if datamodel.new_data is None:
-        return data
-
-    if not datamodel.new_data.empty:
-        new_data = datamodel.new_data[datamodel.new_data.DETECTOR == detector].reset_index(drop=True)
-        data = data.append(new_data, sort=True, ignore_index=True)
-
-    return data
+def get_osm_data(datamodel, detector: str, columns: Sequence[str] = None, start: float = None,
+                 end: float = None) -> pd.DataFrame:
+    """Query for OSM data and append any relevant new data to it. Optionally, only get the given columns and the data
+    with an EXPSTART within the start and end dates (mjd).
+    """
+    return datamodel.query(columns, start, end, DETECTOR=detector)
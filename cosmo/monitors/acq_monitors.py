@@ -4,37 +4,25 @@ import plotly.express as px
 import datetime
 import pandas as pd
 
-from peewee import Model
 from monitorframe.monitor import BaseMonitor
-from astropy.time import Time
-from typing import List, Union
+from typing import List, Sequence
 
 from .data_models import AcqDataModel
-from ..monitor_helpers import fit_line, convert_day_of_year, create_visibility, v2v3
+from .acq_views import describe_summary
+from ..monitor_helpers import (
+    fit_lines, convert_day_of_year, create_visibility, v2v3, mjd_to_datetime64, mjd_to_byear, EventCalendar
+)
 from .. import SETTINGS
 
 COS_MONITORING = SETTINGS['output']
 
 
-def select_all_acq(model: Union[Model, None], exptype: str, new_data_df: pd.DataFrame = None) -> pd.DataFrame:
-    """Get all ingested acq data of a particular exptype and combine it with any new data found."""
-    data = pd.DataFrame()
-
-    if model is not None:
-        data = data.append(
-            pd.DataFrame(model.select().where(model.EXPTYPE == exptype).dicts()),
-            sort=True,
-            ignore_index=True
-        )
-
-    if new_data_df is None:
-        return data
-
-    if not new_data_df.empty:
-        new_data = new_data_df[new_data_df.EXPTYPE == exptype].reset_index(drop=True)
-        data = data.append(new_data, sort=True, ignore_index=True)
-
-    return data
+def select_all_acq(datamodel: AcqDataModel, exptype: str, columns: Sequence[str] = None, start: float = None,
+                   end: float = None) -> pd.DataFrame:
+    """Get all ingested acq data of a particular exptype and combine it with any new data found. Optionally, only get
+    the given columns and the data with an EXPSTART within the start and end dates (mjd).
+    """
+    return datamodel.query(columns, start, end, EXPTYPE=exptype)
 
 
 class AcqImageMonitor(BaseMonitor):
@@ -46,7 +34,7 @@ class AcqImageMonitor(BaseMonitor):
     run = 'monthly'
 
     def get_data(self):
-        data = select_all_acq(self.model.model, 'ACQ/IMAGE', self.model.new_data)
+        data = select_all_acq(self.model, 'ACQ/IMAGE')
 
         # Add configuration column which is a combination of aperture-grating/mirror
         data['configuration'] = data.APERTURE.str.cat(data.OPT_ELEM, sep='-')
@@ -54,16 +42,15 @@ class AcqImageMonitor(BaseMonitor):
         return data
 
     def track(self):
-        """Track the total offset (or slew) distance and basic statistics on x and y slews."""
-        return {
-            'distance': np.sqrt(self.data.ACQSLEWX ** 2 + self.data.ACQSLEWY ** 2),
-            'stats': self.data.groupby('configuration')[['ACQSLEWX', 'ACQSLEWY']].describe()
-        }
+        """Track basic statistics on the x and y slews and the total offset (or slew) distance per configuration. The
+        statistics are kept as running statistics with the data, so only new acquisitions are added.
+        """
+        return {'stats': describe_summary(self.model.summary(), 'ACQ/IMAGE', 'configuration')}
 
     def find_outliers(self):
         """Find offsets of 2 arcseconds or larger."""
         return {
-            'slews': self.results['distance'] >= 2,
+            'slews': np.sqrt(self.data.ACQSLEWX ** 2 + self.data.ACQSLEWY ** 2) >= 2,
             'failed': self.data.ACQSTAT == 'Failure',
             'closed': self.data.SHUTTER == 'Closed'
         }
@@ -166,11 +153,13 @@ class AcqImageV2V3Monitor(BaseMonitor):
                    'FHST Alignment']
     fgs3_breaks = ['FGS Realignment 3', 'FHST Alignment']
 
+    calendar = EventCalendar(fgs_events, break_points)  # Event dates and breakpoint epochs, converted once
+
     def get_data(self):
         """Filter ACQIMAGE data for V2V3 plot. These filter options attempt to weed out outliers that might result from
         things besides FGS trends (such as bad coordinates).
         """
-        data = select_all_acq(self.model.model, 'ACQ/IMAGE', self.model.new_data)
+        data = select_all_acq(self.model, 'ACQ/IMAGE')
         data['V2SLEW'], data['V3SLEW'] = v2v3(data.ACQSLEWX, data.ACQSLEWY)
 
         # Filters determined by the team.
@@ -191,30 +180,50 @@ class AcqImageV2V3Monitor(BaseMonitor):
 
         return filtered_df.sort_values('EXPSTART').reset_index(drop=True)
 
-    def track(self):
-        """Track the fit and fit-line for the period since the last FGS alignment."""
-        groups = self.data.groupby('FGS')
+    def fit_epochs(self) -> pd.DataFrame:
+        """Label each row with its breakpoint epoch (for its FGS) and fit the V2 and V3 offsets (-slew) vs time for
+        every FGS and epoch in a single grouped pass. Returns the rows that are in an epoch sorted by FGS, epoch and
+        EXPSTART (so each epoch is a contiguous slice) with EPOCH, V2FIT, V3FIT, V2SLOPE and V3SLOPE columns.
+        """
+        epochs = np.full(len(self.data), -1)
 
-        last_updated_results = {}
-        for name, group in groups:
-            t_start = convert_day_of_year(self.break_points[name][-1][0]).mjd  # Last update date
+        for name, rows in self.data.groupby('FGS').indices.items():
+            if name in self.calendar.epochs:
+                epochs[rows] = self.calendar.assign_epochs(name, self.data.EXPSTART.values[rows])
 
-            df = group[group.EXPSTART >= t_start]
+        df = self.data.assign(EPOCH=epochs)[epochs >= 0].sort_values(['FGS', 'EPOCH', 'EXPSTART'], kind='stable')
 
-            if df.empty:
-                continue
+        if df.empty:
+            return df.assign(V2FIT=[], V3FIT=[], V2SLOPE=[], V3SLOPE=[]).reset_index(drop=True)
 
-            # Track V2V3 fit and fit-line since the last update for each FGS
-            v2_fit, v2_line = fit_line(Time(df.EXPSTART, format='mjd').byear, -df.V2SLEW)
-            v3_fit, v3_line = fit_line(Time(df.EXPSTART, format='mjd').byear, -df.V3SLEW)
+        groups = pd.factorize(df.FGS)[0] * (len(max(self.break_points.values(), key=len)) + 1) + df.EPOCH.values
+        byear = mjd_to_byear(df.EXPSTART)
 
-            # last_updated_results[name] = (v2_line_fit, v3_line_fit)
-            last_updated_results[name] = {
-                'V2': {'slope': v2_fit[1], 'start': v2_line[0], 'end': v2_line[-1]},
-                'V3': {'slope': v3_fit[1], 'start': v3_line[0], 'end': v3_line[-1]}
-            }
+        for direction in ['V2', 'V3']:
+            fit = fit_lines(byear, -df[f'{direction}SLEW'], groups)
+            df[f'{direction}FIT'] = fit.line
+            df[f'{direction}SLOPE'] = fit.slope[groups].values
 
-        return groups, last_updated_results
+        return df.reset_index(drop=True)
+
+    def track(self):
+        """Track the fit and fit-line for the period since the last FGS alignment (the last breakpoint epoch)."""
+        fits = self.fit_epochs()
+        last_epoch = fits.FGS.map({name: len(epochs) - 1 for name, epochs in self.break_points.items()})
+        df = fits[fits.EPOCH == last_epoch]
+
+        # Track V2V3 fit and fit-line since the last update for each FGS
+        last_updated_results = {
+            name: {
+                direction: {
+                    'slope': df[f'{direction}SLOPE'].values[rows[0]],
+                    'start': df[f'{direction}FIT'].values[rows[0]],
+                    'end': df[f'{direction}FIT'].values[rows[-1]]
+                } for direction in ['V2', 'V3']
+            } for name, rows in df.groupby('FGS').indices.items()
+        }
+
+        return fits, last_updated_results
 
     def set_notification(self):
         """Set the notification to report line fit results for the last breakpoint group for V2 and V3 for each FGS.
@@ -254,28 +263,27 @@ class AcqImageV2V3Monitor(BaseMonitor):
 
         return notification
 
-    def _create_traces(self, df: pd.DataFrame, breakpoint_index: int):
-        """Create V2V3 traces for the monitor figure."""
-        for i, slew in enumerate(['V2SLEW', 'V3SLEW']):
-            time = Time(df.EXPSTART, format='mjd')
-            line_fit, fit = fit_line(time.byear, -df[slew])
+    def _create_traces(self, df: pd.DataFrame, time: np.ndarray, breakpoint_index: int):
+        """Create V2V3 traces for the monitor figure from the rows of a breakpoint epoch (as returned by fit_epochs)."""
+        for i, direction in enumerate(['V2', 'V3']):
+            fit = df[f'{direction}FIT'].values
 
             scatter = go.Scatter(  # scatter plot
-                x=time.to_datetime(),
-                y=-df[slew],
+                x=time,
+                y=-df[f'{direction}SLEW'],
                 mode='markers',
                 hovertext=df.hover_text,
                 visible=False,
                 legendgroup=f'Group {breakpoint_index + 1}',
-                name=f'{slew.strip("SLEW")} Group {breakpoint_index + 1}'
+                name=f'{direction} Group {breakpoint_index + 1}'
             )
 
             line = go.Scatter(  # line-fit plot
-                x=time.to_datetime(),
+                x=time,
                 y=fit,
                 name=(
-                    f'Slope: {line_fit[1]:.4f} arcsec/year<br>Offset (from fit) at time of first data point: '
-                    f'{fit[0]:.3f}<br>'
+                    f'Slope: {df[f"{direction}SLOPE"].values[0]:.4f} arcsec/year<br>Offset (from fit) at time of first '
+                    f'data point: {fit[0]:.3f}<br>'
                 ),
                 visible=False,
                 legendgroup=f'Group {breakpoint_index + 1}',
@@ -288,9 +296,9 @@ class AcqImageV2V3Monitor(BaseMonitor):
         return [
             {
                 'type': 'line',
-                'x0': convert_day_of_year(self.fgs_events[key]).to_datetime(),
+                'x0': self.calendar.datetime_of(key),
                 'y0': self.figure['layout'][y_axis]['domain'][0],
-                'x1': convert_day_of_year(self.fgs_events[key]).to_datetime(),
+                'x1': self.calendar.datetime_of(key),
                 'y1': self.figure['layout'][y_axis]['domain'][1],
                 'xref': xref,
                 'yref': 'paper',
@@ -306,41 +314,27 @@ class AcqImageV2V3Monitor(BaseMonitor):
         """Plot V2 and V3 offset (-slew) vs time per 'breakpoint' period and per FGS. Separate FGS via a button option.
         V2 will be plotted in the top panel and V3 will be plotted in the bottom panel.
         """
-        fgs_groups, _ = self.results  # retrieve the groups already found in track.
+        fits, _ = self.results  # retrieve the epoch fits already found in track.
+        time = mjd_to_datetime64(fits.EXPSTART)
 
         traces_per_fgs = {'F1': 0, 'F2': 0, 'F3': 0}
 
-        for name, group in fgs_groups:
-            # Filter dataframe by time per breakpoint
-            for i_breaks, points in enumerate(self.break_points[name]):
-                t_start, t_end = points
+        # Rows are sorted by FGS and epoch, so each epoch is a slice; epochs without data (for example, FGS2 was not
+        # used for a while) don't have any rows
+        for (name, i_breaks), rows in fits.groupby(['FGS', 'EPOCH'], sort=False).indices.items():
+            epoch = slice(rows[0], rows[-1] + 1)
 
-                if t_start is None:
-                    df = group[group.EXPSTART <= convert_day_of_year(t_end).mjd]
-
-                elif t_end is None:
-                    df = group[group.EXPSTART >= convert_day_of_year(t_start).mjd]
-
-                else:
-                    df = group[
-                        (group.EXPSTART >= convert_day_of_year(t_start).mjd) &
-                        (group.EXPSTART <= convert_day_of_year(t_end).mjd)
-                        ]
-
-                if df.empty:  # Sometimes there may be no data; For example, FGS2 was not used for a while
-                    continue
-
-                # Plot V2 and V3 offsets v time
-                self._create_traces(df, i_breaks)
-                traces_per_fgs[name] += 4  # There are four plots created with each call to _create_traces
+            # Plot V2 and V3 offsets v time
+            self._create_traces(fits.iloc[epoch], time[epoch], i_breaks)
+            traces_per_fgs[name] += 4  # There are four plots created with each call to _create_traces
 
         # Create vertical lines
         lines = [
             {
                 'type': 'line',
-                'x0': convert_day_of_year(value).to_datetime(),
+                'x0': value,
                 'y0': self.figure['layout'][y_axis]['domain'][0],
-                'x1': convert_day_of_year(value).to_datetime(),
+                'x1': value,
                 'y1': self.figure['layout'][y_axis]['domain'][1],
                 'xref': xref,
                 'yref': 'paper',
@@ -348,7 +342,8 @@ class AcqImageV2V3Monitor(BaseMonitor):
                     'width': 3,
                 },
                 'name': key
-            } for key, value in self.fgs_events.items() for xref, y_axis in zip(['x1', 'x2'], ['yaxis1', 'yaxis2'])
+            } for key, value in zip(self.calendar.names, self.calendar.datetimes)
+            for xref, y_axis in zip(['x1', 'x2'], ['yaxis1', 'yaxis2'])
         ]
 
         # Create vertical lines that are a different style for breakpoints (per FGS)
@@ -358,15 +353,18 @@ class AcqImageV2V3Monitor(BaseMonitor):
 
         annotations = [
             {
-                'x': convert_day_of_year(item[1]).to_datetime(),
+                'x': item[1],
                 'y': self.figure.layout[yaxis]['domain'][1],
                 'xref': xref,
                 'yref': 'paper',
-                'text': f'{item[0]}<br>{convert_day_of_year(item[1]).to_datetime().date()}',
+                'text': f'{item[0]}<br>{item[1].date()}',
                 'showarrow': True,
                 'ax': ax,
                 'ay': -30,
-            } for item, ax in zip(self.fgs_events.items(), [-60, 50, -20, 20, -50, 20, 50, -50, 60, -50, 50, 50, 50])
+            } for item, ax in zip(
+                zip(self.calendar.names, self.calendar.datetimes),
+                [-60, 50, -20, 20, -50, 20, 50, -50, 60, -50, 50, 50, 50]
+            )
             for xref, yaxis in zip(['x1', 'x2'], ['yaxis1', 'yaxis2'])
         ]
 
@@ -436,14 +434,16 @@ class SpecAcqBaseMonitor(BaseMonitor):
     def get_data(self):
         exptype = 'ACQ/PEAKD' if self.slew == 'ACQSLEWX' else 'ACQ/PEAKXD'
 
-        return select_all_acq(self.model.model, exptype, self.model.new_data)
+        return select_all_acq(self.model, exptype)
 
     def track(self):
-        """Track the standard deviation of the slew per FGS."""
-        groups = self.data.groupby('FGS')
-        scatter = groups[self.slew].std()
+        """Track the statistics of the slew per FGS, including the standard deviation. The statistics are kept as
+        running statistics with the data, so only new acquisitions are added.
+        """
+        exptype = 'ACQ/PEAKD' if self.slew == 'ACQSLEWX' else 'ACQ/PEAKXD'
+        stats = describe_summary(self.model.summary(), exptype, 'FGS', [self.slew])
 
-        return groups, scatter
+        return stats, stats[(self.slew, 'std')]
 
     def find_outliers(self):
         """Outliers are defined as those slews/offsets with a magnitude >= 1 arcsecond."""
@@ -451,49 +451,58 @@ class SpecAcqBaseMonitor(BaseMonitor):
 
     def plot(self):
         """Plot offset (-slew) v time per FGS. Separate FGS via button options. Color by LP-POS"""
-        fgs_groups, std_results = self.results  # groups are stored in the results attribute since track returns them.
-
         trace_count = {'F1': 0, 'F2': 0, 'F3': 0}
         lp_colors = ['#1f77b4', '#2ca02c', '#8c564b', '#bcbd22', '#8317bb', '#3ee0d8']  # blue, green, brown, yellow-green, purple, cyan
         detector_symbols = {'NUV': 'x', 'FUV': 'circle'}
-        for name, group in fgs_groups:
-            lp_groups = group.groupby('LIFE_ADJ')
 
-            for lp, lp_group in lp_groups:
+        # Compute the plotted columns once, and sort by FGS and LP so that each trace is a contiguous slice
+        df = pd.DataFrame({
+            'FGS': self.data.FGS.values,
+            'LIFE_ADJ': self.data.LIFE_ADJ.values,
+            'DATETIME': mjd_to_datetime64(self.data.EXPSTART),
+            'OFFSET': -self.data[self.slew].values,
+            'SYMBOL': self.data.DETECTOR.map(detector_symbols).values,
+            'OUTLIER': np.asarray(self.outliers, dtype=bool),
+            'hover_text': self.data.hover_text.values
+        }).sort_values(['FGS', 'LIFE_ADJ'], kind='stable')
+
+        for (name, lp), rows in df.groupby(['FGS', 'LIFE_ADJ'], sort=False).indices.items():
+            lp_group = df.iloc[rows[0]:rows[-1] + 1]
+
+            trace_count[name] += 1
+            scatter = go.Scatter(  # Scatter plot
+                x=lp_group.DATETIME.values,
+                y=lp_group.OFFSET.values,
+                mode='markers',
+                text=lp_group.hover_text.values,
+                visible=False,
+                name=f'{name} LP{lp}',
+                legendgroup=f'LP{lp}',
+                marker_color=lp_colors[lp - 1],
+                marker_symbol=lp_group.SYMBOL.values
+            )
+
+            self.figure.add_trace(scatter)
+
+            outliers = lp_group[lp_group.OUTLIER.values]
+
+            if not outliers.empty:
                 trace_count[name] += 1
-                scatter = go.Scatter(  # Scatter plot
-                    x=Time(lp_group.EXPSTART, format='mjd').to_datetime(),
-                    y=-lp_group[self.slew],
+
+                outlier_trace = go.Scatter(
+                    x=outliers.DATETIME.values,
+                    y=outliers.OFFSET.values,
                     mode='markers',
-                    text=lp_group.hover_text,
+                    text=outliers.hover_text.values,
                     visible=False,
-                    name=f'{name} LP{lp}',
+                    name=f'{name} LP{lp} Outliers',
                     legendgroup=f'LP{lp}',
-                    marker_color=lp_colors[lp - 1],
-                    marker_symbol=[detector_symbols[detector] for detector in lp_group.DETECTOR]
+                    marker_color='red',
+                    marker_symbol='x',
+                    marker_size=10
                 )
 
-                self.figure.add_trace(scatter)
-
-                outliers = lp_group[self.outliers.iloc[lp_group.index.values]]
-
-                if not outliers.empty:
-                    trace_count[name] += 1
-
-                    outlier_trace = go.Scatter(
-                        x=Time(outliers.EXPSTART, format='mjd').to_datetime(),
-                        y=-outliers[self.slew],
-                        mode='markers',
-                        text=outliers.hover_text,
-                        visible=False,
-                        name=f'{name} LP{lp} Outliers',
-                        legendgroup=f'LP{lp}',
-                        marker_color='red',
-                        marker_symbol='x',
-                        marker_size=10
-                    )
-
-                    self.figure.add_trace(outlier_trace)
+                self.figure.add_trace(outlier_trace)
 
         fgs_labels = ['All FGS', 'FGS1', 'FGS2', 'FGS3']
 
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from functools import reduce
+from peewee import Model, TextField, FloatField, IntegerField
+
+from ..monitor_helpers import SignedQuantileSketch
+
+# Acq groupings and columns that running statistics are kept for (per EXPTYPE)
+STAT_GROUPINGS = ['configuration', 'FGS']
+STAT_COLUMNS = ['ACQSLEWX', 'ACQSLEWY', 'DISTANCE']
+
+STAT_KEYS = ['EXPTYPE', 'GROUPING', 'GROUP', 'COLUMN']
+STAT_FIELDS = ['COUNT', 'MIN', 'MAX', 'SKETCH']
+
+# Acq data columns that the statistics are derived from
+SOURCE_COLUMNS = ['ROOTNAME', 'EXPTYPE', 'APERTURE', 'OPT_ELEM', 'FGS', 'ACQSLEWX', 'ACQSLEWY']
+
+
+class AcqStat(Model):
+    """Running statistics of an acq column (ACQSLEWX, ACQSLEWY or the total slew DISTANCE) for a group of acquisitions
+    of an EXPTYPE. Bound to the AcqDataModel's database when it's used.
+    """
+    EXPTYPE = TextField()
+    GROUPING = TextField()  # Column that the acquisitions are grouped by
+    GROUP = TextField()
+    COLUMN = TextField()
+    COUNT = IntegerField()
+    MIN = FloatField()
+    MAX = FloatField()
+    SKETCH = TextField()  # SignedQuantileSketch of the values, which also keeps the mean and variance exactly
+
+    class Meta:
+        indexes = ((('EXPTYPE', 'GROUPING', 'GROUP', 'COLUMN'), True),)
+
+
+class AcqStatExposure(Model):
+    """Acquisitions that have been added to the running statistics."""
+    ROOTNAME = TextField(unique=True)
+
+
+ACQ_VIEWS = [AcqStat, AcqStatExposure]
+
+
+def summarize_acqs(data: pd.DataFrame) -> pd.DataFrame:
+    """Compute the statistics of acq data for each EXPTYPE, grouping, group and column. Returns a DataFrame indexed by
+    STAT_KEYS with the STAT_FIELDS columns (SKETCH holds SignedQuantileSketch objects).
+    """
+    if data is None or data.empty:
+        return pd.DataFrame(columns=STAT_KEYS + STAT_FIELDS).set_index(STAT_KEYS)
+
+    data = data.assign(
+        configuration=data.APERTURE.str.cat(data.OPT_ELEM, sep='-'),
+        DISTANCE=np.sqrt(data.ACQSLEWX ** 2 + data.ACQSLEWY ** 2)
+    )
+
+    # Long format: one row per acquisition, grouping and column
+    long = pd.concat(
+        [
+            data[['EXPTYPE', grouping] + STAT_COLUMNS].rename(columns={grouping: 'GROUP'}).assign(GROUPING=grouping)
+            for grouping in STAT_GROUPINGS
+        ],
+        ignore_index=True
+    ).melt(id_vars=['EXPTYPE', 'GROUPING', 'GROUP'], var_name='COLUMN', value_name='VALUE')
+
+    long = long.dropna(subset=['GROUP', 'VALUE']).astype({'GROUP': str})
+    groups = long.groupby(STAT_KEYS)
+
+    summary = groups.agg(COUNT=('VALUE', 'size'), MIN=('VALUE', 'min'), MAX=('VALUE', 'max'))
+    summary['SKETCH'] = [SignedQuantileSketch().add(values.values) for _, values in groups.VALUE]
+
+    return summary
+
+
+def combine_summaries(*summaries: pd.DataFrame) -> pd.DataFrame:
+    """Combine statistics (as returned by summarize_acqs) of separate sets of acquisitions."""
+    summaries = [summary for summary in summaries if not summary.empty]
+
+    if len(summaries) < 2:
+        return summaries[0] if summaries else summarize_acqs(None)
+
+    combined = pd.concat(summaries)
+    groups = combined.groupby(level=STAT_KEYS)
+
+    result = groups.agg({'COUNT': 'sum', 'MIN': 'min', 'MAX': 'max'})
+    result['SKETCH'] = [
+        reduce(lambda total, sketch: total.merge(sketch), sketches.values, SignedQuantileSketch())
+        for _, sketches in groups.SKETCH
+    ]
+
+    return result
+
+
+def describe_summary(summary: pd.DataFrame, exptype: str, grouping: str, columns=None) -> pd.DataFrame:
+    """Statistics of the acquisitions of an EXPTYPE per group of grouping in the same format as DataFrame.describe of
+    the grouped columns: (column, statistic) columns and a row per group. The mean and standard deviation are the
+    exact moments kept by the sketches, and the quartiles are estimated from the sketches.
+    """
+    columns = columns or STAT_COLUMNS
+    statistics = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+    if summary.empty or exptype not in summary.index.get_level_values('EXPTYPE'):
+        return pd.DataFrame(columns=pd.MultiIndex.from_product([columns, statistics]))
+
+    selected = summary.xs((exptype, grouping), level=['EXPTYPE', 'GROUPING'])
+    selected = selected[selected.index.get_level_values('COLUMN').isin(columns)]
+
+    quartiles = np.array([sketch.quantile([0.25, 0.5, 0.75]) for sketch in selected.SKETCH]).reshape(-1, 3)
+
+    described = pd.DataFrame({
+        'count': selected.COUNT.astype(float),
+        'mean': [sketch.mean for sketch in selected.SKETCH],
+        'std': [sketch.std for sketch in selected.SKETCH],
+        'min': selected.MIN,
+        '25%': quartiles[:, 0],
+        '50%': quartiles[:, 1],
+        '75%': quartiles[:, 2],
+        'max': selected.MAX
+    }, index=selected.index)
+
+    described = described.unstack('COLUMN').swaplevel(axis=1)
+    present = [column for column in columns if column in described.columns.get_level_values(0)]
+
+    return described.reindex(columns=pd.MultiIndex.from_product([present, statistics]))
+
+
+def stat_records(summary: pd.DataFrame) -> list:
+    """Rows of the AcqStat table for statistics (as returned by summarize_acqs)."""
+    return [
+        dict(zip(STAT_KEYS, key), COUNT=int(row.COUNT), MIN=row.MIN, MAX=row.MAX, SKETCH=row.SKETCH.to_json())
+        for key, row in zip(summary.index, summary.itertuples())
+    ]
+
+
+def stored_summary() -> pd.DataFrame:
+    """Get the stored statistics (the AcqStat table must be bound) in the format returned by summarize_acqs."""
+    stored = pd.DataFrame(AcqStat.select(*[getattr(AcqStat, column) for column in STAT_KEYS + STAT_FIELDS]).dicts())
+
+    if stored.empty:
+        return summarize_acqs(None)
+
+    stored['SKETCH'] = stored.SKETCH.map(SignedQuantileSketch.from_json)
+
+    return stored.set_index(STAT_KEYS)
@@ -0,0 +1,251 @@
+import json
+import zlib
+import base64
+
+import numpy as np
+import pandas as pd
+
+from typing import Sequence, Tuple, Dict
+
+from .dark_store import DarkSketch, DarkSketchExposure, update_aggregate, load_aggregate, region_name
+from .dark_regions import RegionLookup, GOOD_PHA, DARK_REGIONS
+from ..monitor_helpers import mjd_to_datetime64
+
+DARK_MAP_BINNING = (32, 8)  # Detector pixels per map bin in x and y
+DETECTOR_SHAPES = {'FUVA': (16384, 1024), 'FUVB': (16384, 1024), 'N/A': (1024, 1024)}  # x, y pixels per segment
+PHA_VALUES = 32
+
+# Dark data columns that the maps and histograms are made from
+SOURCE_COLUMNS = ['ROOTNAME', 'SEGMENT', 'EXPSTART', 'EXPTIME', 'PHA', 'XCORR', 'YCORR']
+
+
+def _encode(array: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(array, dtype='<i8').tobytes())).decode('ascii')
+
+
+def _decode(string: str, shape: Sequence[int]) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(base64.b64decode(string)), dtype='<i8').reshape(shape).astype(np.int64)
+
+
+class DarkMap:
+    """Binned image of the dark counts on a segment, along with the total exposure time of the exposures that were
+    added. Counts in any box on the detector can be estimated from the map without the events.
+    """
+
+    def __init__(self, shape: Tuple[int, int] = DETECTOR_SHAPES['FUVA'], binning: Tuple[int, int] = DARK_MAP_BINNING):
+        self.shape = tuple(shape)
+        self.binning = tuple(binning)
+        self.x_edges = np.append(np.arange(0, self.shape[0], self.binning[0]), self.shape[0]).astype(float)
+        self.y_edges = np.append(np.arange(0, self.shape[1], self.binning[1]), self.shape[1]).astype(float)
+
+        self.counts = np.zeros((len(self.y_edges) - 1, len(self.x_edges) - 1), dtype=np.int64)  # (y, x)
+        self.exptime = 0.
+        self.exposures = 0
+
+    def add(self, xcorr: Sequence[float], ycorr: Sequence[float], exptime: float):
+        """Add the events of an exposure to the map. Events off of the detector are ignored."""
+        xcorr, ycorr = np.asarray(xcorr, dtype=float), np.asarray(ycorr, dtype=float)
+        keep = (xcorr >= 0) & (xcorr < self.shape[0]) & (ycorr >= 0) & (ycorr < self.shape[1])
+
+        ny, nx = self.counts.shape
+        cells = (ycorr[keep] // self.binning[1]).astype(int) * nx + (xcorr[keep] // self.binning[0]).astype(int)
+
+        self.counts += np.bincount(cells, minlength=nx * ny).reshape(ny, nx)
+        self.exptime += float(exptime)
+        self.exposures += 1
+
+        return self
+
+    def merge(self, other: 'DarkMap'):
+        """Add the counts and exposure time of another map with the same shape and binning."""
+        if (other.shape, other.binning) != (self.shape, self.binning):
+            raise ValueError('Maps with different shapes or binning cannot be merged')
+
+        self.counts += other.counts
+        self.exptime += other.exptime
+        self.exposures += other.exposures
+
+        return self
+
+    @staticmethod
+    def _overlap(edges: np.ndarray, low: float, high: float) -> np.ndarray:
+        """Fraction of each bin that's inside of (low, high)."""
+        return np.clip(np.minimum(edges[1:], high) - np.maximum(edges[:-1], low), 0, None) / np.diff(edges)
+
+    def box_counts(self, location: Sequence[float]) -> float:
+        """Counts in a location box (x0, x1, y0, y1). Bins that are partially in the box are weighted by the fraction of
+        the bin that's in the box, so the counts are exact for boxes that are aligned with the binning.
+        """
+        x0, x1, y0, y1 = location
+
+        return float(self._overlap(self.y_edges, y0, y1) @ self.counts @ self._overlap(self.x_edges, x0, x1))
+
+    def box_rate(self, location: Sequence[float]) -> float:
+        """Dark rate (counts per pixel per second) in a location box (x0, x1, y0, y1)."""
+        x0, x1, y0, y1 = location
+
+        return self.box_counts(location) / ((x1 - x0) * (y1 - y0)) / self.exptime if self.exptime else np.nan
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'shape': self.shape, 'binning': self.binning, 'exptime': self.exptime, 'exposures': self.exposures,
+            'counts': _encode(self.counts)
+        })
+
+    @classmethod
+    def from_json(cls, string: str) -> 'DarkMap':
+        state = json.loads(string)
+
+        dark_map = cls(state['shape'], state['binning'])
+        dark_map.counts = _decode(state['counts'], dark_map.counts.shape)
+        dark_map.exptime = state['exptime']
+        dark_map.exposures = state['exposures']
+
+        return dark_map
+
+
+class PHAHistogram:
+    """Histogram of the pulse heights of the dark events in a location box (x0, x1, y0, y1)."""
+
+    def __init__(self, location: Sequence[float]):
+        self.location = tuple(location)
+        self.counts = np.zeros(PHA_VALUES, dtype=np.int64)
+        self.exptime = 0.
+        self.exposures = 0
+
+    def add(self, xcorr: Sequence[float], ycorr: Sequence[float], pha: Sequence[int], exptime: float):
+        """Add the events of an exposure to the histogram."""
+        pha = np.clip(np.asarray(pha, dtype=int), 0, PHA_VALUES - 1)
+
+        self.counts += RegionLookup([self.location]).counts(xcorr, ycorr, pha, PHA_VALUES)[0]
+        self.exptime += float(exptime)
+        self.exposures += 1
+
+        return self
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'location': self.location, 'exptime': self.exptime, 'exposures': self.exposures,
+            'counts': self.counts.tolist()
+        })
+
+    @classmethod
+    def from_json(cls, string: str) -> 'PHAHistogram':
+        state = json.loads(string)
+
+        histogram = cls(state['location'])
+        histogram.counts = np.array(state['counts'], dtype=np.int64)
+        histogram.exptime = state['exptime']
+        histogram.exposures = state['exposures']
+
+        return histogram
+
+
+def map_name(segment: str, month: str, binning: Sequence[int] = DARK_MAP_BINNING) -> str:
+    return f'dark_map/{segment}/{month}/{binning[0]}x{binning[1]}'
+
+
+def pha_name(segment: str, month: str, location: Sequence[float]) -> str:
+    return f'dark_pha/{segment}/{month}/{region_name(location)}'
+
+
+def exposure_months(expstart: Sequence[float]) -> np.ndarray:
+    """Month (YYYY-MM) of each exposure start (MJD)."""
+    return np.datetime_as_string(mjd_to_datetime64(expstart).astype('datetime64[M]'))
+
+
+def update_dark_maps(data: pd.DataFrame, binning: Sequence[int] = DARK_MAP_BINNING,
+                     regions: Dict[str, Sequence] = None):
+    """Add dark corrtag data (one row per exposure, with the event arrays) to the stored monthly dark maps of each
+    segment and the monthly PHA histograms of each region (DARK_REGIONS by default). FUV maps only include events with
+    good pulse heights. Exposures that were already added are skipped.
+    """
+    if data is None or data.empty:
+        return
+
+    regions = DARK_REGIONS if regions is None else regions
+
+    data = data[(data.EXPSTART != 0) & data.SEGMENT.isin(list(DETECTOR_SHAPES))]
+    data = data.assign(rootname=data.ROOTNAME, month=exposure_months(data.EXPSTART.values))
+
+    for (segment, month), exposures in data.groupby(['SEGMENT', 'month']):
+        filter_pha = segment != 'N/A'  # NUV doesn't have PHA
+
+        def add_map(dark_map, new):
+            for row in new.itertuples():
+                good = (row.PHA > GOOD_PHA[0]) & (row.PHA < GOOD_PHA[1]) if filter_pha else slice(None)
+                dark_map.add(np.asarray(row.XCORR)[good], np.asarray(row.YCORR)[good], row.EXPTIME)
+
+        update_aggregate(
+            map_name(segment, month, binning), exposures, lambda: DarkMap(DETECTOR_SHAPES[segment], binning),
+            DarkMap.from_json, add_map
+        )
+
+        if not filter_pha:
+            continue
+
+        for location in regions.get(segment, []):
+            update_aggregate(
+                pha_name(segment, month, location), exposures, lambda: PHAHistogram(location), PHAHistogram.from_json,
+                lambda histogram, new: [histogram.add(row.XCORR, row.YCORR, row.PHA, row.EXPTIME)
+                                        for row in new.itertuples()]
+            )
+
+
+def mapped_exposures(binning: Sequence[int] = DARK_MAP_BINNING) -> set:
+    """(segment, rootname) of the exposures that have been added to the stored dark maps."""
+    if not DarkSketchExposure.table_exists():
+        return set()
+
+    prefix, suffix = 'dark_map/', f'/{binning[0]}x{binning[1]}'
+    names = DarkSketchExposure.select(DarkSketchExposure.NAME, DarkSketchExposure.ROOTNAME).where(
+        DarkSketchExposure.NAME.startswith(prefix)
+    )
+
+    # Segments can include "/" (N/A), so the segment is everything before the month
+    return {
+        (row.NAME[len(prefix):].rsplit('/', 2)[0], row.ROOTNAME) for row in names if row.NAME.endswith(suffix)
+    }
+
+
+def _stored_months(prefix: str, suffix: str) -> list:
+    if not DarkSketch.table_exists():
+        return []
+
+    names = DarkSketch.select(DarkSketch.NAME).where(DarkSketch.NAME.startswith(prefix)).order_by(DarkSketch.NAME)
+
+    return [row.NAME[len(prefix):-len(suffix)] for row in names if row.NAME.endswith(suffix)]
+
+
+def load_dark_maps(segment: str, binning: Sequence[int] = DARK_MAP_BINNING) -> Dict[str, DarkMap]:
+    """Get the stored monthly dark maps of a segment, keyed by month (YYYY-MM)."""
+    months = _stored_months(f'dark_map/{segment}/', f'/{binning[0]}x{binning[1]}')
+
+    return {
+        month: load_aggregate(map_name(segment, month, binning), DarkMap, DarkMap.from_json) for month in months
+    }
+
+
+def load_pha_histograms(segment: str, location: Sequence[float]) -> pd.DataFrame:
+    """Get the stored monthly PHA histograms of a region as a DataFrame with a row per month and a column per PHA."""
+    months = _stored_months(f'dark_pha/{segment}/', f'/{region_name(location)}')
+    histograms = [
+        load_aggregate(pha_name(segment, month, location), None, PHAHistogram.from_json).counts for month in months
+    ]
+
+    return pd.DataFrame(
+        np.reshape(histograms, (len(months), PHA_VALUES)), index=pd.Index(months, name='month'),
+        columns=pd.RangeIndex(PHA_VALUES, name='PHA')
+    )
+
+
+def box_dark_rates(segment: str, location: Sequence[float], binning: Sequence[int] = DARK_MAP_BINNING) -> pd.Series:
+    """Monthly dark rate (counts per pixel per second) in a location box (x0, x1, y0, y1), evaluated from the stored
+    dark maps instead of the events.
+    """
+    maps = load_dark_maps(segment, binning)
+
+    return pd.Series(
+        [dark_map.box_rate(location) for dark_map in maps.values()], index=pd.Index(list(maps), name='month'),
+        dtype=float
+    )
@@ -1,7 +1,9 @@
 
 import os
 import json
-import datetime
+import time
+import pathlib
+import warnings
 
 import numpy as np
 import pandas as pd
@@ -10,19 +12,24 @@ import plotly.express as px
 import plotly.graph_objs as go
 
 # from tqdm import tqdm
-from typing import Any
+from typing import Any, NamedTuple
 from urllib import request
-from itertools import repeat
 from plotly.subplots import make_subplots
 from monitorframe.monitor import BaseMonitor
 from astropy.convolution import Box1DKernel, convolve
 
 from .. import SETTINGS
-from .data_models import DarkDataModel
-from ..monitor_helpers import explode_df, absolute_time
+from .data_models import DarkDataModel, RUN_CACHE
+from .dark_regions import RegionLookup, GOOD_PHA, DARK_REGIONS
+from .dark_store import (
+    update_aggregate, update_sketch, region_name, processed_exposures, store_dark_rates,
+    load_dark_rates, store_track
+)
+from ..monitor_helpers import absolute_datetime
 
 COS_MONITORING = SETTINGS['output']
 NOAA_URL = 'https://services.swpc.noaa.gov/json/solar-cycle/observed-solar-cycle-indices.json'
+SOLAR = SETTINGS['solar']
 
 # ----------------------------------------------------------------------------#
 
@@ -48,83 +55,396 @@ NOAA_URL = 'https://services.swpc.noaa.gov/json/solar-cycle/observed-solar-cycle
 #         monitor.monitor()
 
 
+DARK_TIME_STEP = 25  # number of TIME_3 samples per dark rate time bin
+# dark data columns that the dark rates are calculated from
+RATE_COLUMNS = ['ROOTNAME', 'SEGMENT', 'EXPSTART', 'PHA', 'XCORR', 'YCORR',
+                'TIME', 'TIME_3', 'LATITUDE', 'LONGITUDE']
+
+
+class OrbitalGrid:
+    """Incremental aggregate of dark rates on a longitude/latitude grid
+    (with steps in degrees). Each cell keeps the number of dark rates, their
+    sum and a histogram of the (log-spaced) rates, so the count, mean and
+    (approximate) median of each cell are updated with new exposures while
+    the size stays fixed."""
+
+    def __init__(self, lon_step=5., lat_step=5., rate_edges=None):
+        self.lon_step, self.lat_step = lon_step, lat_step
+        self.lon_edges = np.linspace(0, 360, int(round(360 / lon_step)) + 1)
+        self.lat_edges = np.linspace(-90, 90, int(round(180 / lat_step)) + 1)
+        self.rate_edges = np.logspace(-8, -2, 121) if rate_edges is None \
+            else np.asarray(rate_edges, dtype=float)
+
+        self.shape = (len(self.lat_edges) - 1, len(self.lon_edges) - 1)
+        ncells = self.shape[0] * self.shape[1]
+
+        self.counts = np.zeros(ncells, dtype=np.int64)
+        self.sums = np.zeros(ncells)
+        self.histogram = np.zeros((ncells, len(self.rate_edges) + 1),
+                                  dtype=np.int64)
+
+    def add(self, longitude, latitude, darks):
+        """Add dark rates to the grid with a single bincount per
+        aggregate."""
+        longitude = np.asarray(longitude, dtype=float)
+        latitude = np.asarray(latitude, dtype=float)
+        darks = np.asarray(darks, dtype=float)
+
+        good = np.isfinite(longitude) & np.isfinite(latitude) & \
+            np.isfinite(darks)
+        longitude, latitude, darks = \
+            longitude[good], latitude[good], darks[good]
+
+        nlat, nlon = self.shape
+        ix = np.clip(((longitude % 360) // (360 / nlon)).astype(int), 0,
+                     nlon - 1)
+        iy = np.clip(((latitude + 90) // (180 / nlat)).astype(int), 0,
+                     nlat - 1)
+        cells = iy * nlon + ix
+
+        ncells, nbuckets = self.histogram.shape
+        self.counts += np.bincount(cells, minlength=ncells)
+        self.sums += np.bincount(cells, weights=darks, minlength=ncells)
+
+        buckets = np.searchsorted(self.rate_edges, darks, side='right')
+        self.histogram += np.bincount(
+            cells * nbuckets + buckets, minlength=ncells * nbuckets
+        ).reshape(ncells, nbuckets)
+
+        return self
+
+    def statistic(self, kind='mean'):
+        """Get the count, mean or median of each cell with shape (latitude,
+        longitude). Cells without data are NaN (or 0 for count)."""
+        if kind == 'count':
+            return self.counts.reshape(self.shape)
+
+        empty = self.counts == 0
+
+        if kind == 'mean':
+            result = self.sums / np.where(empty, 1, self.counts)
+
+        elif kind == 'median':
+            # representative rate of each histogram bucket
+            edges = self.rate_edges
+            values = np.concatenate(
+                [[0.], np.sqrt(edges[:-1] * edges[1:]), [edges[-1]]])
+
+            cumulative = np.cumsum(self.histogram, axis=1)
+            bucket = (cumulative < (self.counts[:, None] / 2)).sum(axis=1)
+            result = values[np.minimum(bucket, len(values) - 1)]
+
+        else:
+            raise ValueError(
+                f'{kind} is not one of ("count", "mean", "median")')
+
+        return np.where(empty, np.nan, result).reshape(self.shape)
+
+    def to_json(self):
+        cells = np.flatnonzero(self.counts)
+        buckets = np.flatnonzero(self.histogram)
+
+        return json.dumps({
+            'lon_step': self.lon_step, 'lat_step': self.lat_step,
+            'rate_edges': self.rate_edges.tolist(), 'cells': cells.tolist(),
+            'counts': self.counts[cells].tolist(),
+            'sums': self.sums[cells].tolist(), 'buckets': buckets.tolist(),
+            'histogram': self.histogram.ravel()[buckets].tolist()
+        })
+
+    @classmethod
+    def from_json(cls, string):
+        state = json.loads(string)
+
+        grid = cls(state['lon_step'], state['lat_step'], state['rate_edges'])
+        grid.counts[state['cells']] = state['counts']
+        grid.sums[state['cells']] = state['sums']
+        grid.histogram.ravel()[state['buckets']] = state['histogram']
+
+        return grid
+
+
+class DarkBins(NamedTuple):
+    """Binned dark events for one exposure."""
+    counts: np.ndarray  # event counts with shape (regions, time bins)
+    centers: np.ndarray  # time bin centers
+    latitude: np.ndarray  # latitude at the bin centers
+    longitude: np.ndarray  # longitude at the bin centers
+
+
+def bin_dark_events(time, xcorr, ycorr, pha, time_bins, lookup,
+                    orbit_time, latitude, longitude, pha_range=GOOD_PHA):
+    """Array-level dark binning kernel. Counts the events in each region of
+    the lookup (a RegionLookup or a list of location boxes) and time bin,
+    keeping only events within pha_range (exclusive; None for no PHA
+    filtering). The latitude and longitude are interpolated at the bin
+    centers from the orbit_time samples. Only depends on numpy, so it can
+    be used by the monitors or inside of ingestion workers."""
+    if not isinstance(lookup, RegionLookup):
+        lookup = RegionLookup(lookup)
+
+    time_bins = np.asarray(time_bins, dtype=float)
+    nbins = max(len(time_bins) - 1, 0)
+
+    # filter the events before binning them
+    time = np.asarray(time, dtype=float)
+    keep = (time >= time_bins[0]) & (time <= time_bins[-1]) if nbins else \
+        np.zeros(len(time), dtype=bool)
+
+    if pha_range is not None:
+        pha = np.asarray(pha)
+        keep &= (pha > pha_range[0]) & (pha < pha_range[1])
+
+    time = time[keep]
+
+    # time bins are closed on the right for the last bin (as np.histogram)
+    bins = np.minimum(
+        np.searchsorted(time_bins, time, side='right') - 1, nbins - 1)
+
+    counts = lookup.counts(
+        np.asarray(xcorr)[keep], np.asarray(ycorr)[keep], bins, nbins
+    )
+
+    centers = (time_bins[:-1] + time_bins[1:]) / 2
+    orbit_time = np.asarray(orbit_time, dtype=float)
+    lat = np.interp(centers, orbit_time, latitude)
+
+    # longitude wraps around at 360 degrees
+    lon = np.interp(
+        centers, orbit_time, np.unwrap(longitude, period=360)) % 360
+
+    return DarkBins(counts, centers, lat, lon)
+
+
+def exposure_dark_rates(df_row, lookup, filter_pha):
+    """Calculate the dark rates in every region of the lookup for one dark
+    corrtag file in a single pass over its events. Returns the dark rates
+    with shape (regions, time bins), and the dates, latitudes and
+    longitudes of the bin centers."""
+    binned = bin_dark_events(
+        df_row['TIME'], df_row['XCORR'], df_row['YCORR'],
+        df_row['PHA'] if filter_pha else None,
+        np.asarray(df_row['TIME_3'])[::DARK_TIME_STEP], lookup,
+        df_row['TIME_3'], df_row['LATITUDE'], df_row['LONGITUDE'],
+        pha_range=GOOD_PHA if filter_pha else None
+    )
+
+    date = absolute_datetime(expstart=df_row['EXPSTART'], time=binned.centers)
+
+    darks = binned.counts / lookup.npix[:, None] / DARK_TIME_STEP
+
+    return darks, date, binned.latitude, binned.longitude
+
+
+def compute_dark_rates(data, segment, locations):
+    """Calculate the dark rates for each location on a segment from dark
+    corrtag data. Each exposure is handled once for all of the locations.
+    Returns one row per region and time bin; region is the index of the
+    location."""
+    lookup = RegionLookup(locations)
+    filter_pha = segment != "N/A"  # NUV doesn't have PHA
+
+    results = []
+    for _, row in data.iterrows():
+        if row.EXPSTART == 0 or row.SEGMENT != segment:
+            continue
+
+        darks, date, lat, lon = exposure_dark_rates(row, lookup, filter_pha)
+        nregions, nbins = darks.shape
+
+        results.append(pd.DataFrame({
+            'segment': row.SEGMENT, 'rootname': row.ROOTNAME,
+            'region': np.repeat(np.arange(nregions), nbins),
+            'darks': darks.ravel(), 'date': np.tile(date, nregions),
+            'latitude': np.tile(lat, nregions),
+            'longitude': np.tile(lon, nregions)
+        }))
+
+    if not results:
+        return pd.DataFrame(columns=[
+            'segment', 'rootname', 'region', 'darks', 'date', 'latitude',
+            'longitude'
+        ])
+
+    return pd.concat(results, ignore_index=True)
+
+
+def _update_dark_rates(model, segment, regions):
+    """Calculate and store the dark rates for the exposures in the new data,
+    and then for the stored exposures (read in batches), that don't have
+    stored results yet, and return all of the stored results for the
+    regions. If nothing has been ingested yet, the results can't be stored
+    and the rates of the new data are returned."""
+    names = [region_name(region) for region in regions]
+    new_data = model.new_data
+
+    if not model._bind_dark(create=True):
+        return compute_dark_rates(
+            pd.DataFrame() if new_data is None else new_data, segment,
+            regions)
+
+    if new_data is not None and not new_data.empty:
+        processed = processed_exposures(segment, names)
+        new_data = new_data[(new_data.SEGMENT == segment) &
+                            (new_data.EXPSTART != 0) &
+                            ~new_data.ROOTNAME.isin(processed)]
+
+        if not new_data.empty:
+            store_dark_rates(
+                segment, names, new_data.ROOTNAME.unique(),
+                compute_dark_rates(new_data, segment, regions)
+            )
+
+    # e.g. exposures that were ingested without a monitor run, or new
+    # regions
+    stored = model.model.select(model.model.ROOTNAME).where(
+        model.model.SEGMENT == segment, model.model.EXPSTART != 0)
+    unprocessed = sorted({row.ROOTNAME for row in stored} -
+                         processed_exposures(segment, names))
+
+    for data in model.iter_exposures(unprocessed, RATE_COLUMNS,
+                                     model.rate_batch_size):
+        store_dark_rates(segment, names, data.ROOTNAME.unique(),
+                         compute_dark_rates(data, segment, regions))
+
+    return load_dark_rates(segment, names)
+
+
+def segment_dark_rates(model, segment, locations):
+    """Get the dark rates for the given locations on a segment. The rates
+    for all of the monitored regions of the segment (and any extra
+    locations) are computed together, only for exposures that don't have
+    stored results, and are shared by the dark monitors for the duration
+    of a run. region is renumbered to the index in locations."""
+    locations = [tuple(location) for location in locations]
+    regions = [tuple(location) for location in DARK_REGIONS.get(segment, [])]
+    regions += [location for location in locations if location not in regions]
+
+    rates = RUN_CACHE.get(
+        (type(model), 'dark_rates', segment, tuple(regions)),
+        lambda: _update_dark_rates(model, segment, regions)
+    )
+
+    region_index = pd.Series(
+        range(len(locations)), index=[regions.index(location) for location in
+                                      locations]
+    )
+    selected = rates[rates.region.isin(region_index.index)].copy()
+    selected['region'] = selected.region.map(region_index).values
+
+    return selected.reset_index(drop=True)
+
+
 def dark_filter(df_row, filter_pha, location):
     """Given a row corresponding to a dark corrtag file, filter it based on
     the location and PHA (if FUV), and calculate dark rate information. Will
-    return the exploded dataframe with the correct dark information for that
-    one file."""
-    good_pha = (2, 23)
-    # time step stuff
-    time_step = 25
-    time_bins = df_row['TIME_3'][::time_step]
-    lat = df_row['LATITUDE'][::time_step][:-1]
-    lon = df_row['LONGITUDE'][::time_step][:-1]
-
-    # filtering pha
-    if filter_pha:
-        event_df = df_row[
-            ['SEGMENT', 'XCORR', 'YCORR', 'PHA', 'TIME']].to_frame().T
-        event_df = explode_df(event_df, ['XCORR', 'YCORR', 'PHA', 'TIME'])
-    else:
-        event_df = df_row[['SEGMENT', 'XCORR', 'YCORR', 'TIME']].to_frame().T
-        event_df = explode_df(event_df, ['XCORR', 'YCORR', 'TIME'])
-
-    # creating event dataframe and filtering it by location on the detector
-    npix = (location[1] - location[0]) * (location[3] - location[2])
-    index = np.where((event_df['XCORR'] > location[0]) & (
-                event_df['XCORR'] < location[1]) & (
-                                 event_df['YCORR'] > location[2]) & (
-                                 event_df['YCORR'] < location[3]))
-    filtered_row = event_df.iloc[index].reset_index(drop=True)
-
-    # filtered events only need to be further filtered by PHA if not NUV
-    if filter_pha:
-        filtered_row = filtered_row[(filtered_row['PHA'] > good_pha[0]) & (
-                filtered_row['PHA'] < good_pha[1])]
-
-    counts = np.histogram(filtered_row.TIME, bins=time_bins)[0]
-
-    date = absolute_time(
-        expstart=list(repeat(df_row['EXPSTART'], len(time_bins))),
-        time=time_bins.tolist()).to_datetime()[:-1]
-
-    dark_rate = counts / npix / time_step
+    return a dataframe with the dark information arrays for that one
+    file."""
+    darks, date, lat, lon = exposure_dark_rates(
+        df_row, RegionLookup([location]), filter_pha)
 
     return pd.DataFrame({
-        'segment': df_row['SEGMENT'], 'darks': [dark_rate], 'date': [date],
+        'segment': df_row['SEGMENT'], 'darks': [darks[0]], 'date': [date],
         'rootname': df_row['ROOTNAME'], 'latitude': [lat], "longitude": [lon]
         })
 
 
+class SolarFluxProvider:
+    """Solar radio flux indices from NOAA with an on-disk cache. The cache
+    is refreshed when it's older than ttl hours; if the download fails, a
+    stale cache is used instead. In offline mode, only the cache file is
+    read. The url may also be a local file or a local HTTP stand-in."""
+
+    def __init__(self, url=None, cache=None, ttl=None, offline=None):
+        self.url = url or SOLAR['url']
+        self.cache = cache or SOLAR['cache']
+        self.ttl = SOLAR['ttl'] if ttl is None else ttl
+        self.offline = SOLAR['offline'] if offline is None else offline
+
+    def _cache_age(self):
+        """Age of the cache file in hours (None if it doesn't exist)."""
+        if not os.path.exists(self.cache):
+            return
+
+        return (time.time() - os.path.getmtime(self.cache)) / 3600
+
+    def _download(self):
+        """Download the indices and update the cache file."""
+        url = self.url
+        if '://' not in url:  # local file
+            url = pathlib.Path(url).resolve().as_uri()
+
+        with request.urlopen(url) as response:
+            status = getattr(response, 'status', None)
+            if status not in (None, 200):
+                raise OSError(f"Invalid response! HTTP Status Code: {status}")
+
+            content = response.read()
+
+        data = json.loads(content)
+
+        cache_dir = os.path.dirname(os.path.abspath(self.cache))
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(self.cache, 'wb') as cache:
+            cache.write(content)
+
+        return data
+
+    def load(self):
+        """Get the raw indices from the cache or from the url."""
+        age = self._cache_age()
+
+        if self.offline:
+            if age is None:
+                raise FileNotFoundError(
+                    f"Offline mode: no cached solar data at {self.cache}")
+
+        elif age is None or age > self.ttl:
+            try:
+                return self._download()
+
+            except (OSError, ValueError) as e:
+                if age is None:
+                    raise
+
+                warnings.warn(
+                    f"Solar data could not be downloaded; using the cached "
+                    f"data from {age:.1f} hours ago.\n{str(e)}", Warning)
+
+        with open(self.cache) as cache:
+            return json.load(cache)
+
+    def flux(self, box=4):
+        """Get the solar indices indexed by date, with the f10.7 flux
+        smoothed by a box kernel of width box."""
+        df = pd.DataFrame(self.load())
+        df.index = pd.DatetimeIndex(pd.to_datetime(df['time-tag'],
+                                                   format='%Y-%m'))
+
+        # smoothing the f10.7 data
+        kernel = Box1DKernel(box)
+        df["box_convolved_f10.7"] = convolve(df["f10.7"], kernel)
+
+        return df
+
+
+def get_solar_flux(datemin, datemax, box=4):
+    """Get the solar flux data for a date range. The (smoothed) data is
+    shared by the dark monitors for the duration of a run."""
+    provider = SolarFluxProvider()
+    df = RUN_CACHE.get(
+        (SolarFluxProvider, provider.url, provider.cache, box),
+        lambda: provider.flux(box)
+    )
+
+    return df.loc[datemin:datemax]
+
+
 def get_solar_data(url, datemin, datemax, box=4):
-    """Download the most recent solar data, save as file and dataframe,
-    filter dataframe to date range. Also replace -1 values in the smoothed
-    flux."""
-    response = request.urlopen(url)
-    if response.status == 200:
-        data = json.loads(response.read())
-    else:
-        print("Invalid response! HTTP Status Code: {}".format(response.status))
-    df = pd.DataFrame(data)
-    dates = [datetime.datetime.strptime(val, '%Y-%m') for val in
-             df['time-tag']]
-    df.index = pd.DatetimeIndex(dates)
-
-    todays_date = datetime.datetime.today().strftime('%b%d_%Y')
-    outfile = os.path.join(COS_MONITORING,
-                           "noaa_solar_indices_{}.txt".format(todays_date))
-    # print("Saving outfile: {}".format(outfile))
-    df.to_csv(outfile, header=True, index=True)
-
-    # print("Filtering the dataframe to the date range: {}, {}".format(datemin,
-    #                                                                  datemax))
-    df = df.loc[datemin:datemax]
-    # smoothing the f10.7 data
-    kernel = Box1DKernel(box)
-    smoothed_107 = convolve(df["f10.7"], kernel)
-    df["box_convolved_f10.7"] = smoothed_107
-
-    return df
+    """Get the most recent solar data (from the cache if it's recent
+    enough), filter dataframe to date range. Also replace -1 values in the
+    smoothed flux."""
+    return SolarFluxProvider(url).flux(box).loc[datemin:datemax]
 
 
 class DarkMonitor(BaseMonitor):
@@ -145,48 +465,46 @@ class DarkMonitor(BaseMonitor):
     multi = False
     sub_names = None
     filter_saa = True
+    # calculate the distribution statistics from the data instead of the
+    # stored sketches
+    exact_statistics = False
+    # orbital variation plot: a heatmap of the orbital_statistic ('mean',
+    # 'median' or 'count') on a longitude/latitude grid ('grid'), or every
+    # dark rate ('scatter')
+    orbital_mode = 'grid'
+    orbital_statistic = 'mean'
+    orbital_grid_steps = (5, 5)  # longitude, latitude (degrees)
     inner_region = 4  # number region that corresponds to the inner_region,
     # for FUV use only.
 
+    def __init__(self):
+        self._sketches = None
+        super().__init__()
+
     def get_data(self):  # -> Any: fix this later,
         """Required method to get the data necessary for plotting in the
-        correct format. Takes care of all data organization and "explosion"
-        of dataframes. Returns full dataframe with correct calculations and
-        columns."""
-        # should be fine in the monitor, just not in jupyter notebook
-        if self.multi:
-            # prime the pump
-            exploded_df = self.filter_data(self.location[0])
-            exploded_df["region"] = 0
-            for index, location in enumerate(self.location[1:]):
-                sub_exploded_df = self.filter_data(location)
-                sub_exploded_df["region"] = index + 1
-                exploded_df = exploded_df.append(sub_exploded_df)
-
-        else:
-            exploded_df = self.filter_data(self.location)
+        correct format. The dark rates for all of the locations are
+        calculated together, with one row per region and time bin. Returns
+        full dataframe with correct calculations and columns."""
+        locations = self.location if self.multi else [self.location]
 
-        return exploded_df
+        return self._add_saa_flag(
+            segment_dark_rates(self.model, self.segment, locations))
 
     def filter_data(self, location):
-        """Given a location (region) on the detector, filter down the new
-        data from the DataModel as appropriate and perform dark filtering
-        and "explosion" of dataframe as necessary. Return the fully
-        "exploded" data for that location."""
-        filtered_rows = []
-        for _, row in self.model.new_data.iterrows():
-            if row.EXPSTART == 0:
-                continue
-            if row.SEGMENT == self.segment:
-                if row.SEGMENT == "N/A":  # NUV
-                    filtered_rows.append(dark_filter(row, False, location))
-                else:  # Any of the FUV situations
-                    filtered_rows.append(dark_filter(row, True, location))
-        filtered_df = pd.concat(filtered_rows).reset_index(drop=True)
-
-        exploded_df = explode_df(filtered_df,
-                                 ['darks', 'date', 'latitude', 'longitude'])
-        # after exploding, add SAA filtering if required
+        """Given a location (region) on the detector, get the dark rate
+        data for that location. Return the fully "exploded" data for that
+        location."""
+        return self._add_saa_flag(
+            segment_dark_rates(self.model, self.segment, [location]))
+
+    def _bind_results(self):
+        """Whether the results can be stored in the data model's database
+        (the dark tables are bound, and created if necessary)."""
+        return self.model._bind_dark(create=True)
+
+    def _add_saa_flag(self, exploded_df):
+        """Add SAA filtering if required."""
         if self.filter_saa:
             exploded_df["no_saa"] = np.where(
                 exploded_df.eval("latitude > 10 or longitude < 260"), 1, 0)
@@ -263,7 +581,7 @@ class DarkMonitor(BaseMonitor):
         datemax = self.data[self.x].max()
 
         # sunpy_data = sunpy_retriever(date_min, date_max)
-        solar_data = get_solar_data(NOAA_URL, datemin, datemax)
+        solar_data = get_solar_flux(datemin, datemax)
         solar_time = solar_data.index
         solar_flux = solar_data["f10.7"]
         solar_flux_smooth = solar_data["box_convolved_f10.7"]
@@ -293,14 +611,15 @@ class DarkMonitor(BaseMonitor):
         if self.data is None:
             self.data = self.get_data()
 
-        dist995, dark_column, lines = self.calculate_histogram(nbins)
+        dist995, (counts, bins), lines = self.calculate_histogram(nbins)
         full_names = [f"Mean: {lines[0]:.2e}", f"Median: {lines[0]:.2e}",
                       f"2 sigma: {lines[2]:.2e}", f"3 sigma: {lines[3]:.2e}",
                       f"95%: {lines[4]:.2e}", f"99%: {lines[5]:.2e}"]
 
         # histogram
         fig = go.Figure(
-            data=[go.Histogram(x=dark_column, nbinsx=nbins, showlegend=False)])
+            data=[go.Bar(x=(bins[:-1] + bins[1:]) / 2, y=counts,
+                         width=np.diff(bins), showlegend=False)])
 
         # value lines--have to do a shape and trace for both of them until
         # plotly adds vertical line plotting features (because shapes can't
@@ -378,63 +697,139 @@ class DarkMonitor(BaseMonitor):
 
         fig.write_html(output)
 
-    def calculate_histogram(self, nbins=100):
-        """Calculate the histogram distribution for the important plot and
-        ETC values."""
+    @property
+    def statistics_region(self):
+        """Region used for the distribution statistics: the inner region
+        for the multi-region FUV monitors."""
+        return self.inner_region if self.multi and "FUV" in self.segment \
+            else 0
+
+    def _statistics_data(self, region=None):
+        """Rows of the data used for the distribution statistics."""
         if self.data is None:
             self.data = self.get_data()
 
         # filter out the flag == 0 / grab the flag == 1 from self.data[self.y]
+        keep = np.ones(len(self.data), dtype=bool)
         if self.filter_saa:
-            dark_column = self.data[self.y].loc[self.data["no_saa"] == 1]
-            if "FUV" in self.segment:
-                dark_column = self.data[self.y].loc[
-                    (self.data["no_saa"] == 1) & (
-                                self.data["region"] == self.inner_region)]
+            keep &= (self.data["no_saa"] == 1).values
+
+        if "region" in self.data:
+            keep &= (self.data["region"] == (
+                self.statistics_region if region is None else region)).values
+
+        return self.data[keep]
+
+    @property
+    def sketches(self):
+        """Stored dark rate distribution sketches for each region, updated
+        with the exposures in the data that haven't been added yet."""
+        if self._sketches is None:
+            locations = self.location if self.multi else [self.location]
+            saa = "no_saa" if self.filter_saa else "all"
+
+            self._sketches = [
+                update_sketch(
+                    f'{self.segment}/{region_name(location)}/{saa}',
+                    self._statistics_data(region)
+                ) for region, location in enumerate(locations)
+            ]
+
+        return self._sketches
+
+    def calculate_histogram(self, nbins=100, exact=None):
+        """Calculate the histogram distribution for the important plot and
+        ETC values. By default, the values are calculated from the stored
+        sketch for the full history. If exact (or exact_statistics), or if
+        the results can't be stored, they are calculated from the data
+        instead."""
+        if (self.exact_statistics if exact is None else exact) or \
+                not self._bind_results():
+            dark_column = self._statistics_data()[self.y]
+
+            counts, bins = np.histogram(dark_column, bins=nbins)
+            cuml_dist = np.cumsum(counts)
+            count_99 = abs(cuml_dist / float(cuml_dist.max()) - .99).argmin()
+            count_95 = abs(cuml_dist / float(cuml_dist.max()) - .95).argmin()
+            # only used for plotting
+            count995 = abs(
+                cuml_dist / float(cuml_dist.max()) - .995).argmin()
+
+            mean = dark_column.mean()
+            med = np.median(dark_column)
+            std = dark_column.std()
+            dist95 = bins[count_95]
+            dist99 = bins[count_99]
+            dist995 = bins[count995]
+
         else:
-            dark_column = self.data[self.y]
-
-        counts, bins = np.histogram(dark_column, bins=nbins)
-        cuml_dist = np.cumsum(counts)
-        count_99 = abs(cuml_dist / float(cuml_dist.max()) - .99).argmin()
-        count_95 = abs(cuml_dist / float(cuml_dist.max()) - .95).argmin()
-        # only used for plotting
-        count995 = abs(cuml_dist / float(cuml_dist.max()) - .995).argmin()
-
-        mean = dark_column.mean()
-        med = np.median(dark_column)
-        std = dark_column.std()
+            sketch = self.sketches[self.statistics_region]
+
+            counts, bins = sketch.histogram(nbins)
+            mean, std = sketch.mean, sketch.std
+            med, dist95, dist99, dist995 = sketch.quantile(
+                [.5, .95, .99, .995])
+
         onesig = med + std
         twosig = med + (2 * std)
         threesig = med + (3 * std)
-        dist95 = bins[count_95]
-        dist99 = bins[count_99]
-        dist995 = bins[count995]
         values = [mean, med, onesig, twosig, threesig, dist95, dist99]
 
-        return dist995, dark_column, values
+        return dist995, (counts, bins), values
 
     def track(self, nbins=100):
         _, _, track_list = self.calculate_histogram(nbins)
         return track_list
 
+    def orbital_grid(self):
+        """Get the stored orbital variation grid for the monitor, updated
+        with the exposures in the data that haven't been added yet. If the
+        results can't be stored, the grid is made from the data."""
+        if self.data is None:
+            self.data = self.get_data()
+
+        lon_step, lat_step = self.orbital_grid_steps
+
+        if not self._bind_results():
+            return OrbitalGrid(lon_step, lat_step).add(
+                self.data.longitude, self.data.latitude, self.data.darks)
+
+        return update_aggregate(
+            f'orbital/{self.name}/{lon_step}x{lat_step}', self.data,
+            lambda: OrbitalGrid(lon_step, lat_step), OrbitalGrid.from_json,
+            lambda grid, new: grid.add(new.longitude, new.latitude, new.darks)
+        )
+
     def plot_orbital_variation(self):
         """Make the orbital variation plot and write out the file to the
         correct outpath."""
         if self.data is None:
             self.data = self.get_data()
 
-        colormin = self.data["darks"].min()
-        colormax = self.data["darks"].max()
-        fig = go.Figure(data=[
-            go.Scatter(x=self.data["longitude"], y=self.data["latitude"],
-                       mode="markers",
-                       marker=dict(color=self.data["darks"], size=2,
-                                   colorscale='Viridis', opacity=0.5,
-                                   colorbar=dict(thickness=20,
-                                                 exponentformat="e",
-                                                 title=dict(text="Dark Rate")),
-                                   cmin=colormin, cmax=colormax))])
+        if self.orbital_mode == 'grid':
+            grid = self.orbital_grid()
+            lon_edges, lat_edges = grid.lon_edges, grid.lat_edges
+
+            fig = go.Figure(data=[
+                go.Heatmap(x=(lon_edges[:-1] + lon_edges[1:]) / 2,
+                           y=(lat_edges[:-1] + lat_edges[1:]) / 2,
+                           z=grid.statistic(self.orbital_statistic),
+                           colorscale='Viridis',
+                           colorbar=dict(thickness=20, exponentformat="e",
+                                         title=dict(text="Dark Rate")))])
+
+        else:
+            colormin = self.data["darks"].min()
+            colormax = self.data["darks"].max()
+            fig = go.Figure(data=[
+                go.Scatter(x=self.data["longitude"], y=self.data["latitude"],
+                           mode="markers",
+                           marker=dict(color=self.data["darks"], size=2,
+                                       colorscale='Viridis', opacity=0.5,
+                                       colorbar=dict(
+                                           thickness=20, exponentformat="e",
+                                           title=dict(text="Dark Rate")),
+                                       cmin=colormin, cmax=colormax))])
 
         datemin = self.data[self.x].min()
         datemax = self.data[self.x].max()
@@ -459,8 +854,10 @@ class DarkMonitor(BaseMonitor):
         fig.write_html(output)
 
     def store_results(self):
-        # TODO: Define results to store
-        pass
+        """Store the tracked statistics. The dark rates for each exposure
+        are stored when they're calculated."""
+        if self.results is not None and self._bind_results():
+            store_track(self.name, self.results)
 
 
 # ----------------------------------------------------------------------------#
@@ -471,9 +868,7 @@ class FUVADarkMonitor(DarkMonitor):
     name = 'FUVA Dark Monitor'
     segment = 'FUVA'
     multi = True
-    location = [(1060, 15250, 296, 375), (1060, 1260, 296, 734),
-                (1060, 15250, 660, 734), (15119, 15250, 296, 734),
-                (1260, 15119, 375, 660)]
+    location = DARK_REGIONS['FUVA']
     sub_names = ["FUVA Dark Monitor - Bottom", "FUVA Dark Monitor - Left",
                  "FUVA Dark Monitor - Top", "FUVA Dark Monitor - Right",
                  "FUVA Dark Monitor - Inner"]
@@ -484,9 +879,7 @@ class FUVBDarkMonitor(DarkMonitor):
     name = 'FUVB Dark Monitor'
     segment = 'FUVB'
     multi = True
-    location = [(809, 15182, 360, 405), (809, 1000, 360, 785),
-                (809, 15182, 740, 785), (14990, 15182, 360, 785),
-                (1000, 14990, 405, 740)]
+    location = DARK_REGIONS['FUVB']
     sub_names = ["FUVB Dark Monitor - Bottom", "FUVB Dark Monitor - Left",
                  "FUVB Dark Monitor - Top", "FUVB Dark Monitor - Right",
                  "FUVB Dark Monitor - Inner"]
@@ -566,6 +959,5 @@ class NUVDarkMonitor(DarkMonitor):
     """NUV Dark Monitor for full detector."""
     name = "NUV Dark Monitor"
     segment = "N/A"
-    location = (0, 1024, 0, 1024)
-
+    location = DARK_REGIONS['N/A'][0]
 
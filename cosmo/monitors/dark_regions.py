@@ -0,0 +1,81 @@
+import numpy as np
+
+GOOD_PHA = (2, 23)  # exclusive PHA limits for FUV events
+
+# all of the regions that are monitored on each segment (x0, x1, y0, y1): the bottom, left, top and right edges and the
+# inner region of each FUV segment, and the full NUV detector
+DARK_REGIONS = {
+    'FUVA': [
+        (1060, 15250, 296, 375), (1060, 1260, 296, 734), (1060, 15250, 660, 734), (15119, 15250, 296, 734),
+        (1260, 15119, 375, 660)
+    ],
+    'FUVB': [
+        (809, 15182, 360, 405), (809, 1000, 360, 785), (809, 15182, 740, 785), (14990, 15182, 360, 785),
+        (1000, 14990, 405, 740)
+    ],
+    'N/A': [(0, 1024, 0, 1024)]
+}
+
+
+class RegionLookup:
+    """Lookup from detector positions to the location boxes (x0, x1, y0,
+    y1) that contain them. Boxes may overlap, so the detector is divided
+    into cells along every box edge, and each cell has the set of regions
+    that contain it. The edges themselves are separate cells so that the
+    boxes keep their strict (exclusive) limits."""
+
+    def __init__(self, locations):
+        self.locations = [tuple(location) for location in locations]
+        self.npix = np.array([
+            (x1 - x0) * (y1 - y0) for x0, x1, y0, y1 in self.locations
+        ], dtype=float)
+
+        self.x_edges, x_member = self._axis(0)
+        self.y_edges, y_member = self._axis(2)
+
+        # membership[region, x cell, y cell]
+        self.membership = x_member[:, :, None] & y_member[:, None, :]
+
+    def _axis(self, column):
+        """Find the cell edges along one axis and which cells are inside
+        of each box."""
+        bounds = np.array(
+            [location[column:column + 2] for location in self.locations],
+            dtype=float
+        )
+        edges = np.unique(bounds)
+
+        # cells alternate between the open intervals and the edges
+        representative = np.empty(2 * len(edges) + 1)
+        representative[1::2] = edges
+        representative[2:-1:2] = (edges[:-1] + edges[1:]) / 2
+        representative[0], representative[-1] = edges[0] - 1, edges[-1] + 1
+
+        inside = (bounds[:, :1] < representative) & (
+                representative < bounds[:, 1:])
+
+        return edges, inside
+
+    @staticmethod
+    def _cells(edges, values):
+        left = np.searchsorted(edges, values, side='left')
+        on_edge = edges[np.minimum(left, len(edges) - 1)] == values
+
+        return 2 * left + on_edge
+
+    def cell_ids(self, x, y):
+        """Flat cell index for each position."""
+        return self._cells(self.x_edges, x) * self.membership.shape[2] + \
+            self._cells(self.y_edges, y)
+
+    def counts(self, x, y, bins, nbins):
+        """Count events per region and bin with a single bincount over
+        (cell, bin). bins is the bin index of each event. Returns an array
+        with shape (regions, nbins)."""
+        ncells = self.membership.shape[1] * self.membership.shape[2]
+        cell_counts = np.bincount(
+            self.cell_ids(x, y) * nbins + bins, minlength=ncells * nbins
+        ).reshape(ncells, nbins)
+
+        return self.membership.reshape(len(self.locations), -1).astype(
+            np.int64) @ cell_counts
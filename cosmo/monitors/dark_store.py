@@ -0,0 +1,216 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from typing import Sequence, Callable, Any
+from peewee import Model, TextField, FloatField, IntegerField, DateTimeField, chunked
+
+from ..monitor_helpers import QuantileSketch, MJD_EPOCH, mjd_to_datetime64, insert_records
+
+
+class BaseModel(Model):
+    """Dark results are stored in the dark data model's database (see DarkDataModel._bind_dark)."""
+
+
+class DarkSketch(BaseModel):
+    """Stored aggregate of dark rates, like the distribution sketch for a region (see QuantileSketch)."""
+    NAME = TextField(primary_key=True)
+    SKETCH = TextField()
+
+
+class DarkSketchExposure(BaseModel):
+    """Exposures whose dark rates have been added to a stored aggregate."""
+    NAME = TextField()
+    ROOTNAME = TextField()
+
+    class Meta:
+        indexes = ((('NAME', 'ROOTNAME'), True),)
+
+
+SKETCH_TABLES = [DarkSketch, DarkSketchExposure]
+
+
+class DarkExposure(BaseModel):
+    """Exposures that have dark rate results stored for a region."""
+    ROOTNAME = TextField()
+    SEGMENT = TextField()
+    REGION = TextField()
+
+    class Meta:
+        indexes = ((('SEGMENT', 'REGION', 'ROOTNAME'), True),)
+
+
+class DarkRate(BaseModel):
+    """Dark rates for each exposure, region and time bin."""
+    ROOTNAME = TextField()
+    SEGMENT = TextField()
+    REGION = TextField()
+    MJD = FloatField()  # Date of the bin
+    DARK = FloatField()
+    LATITUDE = FloatField()
+    LONGITUDE = FloatField()
+    NO_SAA = IntegerField()
+
+    class Meta:
+        indexes = ((('SEGMENT', 'REGION'), False), (('ROOTNAME',), False))
+
+
+class DarkTrack(BaseModel):
+    """Tracked dark rate statistics from each monitor run."""
+    NAME = TextField()
+    DATE = DateTimeField()
+    MEAN = FloatField()
+    MEDIAN = FloatField()
+    ONESIG = FloatField()
+    TWOSIG = FloatField()
+    THREESIG = FloatField()
+    DIST95 = FloatField()
+    DIST99 = FloatField()
+
+    class Meta:
+        indexes = ((('NAME', 'DATE'), False),)
+
+
+RESULT_TABLES = [DarkExposure, DarkRate, DarkTrack]
+DARK_TABLES = SKETCH_TABLES + RESULT_TABLES
+
+
+def region_name(location: Sequence[float]) -> str:
+    """Name of a region (location box) in the stored results."""
+    return ','.join(str(value) for value in location)
+
+
+def processed_exposures(segment: str, regions: Sequence[str]) -> set:
+    """Rootnames of the exposures that have stored results for all of the regions."""
+    if not DarkExposure.table_exists():
+        return set()
+
+    stored = pd.DataFrame(
+        DarkExposure.select(DarkExposure.ROOTNAME, DarkExposure.REGION)
+        .where(DarkExposure.SEGMENT == segment, DarkExposure.REGION << list(regions))
+        .dicts()
+    )
+
+    if stored.empty:
+        return set()
+
+    counts = stored.groupby('ROOTNAME').REGION.nunique()
+
+    return set(counts.index[counts == len(set(regions))])
+
+
+def store_dark_rates(segment: str, regions: Sequence[str], rootnames: Sequence[str], rates: pd.DataFrame):
+    """Store the dark rates (as returned by compute_dark_rates, with region as the index in regions) for exposures.
+    Any results that are already stored for the exposures and regions are replaced.
+    """
+    database = DarkRate._meta.database
+    database.create_tables(RESULT_TABLES, safe=True)
+
+    records = pd.DataFrame({
+        'ROOTNAME': rates.rootname.values,
+        'SEGMENT': segment,
+        'REGION': np.asarray(regions, dtype=object)[rates.region.values.astype(int)],
+        'MJD': (rates.date.values - MJD_EPOCH) / np.timedelta64(1, 'D'),
+        'DARK': rates.darks.values.astype(float),
+        'LATITUDE': rates.latitude.values.astype(float),
+        'LONGITUDE': rates.longitude.values.astype(float),
+        'NO_SAA': ((rates.latitude > 10) | (rates.longitude < 260)).values.astype(int)
+    })
+
+    with database.atomic():
+        for batch in chunked(list(rootnames), 500):
+            for model in (DarkExposure, DarkRate):
+                model.delete().where(
+                    model.SEGMENT == segment, model.REGION << list(regions), model.ROOTNAME << batch
+                ).execute()
+
+        insert_records(
+            DarkExposure,
+            [
+                {'ROOTNAME': rootname, 'SEGMENT': segment, 'REGION': region}
+                for rootname in rootnames for region in regions
+            ]
+        )
+        insert_records(DarkRate, records.to_dict(orient='records'))
+
+
+def load_dark_rates(segment: str, regions: Sequence[str]) -> pd.DataFrame:
+    """Get the stored dark rates for regions of a segment, in the format returned by compute_dark_rates (region is the
+    index in regions).
+    """
+    stored = pd.DataFrame(
+        DarkRate.select().where(DarkRate.SEGMENT == segment, DarkRate.REGION << list(regions)).dicts()
+    ) if DarkRate.table_exists() else pd.DataFrame()
+
+    if stored.empty:
+        return pd.DataFrame(
+            columns=['segment', 'rootname', 'region', 'darks', 'date', 'latitude', 'longitude', 'no_saa']
+        )
+
+    return pd.DataFrame({
+        'segment': stored.SEGMENT,
+        'rootname': stored.ROOTNAME,
+        'region': stored.REGION.map({region: index for index, region in enumerate(regions)}),
+        'darks': stored.DARK,
+        'date': mjd_to_datetime64(stored.MJD.values),
+        'latitude': stored.LATITUDE,
+        'longitude': stored.LONGITUDE,
+        'no_saa': stored.NO_SAA
+    })
+
+
+def store_track(name: str, values: Sequence[float]):
+    """Store the tracked statistics (as returned by DarkMonitor.track) for a monitor run."""
+    DarkTrack._meta.database.create_tables(RESULT_TABLES, safe=True)
+
+    DarkTrack.create(
+        NAME=name, DATE=datetime.datetime.now(),
+        **dict(zip(['MEAN', 'MEDIAN', 'ONESIG', 'TWOSIG', 'THREESIG', 'DIST95', 'DIST99'], map(float, values)))
+    )
+
+
+def load_aggregate(name: str, create: Callable[[], Any], from_json: Callable[[str], Any]) -> Any:
+    """Get a stored aggregate (like a QuantileSketch). If it doesn't exist, a new one is created."""
+    stored = DarkSketch.get_or_none(DarkSketch.NAME == name) if DarkSketch.table_exists() else None
+
+    return from_json(stored.SKETCH) if stored else create()
+
+
+def update_aggregate(name: str, rates: pd.DataFrame, create: Callable[[], Any], from_json: Callable[[str], Any],
+                     add: Callable[[Any, pd.DataFrame], Any]) -> Any:
+    """Add the dark rates of exposures (the rootname column) that haven't been added to a stored aggregate yet with
+    add(aggregate, rates), store it and return it.
+    """
+    database = DarkSketch._meta.database
+    database.create_tables(SKETCH_TABLES, safe=True)
+
+    with database.atomic():
+        aggregate = load_aggregate(name, create, from_json)
+
+        added = DarkSketchExposure.select(DarkSketchExposure.ROOTNAME).where(DarkSketchExposure.NAME == name)
+        new = rates[~rates.rootname.isin({row.ROOTNAME for row in added})]
+
+        if not new.empty:
+            add(aggregate, new)
+
+            DarkSketch.replace(NAME=name, SKETCH=aggregate.to_json()).execute()
+            insert_records(
+                DarkSketchExposure, [{'NAME': name, 'ROOTNAME': rootname} for rootname in new.rootname.unique()]
+            )
+
+    return aggregate
+
+
+def load_sketch(name: str) -> QuantileSketch:
+    """Get a stored sketch. If it doesn't exist, an empty sketch is returned."""
+    return load_aggregate(name, QuantileSketch, QuantileSketch.from_json)
+
+
+def update_sketch(name: str, rates: pd.DataFrame) -> QuantileSketch:
+    """Add the dark rates (the darks column) of exposures (the rootname column) that haven't been added to the stored
+    sketch yet, store it and return it.
+    """
+    return update_aggregate(
+        name, rates, QuantileSketch, QuantileSketch.from_json, lambda sketch, new: sketch.add(new.darks.values)
+    )
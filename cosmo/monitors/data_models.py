@@ -1,19 +1,31 @@
 import pandas as pd
 import numpy as np
 import os
+import json
 from glob import glob
 
-from typing import List
+from contextlib import contextmanager
+from typing import List, Sequence, Iterable, Iterator, Hashable, Callable, Any, Type, Union
 from monitorframe.datamodel import BaseDataModel
-from peewee import OperationalError
-
-from ..filesystem import find_files, data_from_exposures, data_from_jitters
+from peewee import OperationalError, Database, Model, chunked
+
+from ..filesystem import (
+    find_files, data_from_exposures, data_from_jitters, iter_data_from_exposures, iter_data_from_jitters
+)
+from .osm_views import OSM_VIEWS, SOURCE_COLUMNS, OSMFlash, derive_osm_views
+from . import acq_views
+from . import dark_maps
+from .dark_store import DARK_TABLES
+from ..monitor_helpers import RaggedArray, insert_records
 from ..sms import SMSTable
 from .. import SETTINGS
 
 FILES_SOURCE = SETTINGS['filesystem']['source']
 PROGRAMS = SETTINGS['dark_programs']
 
+BULK_BATCH_BYTES = 64 * 2 ** 20  # Approximate size of the row data written per transaction during bulk ingestion
+BULK_PRAGMAS = {'journal_mode': 'memory', 'synchronous': 0}  # Fast, but unsafe, journal settings for bulk ingestion
+
 
 def dgestar_to_fgs(results: List[dict]) -> None:
     """Add a FGS key to each row dictionary."""
@@ -21,14 +33,362 @@ def dgestar_to_fgs(results: List[dict]) -> None:
         item.update({'FGS': item['DGESTAR'][-2:]})  # The dominant guide star key is the last 2 values in the string
 
 
-class AcqDataModel(BaseDataModel):
+def add_fgs(item: dict) -> dict:
+    """Add the FGS key to a single row dictionary. Used as a worker-side reducer."""
+    dgestar_to_fgs([item])
+
+    return item
+
+
+def has_lampflashes(item: dict) -> Union[dict, None]:
+    """Drop rows with empty data columns. Used as a worker-side reducer."""
+    return item if len(item['SHIFT_DISP']) else None
+
+
+def is_missing(value: Any) -> bool:
+    """Whether a row value is missing or non-finite (what DataFrame.replace([inf, -inf], nan).dropna() drops)."""
+    return value is None or (isinstance(value, (float, np.floating)) and not np.isfinite(value))
+
+
+def good_jitter_rows(rows: List[dict]) -> List[dict]:
+    """Remove jitter rows with missing or non-finite values or from ACQ, DARK or FLAT exposures. Used as a worker-side
+    reducer.
+    """
+    return [
+        row for row in rows
+        if not any(is_missing(value) for value in row.values())
+        and not any(exptype in row['EXPTYPE'] for exptype in ('ACQ', 'DARK', 'FLAT'))
+    ]
+
+
+def row_nbytes(row: dict) -> int:
+    """Approximate the size of a row of data in bytes."""
+    return sum(
+        value.nbytes if isinstance(value, np.ndarray) else len(value) if isinstance(value, str) else 8
+        for value in row.values()
+    )
+
+
+def byte_batches(rows: Iterable[dict], batch_bytes: int) -> Iterator[List[dict]]:
+    """Group rows into lists whose combined size is approximately batch_bytes."""
+    batch, size = [], 0
+
+    for row in rows:
+        batch.append(row)
+        size += row_nbytes(row)
+
+        if size >= batch_bytes:
+            yield batch
+
+            batch, size = [], 0
+
+    if batch:
+        yield batch
+
+
+def filter_key(filters: dict) -> tuple:
+    """Hashable version of keyword filters for use in cache keys."""
+    return tuple(
+        sorted(
+            (column, tuple(value) if isinstance(value, (list, tuple)) else value) for column, value in filters.items()
+        )
+    )
+
+
+def filter_conditions(model: Type[Model], start: float = None, end: float = None, filters: dict = None) -> list:
+    """Create the conditions for an EXPSTART range (inclusive) and column value filters (a list of values matches any
+    of them).
+    """
+    conditions = [
+        getattr(model, key) << list(value) if isinstance(value, (list, tuple)) else getattr(model, key) == value
+        for key, value in (filters or {}).items()
+    ]
+
+    if start is not None:
+        conditions.append(model.EXPSTART >= start)
+
+    if end is not None:
+        conditions.append(model.EXPSTART <= end)
+
+    return conditions
+
+
+def filter_mask(data: pd.DataFrame, start: float = None, end: float = None, filters: dict = None) -> np.ndarray:
+    """Boolean mask that's equivalent to filter_conditions for data that isn't stored."""
+    mask = np.ones(len(data), dtype=bool)
+
+    for key, value in (filters or {}).items():
+        mask &= (data[key].isin(value) if isinstance(value, (list, tuple)) else data[key] == value).values
+
+    if start is not None:
+        mask &= (data.EXPSTART >= start).values
+
+    if end is not None:
+        mask &= (data.EXPSTART <= end).values
+
+    return mask
+
+
+@contextmanager
+def bulk_pragmas(database: Database, pragmas: dict = None):
+    """Temporarily set fast journal settings for the database connection and restore the original settings after."""
+    pragmas = BULK_PRAGMAS if pragmas is None else pragmas
+    original = {key: database.pragma(key) for key in pragmas}
+
+    for key, value in pragmas.items():
+        database.pragma(key, value)
+
+    try:
+        yield
+
+    finally:
+        for key, value in original.items():
+            database.pragma(key, value)
+
+
+class RunCache:
+    """Cache for DataModel data that is shared, read-only, between monitors for the duration of a run. Data is keyed by
+    DataModel class (and query). Caching only occurs while a run is active.
+    """
+    def __init__(self):
+        self.active = False
+        self._data = {}
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Get the cached value for key, computing (and caching) it if needed."""
+        if not self.active:
+            return compute()
+
+        if key not in self._data:
+            self._data[key] = compute()
+
+        return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        """Set the cached value for key."""
+        if self.active:
+            self._data[key] = value
+
+    def invalidate(self, model_class: type):
+        """Remove all cached values for a DataModel class."""
+        for key in [key for key in self._data if key[0] is model_class]:
+            del self._data[key]
+
+    @contextmanager
+    def run(self):
+        """Activate the cache for the duration of a run."""
+        self.active = True
+
+        try:
+            yield self
+
+        finally:
+            self.active = False
+            self._data.clear()
+
+
+RUN_CACHE = RunCache()
+
+
+class BaseCosmoDataModel(BaseDataModel):
+    """Partial DataModel implementation that adds secondary indexes, a query helper and a bulk, batched ingest path for
+    backfills.
+    """
+    indexes = ()  # Tuples of the columns to index. Indexes are created after ingestion.
+    array_columns = ()  # Columns with array elements
+    history_only = False  # If True, new data is never searched for and only the stored data is used
+
+    def __init__(self, find_new: bool = True):
+        self._new_data = None
+        self._find_new = find_new and not self.history_only
+
+        super().__init__(find_new=False)
+
+    @property
+    def new_data(self) -> pd.DataFrame:
+        """Data that has not been ingested yet. New files aren't searched for or read until new_data is first used, and
+        the result is shared between instances for the duration of a run.
+        """
+        if self._new_data is None and self._find_new:
+            self._new_data = RUN_CACHE.get((type(self), 'new_data'), lambda: pd.DataFrame(self.get_new_data()))
+
+        return self._new_data
+
+    @new_data.setter
+    def new_data(self, value: pd.DataFrame):
+        self._new_data = value
+
+    def find_new_files(self) -> List[str]:
+        """Find the files that have not yet been ingested."""
+        raise NotImplementedError
+
+    def iter_new_data(self) -> Iterator[dict]:
+        """Yield rows of new data as they're extracted from the new files."""
+        raise NotImplementedError
+
+    def ingest(self, *args, **kwargs):
+        """Ingest the new data, create any missing indexes and update any derived tables."""
+        super().ingest(*args, **kwargs)
+        self.create_indexes()
+        self.update_views(self.new_data)
+        self._reset_run_cache()
+
+    def update_views(self, ingested: pd.DataFrame = None):
+        """Update any tables that are derived from the stored data. Called after ingestion with the data that was just
+        ingested, if it's available.
+        """
+        pass
+
+    def _reset_run_cache(self):
+        """Stored data has changed, and the new data shouldn't be ingested again by other instances in the run."""
+        RUN_CACHE.invalidate(type(self))
+        RUN_CACHE.set((type(self), 'new_data'), pd.DataFrame())
+
+    def _index_name(self, columns: Sequence[str]) -> str:
+        return f'{self.model._meta.table_name}_{"_".join(columns)}'.lower()
+
+    def create_indexes(self):
+        """Create the indexes defined in indexes if they don't exist."""
+        if self.model is None:
+            return
+
+        database = self.model._meta.database
+        table = self.model._meta.table_name
+
+        for columns in self.indexes:
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            database.execute_sql(
+                f'CREATE INDEX IF NOT EXISTS "{self._index_name(columns)}" ON "{table}" ({column_list})'
+            )
+
+    def drop_indexes(self):
+        """Drop the indexes defined in indexes if they exist."""
+        if self.model is None:
+            return
+
+        for columns in self.indexes:
+            self.model._meta.database.execute_sql(f'DROP INDEX IF EXISTS "{self._index_name(columns)}"')
+
+    def query(self, columns: Sequence[str] = None, start: float = None, end: float = None, include_new: bool = True,
+              **filters) -> pd.DataFrame:
+        """Get stored data, combined with any new data, with only the requested columns. Rows can be limited to an
+        EXPSTART range (inclusive) and filtered on column values given as keyword arguments (a list of values matches
+        any of them). The selection is done in SQL, and only the requested array columns are converted.
+
+        Results are shared between instances for the duration of a run, so the returned DataFrame is a shallow copy:
+        columns can be added or replaced, but the values should not be modified in place.
+        """
+        cache_key = (type(self), tuple(columns) if columns else None, start, end, include_new, filter_key(filters))
+
+        data = RUN_CACHE.get(cache_key, lambda: self._query(columns, start, end, include_new, **filters))
+
+        return data.copy(deep=False)
+
+    def _query(self, columns: Sequence[str] = None, start: float = None, end: float = None, include_new: bool = True,
+               **filters) -> pd.DataFrame:
+        data = pd.DataFrame()
+
+        if self.model is not None:
+            query = self.model.select(*[getattr(self.model, column) for column in columns or []])
+
+            conditions = filter_conditions(self.model, start, end, filters)
+
+            if conditions:
+                query = query.where(*conditions)
+
+            array_cols = [column for column in self.array_columns if not columns or column in columns]
+
+            # Need to convert the stored array columns back into... arrays
+            data = self.query_arrays_to_pandas(query, array_cols)
+
+        if not include_new or self.new_data is None or self.new_data.empty:
+            return data
+
+        mask = filter_mask(self.new_data, start, end, filters)
+        new_data = self.new_data[mask].reset_index(drop=True)
+
+        if columns:
+            new_data = new_data[list(columns)]
+
+        return pd.concat([data, new_data], sort=True, ignore_index=True)
+
+    @staticmethod
+    def query_arrays_to_pandas(query, array_cols: Sequence[str]) -> pd.DataFrame:
+        """Convert query results to a DataFrame, converting the stored array columns back into arrays. Each array column
+        is parsed at once into a RaggedArray, and the rows are views of its values.
+        """
+        data = pd.DataFrame(query.dicts())
+
+        if data.empty:
+            return data
+
+        for column in array_cols:
+            data[column] = RaggedArray.from_json(data[column]).to_series(data.index)
+
+        return data
+
+    def _to_records(self, rows: List[dict]) -> List[dict]:
+        """Convert rows to database records. Array elements are stored as their (JSON) string representation."""
+        records = []
+        for row in rows:
+            record = {}
+            for key, value in row.items():
+                if isinstance(value, np.ndarray):
+                    value = json.dumps(value.tolist())
+
+                elif isinstance(value, np.generic):
+                    value = value.item()
+
+                record[key] = value
+
+            records.append(record)
+
+        return records
+
+    def bulk_ingest(self, rows: Iterable[dict], batch_bytes: int = BULK_BATCH_BYTES):
+        """Ingest rows with chunked inserts inside of explicit transactions of approximately batch_bytes each. Index
+        creation is deferred until all rows have been written, and fast journal settings are used in the meantime.
+        """
+        batches = byte_batches(rows, batch_bytes)
+
+        if self.model is None:  # The table is defined and created from the first batch
+            first_batch = next(batches, None)
+
+            if first_batch is None:
+                return
+
+            self.new_data = pd.DataFrame(first_batch)
+            super().ingest()
+
+        database = self.model._meta.database
+        self.drop_indexes()
+
+        with bulk_pragmas(database):
+            for batch in batches:
+                with database.atomic():
+                    insert_records(self.model, self._to_records(batch))
+
+        self.create_indexes()
+        self.update_views()
+        self.new_data = pd.DataFrame()  # Everything that was found has been ingested
+        self._reset_run_cache()
+
+    def backfill(self, batch_bytes: int = BULK_BATCH_BYTES):
+        """Find, extract and bulk ingest all new data. Rows are written while later files are still being read."""
+        self.bulk_ingest(self.iter_new_data(), batch_bytes)
+
+
+class AcqDataModel(BaseCosmoDataModel):
     """Datamodel for Acq files."""
     files_source = FILES_SOURCE
     subdir_pattern = '?????'
     primary_key = 'ROOTNAME'
 
-    def get_new_data(self):
-        header_request = {
+    indexes = (('EXPTYPE', 'EXPSTART'), ('EXPSTART',))
+    store_stats = True  # Also keep running statistics of the slews (see acq_views) when data is ingested
+
+    request = dict(
+        header_request={
             0: [
                 'ACQSLEWX',
                 'ACQSLEWY',
@@ -48,14 +408,16 @@ class AcqDataModel(BaseDataModel):
                 'EXPTYPE'
             ],
             1: ['EXPSTART', 'NEVENTS']
-        }
+        },
 
         # Different ACQ types may not have the full set
-        header_defaults = {'ACQSLEWX': 0.0, 'ACQSLEWY': 0.0, 'NEVENTS': 0.0, 'LAMPEVNT': 0.0}
+        header_defaults={'ACQSLEWX': 0.0, 'ACQSLEWY': 0.0, 'NEVENTS': 0.0, 'LAMPEVNT': 0.0},
 
         # SPT file header keys, extensions
-        spt_header_request = {0: ['DGESTAR']}
+        spt_header_request={0: ['DGESTAR']}
+    )
 
+    def find_new_files(self):
         files = find_files('*rawacq*', data_dir=self.files_source, subdir_pattern=self.subdir_pattern)
 
         if self.model is not None:
@@ -73,24 +435,99 @@ class AcqDataModel(BaseDataModel):
 
             for index in sorted(del_list, reverse=True):
                 del files[index]
-            
+
+        return files
+
+    def get_new_data(self):
+        files = self.find_new_files()
 
         if not files:  # No new files
             return pd.DataFrame()
 
-        data_results = data_from_exposures(
-            files,
-            header_request=header_request,
-            header_defaults=header_defaults,
-            spt_header_request=spt_header_request,
+        return data_from_exposures(files, **self.request, reducer=add_fgs)
+
+    def iter_new_data(self):
+        yield from iter_data_from_exposures(self.find_new_files(), **self.request, reducer=add_fgs)
+
+    def _bind_stats(self, create: bool = False) -> bool:
+        """Bind the acq statistics models to the database and check whether the statistics tables exist. If create, the
+        tables are created if they don't exist yet (only done when the statistics are updated).
+        """
+        if self.model is None:
+            return False
+
+        database = self.model._meta.database
+        database.bind(acq_views.ACQ_VIEWS)
+
+        if create:
+            database.create_tables(acq_views.ACQ_VIEWS, safe=True)
+
+        return all(view.table_exists() for view in acq_views.ACQ_VIEWS)
+
+    def _unprocessed(self) -> pd.DataFrame:
+        """Get the stored acquisitions that have not been added to the statistics."""
+        exposures = acq_views.AcqStatExposure
+
+        return pd.DataFrame(
+            self.model.select(*[getattr(self.model, column) for column in acq_views.SOURCE_COLUMNS])
+            .where(self.model.ROOTNAME.not_in(exposures.select(exposures.ROOTNAME))).dicts()
         )
 
-        dgestar_to_fgs(data_results)
+    def _add_stats(self, data: pd.DataFrame):
+        """Add acquisitions to the stored statistics in a single transaction."""
+        if data.empty:
+            return
 
-        return data_results
+        summary = acq_views.summarize_acqs(data)
+
+        with self.model._meta.database.atomic():
+            combined = acq_views.combine_summaries(acq_views.stored_summary(), summary).loc[summary.index]
+
+            acq_views.AcqStat.replace_many(acq_views.stat_records(combined)).execute()
+            insert_records(acq_views.AcqStatExposure, [{'ROOTNAME': rootname} for rootname in data.ROOTNAME.unique()])
+
+    def update_views(self, ingested: pd.DataFrame = None):
+        """Add the acquisitions that were just ingested, and then any stored acquisitions that still haven't been
+        processed, to the running statistics.
+        """
+        if not self.store_stats or not self._bind_stats(create=True):
+            return
+
+        if ingested is not None and not ingested.empty:
+            processed = {row.ROOTNAME for row in acq_views.AcqStatExposure.select()}
+            self._add_stats(ingested.loc[~ingested.ROOTNAME.isin(processed), acq_views.SOURCE_COLUMNS])
+
+        self._add_stats(self._unprocessed())
+
+    def _summary(self) -> pd.DataFrame:
+        pending = [self.new_data] if self.new_data is not None and not self.new_data.empty else []
+
+        if self.store_stats and self._bind_stats():
+            stored = acq_views.stored_summary()
+
+            # Stored acquisitions that haven't been added to the statistics yet are summarized here, but only added to
+            # the stored statistics when data is ingested
+            pending.insert(0, self._unprocessed())
+
+        else:
+            stored = acq_views.summarize_acqs(None)
+
+            if self.model is not None:  # Nothing is kept in the statistics, so all of the stored data is pending
+                pending.insert(0, self._query(acq_views.SOURCE_COLUMNS, include_new=False))
+
+        pending = pd.concat(pending, sort=True, ignore_index=True) if pending else None
+
+        return acq_views.combine_summaries(stored, acq_views.summarize_acqs(pending))
 
+    def summary(self) -> pd.DataFrame:
+        """Get the statistics of all of the acquisitions (as returned by acq_views.summarize_acqs), combining the
+        stored running statistics with the statistics of any acquisitions that haven't been added yet, including new
+        data. Nothing is written to the database. Results are shared for the duration of a run.
+        """
+        return RUN_CACHE.get((type(self), 'summary'), self._summary)
 
-class OSMDataModel(BaseDataModel):
+
+class OSMDataModel(BaseCosmoDataModel):
     """Data model for all OSM Shift monitors."""
     files_source = FILES_SOURCE
     subdir_pattern = '?????'
@@ -99,23 +536,32 @@ class OSMDataModel(BaseDataModel):
 
     primary_key = 'ROOTNAME'
 
-    def get_new_data(self):
-        """Retrieve data."""
-        header_request = {
+    indexes = (('DETECTOR', 'EXPSTART'), ('EXPSTART',))
+    array_columns = (
+        'TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT', 'XC_RANGE', 'LAMPTAB_SEGMENT', 'SEARCH_OFFSET', 'FP_PIXEL_SHIFT'
+    )
+
+    request = dict(
+        header_request={
             0: ['ROOTNAME', 'DETECTOR', 'LIFE_ADJ', 'OPT_ELEM', 'CENWAVE', 'FPPOS', 'PROPOSID', 'OBSET_ID'],
             1: ['EXPSTART']
-        }
+        },
 
-        table_request = {1: ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT']}
+        table_request={1: ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT']},
 
-        reference_request = {
+        reference_request={
             'LAMPTAB': {
                 'match_keys': ['OPT_ELEM', 'CENWAVE', 'FPOFFSET'],
                 'table_request': {1: ['SEGMENT', 'FP_PIXEL_SHIFT']},
             },
             'WCPTAB': {'match_keys': ['OPT_ELEM'], 'table_request': {1: ['XC_RANGE', 'SEARCH_OFFSET']}}
         }
+    )
+
+    sms_batch_size = 500  # Number of streamed rows matched against the SMS table at a time
+    store_views = True  # Also write the long-format flash table and the other derived views when data is ingested
 
+    def find_new_files(self):
         files = find_files('*lampflash*', data_dir=self.files_source, subdir_pattern=self.subdir_pattern)
 
         if self.model is not None:
@@ -134,24 +580,136 @@ class OSMDataModel(BaseDataModel):
             for index in sorted(del_list, reverse=True):
                 del files[index]
 
+        return files
+
+    def get_new_data(self):
+        """Retrieve data."""
+        files = self.find_new_files()
+
         if not files:   # No new files
             return pd.DataFrame()
 
-        data_results = pd.DataFrame(
-            data_from_exposures(
-                files,
-                header_request=header_request,
-                table_request=table_request,
-                reference_request=reference_request
-            )
+        # Rows with empty data columns are dropped by the workers
+        data_results = pd.DataFrame(data_from_exposures(files, **self.request, reducer=has_lampflashes))
+
+        if data_results.empty:  # None of the new files have lampflashes
+            return pd.DataFrame()
+
+        return self.add_sms_data(data_results)
+
+    def iter_new_data(self):
+        # Rows with empty data columns are skipped
+        rows = iter_data_from_exposures(self.find_new_files(), **self.request, reducer=has_lampflashes)
+
+        for batch in chunked(rows, self.sms_batch_size):
+            yield from self.add_sms_data(pd.DataFrame(batch)).to_dict(orient='records')
+
+    def _bind_views(self, create: bool = False) -> bool:
+        """Bind the OSM view models to the database and check whether the view tables exist. If create, the tables are
+        created if they don't exist yet (only done when the views are updated).
+        """
+        if self.model is None:
+            return False
+
+        database = self.model._meta.database
+        database.bind(OSM_VIEWS)
+
+        if create:
+            database.create_tables(OSM_VIEWS, safe=True)
+
+        return all(view.table_exists() for view in OSM_VIEWS)
+
+    def _unprocessed(self, *conditions) -> pd.DataFrame:
+        """Get the stored data for lampflashes that have not been added to the views."""
+        query = self.model.select(*[getattr(self.model, column) for column in SOURCE_COLUMNS]).where(
+            self.model.ROOTNAME.not_in(OSMFlash.select(OSMFlash.ROOTNAME)), *conditions
         )
 
-        # Remove any rows that have empty data columns
-        data_results = data_results.drop(
-            data_results[data_results.apply(lambda x: not bool(len(x.SHIFT_DISP)), axis=1)].index.values
-        ).reset_index(drop=True)
+        return self.query_arrays_to_pandas(query, self.array_columns)
+
+    def _insert_views(self, data: pd.DataFrame):
+        """Derive the view rows for lampflash data and add them to the view tables in a single transaction."""
+        views = derive_osm_views(data)
+
+        with self.model._meta.database.atomic():
+            for view, rows in views.items():
+                if not rows.empty:
+                    insert_records(view, self._to_records(rows.to_dict(orient='records')))
+
+    def update_views(self, ingested: pd.DataFrame = None):
+        """Add the lampflashes that were just ingested to the view tables, deriving the rows from the ingested data
+        directly, and then any stored lampflashes that still haven't been processed.
+        """
+        if not self.store_views or not self._bind_views(create=True):
+            return
+
+        if ingested is not None and not ingested.empty:
+            processed = {row.ROOTNAME for row in OSMFlash.select(OSMFlash.ROOTNAME).distinct()}
+            self._insert_views(ingested.loc[~ingested.ROOTNAME.isin(processed), SOURCE_COLUMNS])
 
-        # Add tsince data from SMSTable.
+        unprocessed = [
+            row.ROOTNAME for row in
+            self.model.select(self.model.ROOTNAME).where(self.model.ROOTNAME.not_in(OSMFlash.select(OSMFlash.ROOTNAME)))
+        ]
+
+        for rootnames in chunked(unprocessed, self.sms_batch_size):
+            self._insert_views(self._unprocessed(self.model.ROOTNAME << rootnames))
+
+    def _pending_views(self, detector: str) -> dict:
+        """Derive view rows for a detector from the lampflashes that are not in the views yet."""
+        pending = []
+
+        if self.new_data is not None and not self.new_data.empty:
+            pending.append(self.new_data[self.new_data.DETECTOR == detector])
+
+        if self.store_views and self._bind_views():
+            pending.insert(0, self._unprocessed(self.model.DETECTOR == detector))
+
+        elif self.model is not None:  # Nothing is stored in the views, so all of the stored data is pending
+            pending.insert(0, self._query(SOURCE_COLUMNS, include_new=False, DETECTOR=detector))
+
+        return derive_osm_views(pd.concat(pending, sort=True, ignore_index=True) if pending else pd.DataFrame())
+
+    def _view_data(self, view: Type[Model], detector: str, columns: Sequence[str] = None, start: float = None,
+                   end: float = None, **filters) -> pd.DataFrame:
+        stored = pd.DataFrame()
+
+        if self.store_views and self._bind_views():
+            fields = [getattr(view, column) for column in columns] if columns else [
+                field for field in view._meta.sorted_fields if field.name != 'id'
+            ]
+            stored = pd.DataFrame(
+                view.select(*fields).where(view.DETECTOR == detector, *filter_conditions(view, start, end, filters))
+                .dicts()
+            )
+
+        pending = RUN_CACHE.get((type(self), 'pending_views', detector), lambda: self._pending_views(detector))[view]
+
+        if not pending.empty:
+            pending = pending[filter_mask(pending, start, end, filters)]
+
+            if columns:
+                pending = pending[list(columns)]
+
+        return pd.concat([stored, pending], sort=True, ignore_index=True)
+
+    def view_data(self, view: Type[Model], detector: str, columns: Sequence[str] = None, start: float = None,
+                  end: float = None, **filters) -> pd.DataFrame:
+        """Get the rows of a derived OSM view (OSMFlash, OSMDrift or OSMSegmentDiff) for a detector. Stored view rows
+        are combined with rows derived from any lampflashes that haven't been added to the views, including new data.
+        As with query, only the requested columns are returned, and rows can be limited to an EXPSTART range and
+        filtered on column values (e.g. SEGMENT='FUVA'). The stored rows are selected in SQL.
+
+        Results are shared for the duration of a run and a shallow copy is returned.
+        """
+        cache_key = (type(self), view, detector, tuple(columns) if columns else None, start, end, filter_key(filters))
+        data = RUN_CACHE.get(cache_key, lambda: self._view_data(view, detector, columns, start, end, **filters))
+
+        return data.copy(deep=False)
+
+    @staticmethod
+    def add_sms_data(data_results: pd.DataFrame) -> pd.DataFrame:
+        """Add tsince data from SMSTable."""
         try:
             sms_data = pd.DataFrame(
                     SMSTable.select(SMSTable.ROOTNAME, SMSTable.TSINCEOSM1, SMSTable.TSINCEOSM2).where(
@@ -180,17 +738,18 @@ class OSMDataModel(BaseDataModel):
         return merged
 
 
-class JitterDataModel(BaseDataModel):
+class JitterDataModel(BaseCosmoDataModel):
     files_source = FILES_SOURCE
     subdir_pattern = '?????'
 
-    def get_new_data(self):
-        primary_header_keys = ('PROPOSID', 'CONFIG')
-        extension_header_keys = ('EXPNAME',)
-
-        data_keys = ('SI_V2_AVG', 'SI_V3_AVG')
-        reduce = {'SI_V2_AVG': ('mean', 'std', 'max'), 'SI_V3_AVG': ('mean', 'std', 'max')}
+    request = dict(
+        primary_header_keys=('PROPOSID', 'CONFIG'),
+        ext_header_keys=('EXPNAME',),
+        table_keys=('SI_V2_AVG', 'SI_V3_AVG'),
+        reduce_to_stats={'SI_V2_AVG': ('mean', 'std', 'max'), 'SI_V3_AVG': ('mean', 'std', 'max')}
+    )
 
+    def find_new_files(self):
         files = find_files('*jit*', data_dir=self.files_source, subdir_pattern=self.subdir_pattern)
 
         if self.model is not None:
@@ -199,23 +758,19 @@ class JitterDataModel(BaseDataModel):
             for file in currently_ingested:
                 files.remove(file)
 
+        return files
+
+    def get_new_data(self):
+        files = self.find_new_files()
+
         if not files:   # No new files
             return pd.DataFrame()
 
-        data_results = pd.DataFrame(
-            data_from_jitters(
-                files,
-                primary_header_keys,
-                extension_header_keys,
-                data_keys,
-                reduce_to_stats=reduce
-            )
-        )
-
-        # Remove any NaNs or inf that may occur from the statistics calculations.
-        data_results = data_results.replace([np.inf, -np.inf], np.nan).dropna().reset_index(drop=True)
+        # Non-finite statistics and ACQ, DARK and FLAT exposures are removed by the workers
+        return pd.DataFrame(data_from_jitters(files, **self.request, reducer=good_jitter_rows))
 
-        return data_results[~data_results.EXPTYPE.str.contains('ACQ|DARK|FLAT')]
+    def iter_new_data(self):
+        yield from iter_data_from_jitters(self.find_new_files(), **self.request, reducer=good_jitter_rows)
    
 
 def get_program_ids(pid_file):
@@ -227,23 +782,29 @@ def get_program_ids(pid_file):
 
     return all_programs
 
-class DarkDataModel(BaseDataModel):
+class DarkDataModel(BaseCosmoDataModel):
     """DataModel for dark corrtag files."""
     cosmo_layout = False
     files_source = FILES_SOURCE
+    store_maps = True  # Also add the ingested events to the monthly dark maps and PHA histograms
+    map_binning = (32, 8)  # Detector pixels per dark map bin in x and y
+    map_batch_size = 20  # Number of stored exposures read at a time when they're added to the dark maps
+    rate_batch_size = 20  # Number of stored exposures read at a time when their dark rates are calculated
 
-    def get_new_data(self):
-        """Set the model for what data is to be retrieved from each dark
-        file."""
-        # this way when you get new data it will get all the data
-        header_request = {
+    array_columns = ('PHA', 'XCORR', 'YCORR', 'TIME', 'TIME_3', 'LATITUDE', 'LONGITUDE')
+
+    # this way when you get new data it will get all the data
+    request = dict(
+        header_request={
             0: ['ROOTNAME', 'SEGMENT'], 1: ['EXPTIME', 'EXPSTART']
-            }
-        table_request = {
+            },
+        table_request={
             1: ['PHA', 'XCORR', 'YCORR', 'TIME'],
             3: ['TIME', 'LATITUDE', 'LONGITUDE']
             }
+    )
 
+    def find_new_files(self):
         files = []
 
         program_ids = get_program_ids(PROGRAMS)
@@ -259,11 +820,69 @@ class DarkDataModel(BaseDataModel):
             for file in currently_ingested:
                 files.remove(file)
 
+        return files
+
+    def get_new_data(self):
+        """Set the model for what data is to be retrieved from each dark
+        file."""
+        files = self.find_new_files()
+
         if not files:  # No new files
             return pd.DataFrame()
 
-        data_results = data_from_exposures(files,
-                                           header_request=header_request,
-                                           table_request=table_request)
+        data_results = data_from_exposures(files, **self.request)
 
         return data_results
+
+    def iter_new_data(self):
+        yield from iter_data_from_exposures(self.find_new_files(), **self.request)
+
+    def _bind_dark(self, create: bool = False) -> bool:
+        """Bind the dark map and result models to the database and check whether their tables exist. If create, the
+        tables are created if they don't exist yet (only done when the maps or results are updated).
+        """
+        if self.model is None:
+            return False
+
+        database = self.model._meta.database
+        database.bind(DARK_TABLES)
+
+        if create:
+            database.create_tables(DARK_TABLES, safe=True)
+
+        return all(table.table_exists() for table in DARK_TABLES)
+
+    def _unmapped(self) -> list:
+        """Get the rootnames of the stored exposures that have not been added to the dark maps."""
+        mapped = dark_maps.mapped_exposures(self.map_binning)
+        stored = self.model.select(self.model.ROOTNAME, self.model.SEGMENT).where(
+            self.model.EXPSTART != 0, self.model.SEGMENT << list(dark_maps.DETECTOR_SHAPES)
+        )
+
+        return sorted({row.ROOTNAME for row in stored if (row.SEGMENT, row.ROOTNAME) not in mapped})
+
+    def iter_exposures(self, rootnames: Sequence[str], columns: Sequence[str],
+                       batch_size: int) -> Iterator[pd.DataFrame]:
+        """Read the stored data of exposures, batch_size exposures at a time."""
+        array_cols = [column for column in self.array_columns if column in columns]
+
+        for batch in chunked(rootnames, batch_size):
+            query = self.model.select(*[getattr(self.model, column) for column in columns]).where(
+                self.model.ROOTNAME << batch
+            )
+
+            yield self.query_arrays_to_pandas(query, array_cols)
+
+    def update_views(self, ingested: pd.DataFrame = None):
+        """Add the ingested dark events, and then the events of any stored exposures that still haven't been processed
+        (e.g. after a backfill), to the accumulated dark maps, so that new regions can be evaluated without reading the
+        corrtags again.
+        """
+        if not self.store_maps or not self._bind_dark(create=True):
+            return
+
+        if ingested is not None and not ingested.empty:
+            dark_maps.update_dark_maps(ingested, self.map_binning)
+
+        for data in self.iter_exposures(self._unmapped(), dark_maps.SOURCE_COLUMNS, self.map_batch_size):
+            dark_maps.update_dark_maps(data, self.map_binning)
@@ -4,7 +4,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 from ..filesystem import JitterFileData
-from ..monitor_helpers import absolute_time
+from ..monitor_helpers import absolute_datetime
 
 # TODO: Jitter Monitor needs to include 2 (possibly 3) subplots of statistics on the jitter per exposure.
 #  Plot 1: mean vs time with +/- std "line boundaries"
@@ -29,12 +29,12 @@ def view_jitter(jitter_file: str) -> go.Figure:
     for jit in jitter_data:
         for direction, position in zip(['V2', 'V3'], [(1, 1), (2, 1)]):
             # Set time
-            time = absolute_time(expstart=jit['EXPSTART'], time=jit['Seconds'])
+            time = absolute_datetime(expstart=jit['EXPSTART'], time=jit['Seconds'])
 
             # Lower bound
             figure.add_trace(
                 go.Scatter(
-                    x=time.to_datetime(),
+                    x=time,
                     y=jit[f'SI_{direction}_AVG'] - jit[f'SI_{direction}_RMS'],
                     mode='lines',
                     line={'width': 0},
@@ -49,7 +49,7 @@ def view_jitter(jitter_file: str) -> go.Figure:
             # Upper bound
             figure.add_trace(
                 go.Scatter(
-                    x=time.to_datetime(),
+                    x=time,
                     y=jit[f'SI_{direction}_AVG'] + jit[f'SI_{direction}_RMS'],
                     mode='lines',
                     line={'width': 0},
@@ -66,7 +66,7 @@ def view_jitter(jitter_file: str) -> go.Figure:
             # Jitter
             figure.add_trace(
                 go.Scatter(
-                    x=time.to_datetime(),
+                    x=time,
                     y=jit[f'SI_{direction}_AVG'],
                     mode='lines',
                     legendgroup=jit['EXPNAME'],
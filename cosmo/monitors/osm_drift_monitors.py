@@ -5,38 +5,16 @@ from astropy.time import Time
 from monitorframe.monitor import BaseMonitor
 
 from .data_models import OSMDataModel
-from ..monitor_helpers import explode_df, create_visibility, get_osm_data
+from .osm_views import OSMDrift
+from ..monitor_helpers import create_visibility
 from .. import SETTINGS
 
 COS_MONITORING = SETTINGS['output']
 
 
 def get_osmdrift_data(datamodel: OSMDataModel, detector: str) -> pd.DataFrame:
-    """Get OSM Drift monitoring data."""
-    data = get_osm_data(datamodel, detector)
-
-    # Calculate the relative shift (relative to the first shift measurement for each set of flashes) for AD and XD
-    data['REL_SHIFT_DISP'] = data.apply(lambda x: x.SHIFT_DISP[1:] - x.SHIFT_DISP[0], axis=1)
-    data['REL_SHIFT_XDISP'] = data.apply(lambda x: x.SHIFT_XDISP[1:] - x.SHIFT_XDISP[0], axis=1)
-
-    # Drop the first value for the other data columns
-    for col in ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT']:
-        data[col] = data.apply(lambda x: x[col][1:], axis=1)
-
-    # Expand the dataframe
-    exploded = explode_df(
-        data, ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT', 'REL_SHIFT_DISP', 'REL_SHIFT_XDISP']
-    )
-
-    # Add drift columns and time since OSM move columns
-    exploded = exploded.assign(
-        SHIFT1_DRIFT=lambda x: x.REL_SHIFT_DISP / x.TIME,
-        SHIFT2_DRIFT=lambda x: x.REL_SHIFT_XDISP / x.TIME,
-        REL_TSINCEOSM1=lambda x: x.TIME + x.TSINCEOSM1,
-        REL_TSINCEOSM2=lambda x: x.TIME + x.TSINCEOSM2,
-    )
-
-    return exploded
+    """Get OSM Drift monitoring data from the data model's drift view."""
+    return datamodel.view_data(OSMDrift, detector)
 
 
 class FUVOSMDriftMonitor(BaseMonitor):
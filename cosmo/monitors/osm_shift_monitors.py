@@ -5,12 +5,12 @@ import os
 import numpy as np
 
 from astropy.time import Time
-from itertools import repeat
 from monitorframe.monitor import BaseMonitor
 from typing import Union, List
 
 from .data_models import OSMDataModel
-from ..monitor_helpers import absolute_time, explode_df, create_visibility, get_osm_data
+from .osm_views import OSMFlash, OSMSegmentDiff
+from ..monitor_helpers import absolute_datetime, create_visibility, EventCalendar
 from .. import SETTINGS
 
 COS_MONITORING = SETTINGS['output']
@@ -19,45 +19,40 @@ LP_MOVES = {
     i + 2: datetime.datetime.strptime(date, '%Y-%m-%d')
     for i, date in enumerate(['2012-07-23', '2015-02-09', '2017-10-02', '2021-10-04', '2022-10-04'])
 }
+LP_CALENDAR = EventCalendar({f'LP{lp}': date for lp, date in LP_MOVES.items()})
 
 
-def match_dfs(df1: pd.DataFrame, df2: pd.DataFrame, key: str) -> pd.DataFrame:
-    """Filter df1 based on which values in key are available in df2."""
-    return df1[df1.apply(lambda x: x[key] in df2[key].values, axis=1)]
-
-
-def compute_segment_diff(df: pd.DataFrame, shift: str, segment1: str, segment2: str) -> Union[pd.DataFrame, None]:
-    """Compute the difference (A-B) in the shift measurement between segments."""
-    root_groups = df.groupby('ROOTNAME')  # group by rootname which may or may not have FUVA and FUVB shifts
-
-    results_list = []
-    for rootname, group in root_groups:
-        if segment1 in group.SEGMENT.values and segment2 in group.SEGMENT.values:
-            # absolute time calculated from FUVA
-            lamp_time = absolute_time(df=group[group.SEGMENT == segment1])
+def join_segment_diff(df: pd.DataFrame, diffs: pd.DataFrame, shift: str, segment1: str, segment2: str,
+                      fp_corrected: bool = False) -> Union[pd.DataFrame, None]:
+    """Combine the stored differences (from the OSMSegmentDiff view) in the shift measurement between segments with the
+    segment1 flash data in df. The result has the segment1 rows with the difference (seg_diff) and lamp_time. If
+    fp_corrected, the shift values in df have had the FP_PIXEL_SHIFT offsets applied, and the difference in the offsets
+    is removed as well.
+    """
+    if df.empty or diffs.empty:
+        return
 
-            segmnet1_df, segment2_df = group[group.SEGMENT == segment1], group[group.SEGMENT == segment2]
+    pair_diffs = diffs[(diffs.SEGMENT1 == segment1) & (diffs.SEGMENT2 == segment2)]
+    seg_diff = pair_diffs[f'{shift}_DIFF']
 
-            # Use the FUVA dataframe to create a "results" dataframe
-            diff_df = segmnet1_df.assign(
-                seg_diff=segmnet1_df[shift].values - segment2_df[shift].values
-            ).reset_index(drop=True)
+    if fp_corrected:
+        seg_diff = seg_diff - pair_diffs.FP_PIXEL_SHIFT_DIFF
 
-            diff_df['lamp_time'] = lamp_time.to_datetime()
+    diff_df = df[df.SEGMENT == segment1].merge(
+        pair_diffs[['ROOTNAME', 'FLASH']].assign(seg_diff=seg_diff), on=['ROOTNAME', 'FLASH']
+    )
 
-            # Remove SEGMENT from the hover text
-            diff_df.hover_text = diff_df.apply(
-                lambda x: x.hover_text.replace(f'<br>SEGMENT          {x.SEGMENT}', ''), axis=1
-            )
+    if diff_df.empty:
+        return
 
-            # Drop "segment specific" info
-            diff_df.drop(columns=['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT', 'DETECTOR'], inplace=True)
-            results_list.append(diff_df)
+    # absolute time calculated from segment1
+    diff_df['lamp_time'] = absolute_datetime(df=diff_df)
 
-    if results_list:
-        return pd.concat(results_list, ignore_index=True)
+    # Remove SEGMENT from the hover text
+    diff_df.hover_text = diff_df.hover_text.str.replace(f'<br>SEGMENT          {segment1}', '', regex=False)
 
-    return
+    # Drop "segment specific" info
+    return diff_df.drop(columns=['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT', 'DETECTOR'])
 
 
 def create_osmshift_buttons(doc_link: str, button_labels: List[str], name: str, visibilities: List[List[bool]]
@@ -95,41 +90,38 @@ class BaseFuvOsmShiftMonitor(BaseMonitor):
 
     shift = None  # SHIFT_DISP or SHIFT_XDISP
 
-    def get_data(self) -> pd.DataFrame:
-        """Get new data from the data model. Expand the data around individual flashes and filter on FUV."""
-        data = get_osm_data(self.model, 'FUV')
+    # Set symbols for different FP-POS
+    fp_symbols = {
+        1: 'circle',
+        2: 'cross',
+        3: 'triangle-up',
+        4: 'x'
+    }
 
-        return explode_df(data, ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT'])
+    def get_data(self) -> pd.DataFrame:
+        """Get the FUV data from the data model's exploded flash view (one row per individual flash)."""
+        return self.model.view_data(OSMFlash, 'FUV')
 
     def track(self) -> pd.DataFrame:
         """Track the difference in shift, A-B"""
-        return compute_segment_diff(self.data, self.shift, 'FUVA', 'FUVB')
+        return join_segment_diff(self.data, self.model.view_data(OSMSegmentDiff, 'FUV'), self.shift, 'FUVA', 'FUVB')
 
-    def _plot_per_cenwave(self, df: pd.DataFrame, shift: str, outliers: pd.DataFrame = None) -> int:
-        """Plot shift v time and A-B v time by grating/cenwave"""
+    def _plot_per_cenwave(self, df: pd.DataFrame, seg_diff: pd.DataFrame, outliers: pd.DataFrame = None) -> int:
+        """Plot shift v time and A-B v time by grating/cenwave. df is the data (or a slice of it) with the columns added
+        in plot, and seg_diff is the A-B difference for the same data.
+        """
         trace_number = 0  # Keep track of the number of traces created and added
 
         groups = df.groupby(['OPT_ELEM', 'CENWAVE'])
 
-        # Set symbols for different FP-POS
-        fp_symbols = {
-            1: 'circle',
-            2: 'cross',
-            3: 'triangle-up',
-            4: 'x'
-        }
-
-        # Compute A-B shift difference
-        seg_diff_results = compute_segment_diff(df, shift, 'FUVA', 'FUVB')
-
         # Plot A-B v time
         self.figure.add_trace(
             go.Scattergl(
-                x=seg_diff_results.lamp_time,
-                y=seg_diff_results.seg_diff,
+                x=seg_diff.lamp_time,
+                y=seg_diff.seg_diff,
                 name='FUVA - FUVB',
                 mode='markers',
-                text=seg_diff_results.hover_text,
+                text=seg_diff.hover_text,
                 visible=False,
             ),
             row=1,
@@ -138,30 +130,26 @@ class BaseFuvOsmShiftMonitor(BaseMonitor):
         trace_number += 1
 
         # Plot shift v time per grating/cenwave group
-        for i, (name, group) in enumerate(groups):
-            trace_number += 1
+        n_cenwaves = df.CENWAVE.nunique()
 
-            grating, cenwave = name
-            lamp_time = absolute_time(df=group)
+        for i, ((grating, cenwave), group) in enumerate(groups):
+            trace_number += 1
 
             self.figure.add_trace(
                 go.Scattergl(
-                    x=lamp_time.to_datetime(),
-                    y=group[shift],
+                    x=group.lamp_time.values,
+                    y=group[self.shift],
                     name=f'{grating}-{cenwave}',
                     mode='markers',
                     text=group.hover_text,
                     visible=False,
                     marker=dict(  # Color markers based on cenwave
-                        cmax=len(df.CENWAVE.unique()) - 1,  # Individual plots need to be on the same scale
+                        cmax=n_cenwaves - 1,  # Individual plots need to be on the same scale
                         cmin=0,
-                        color=list(repeat(i, len(group))),
+                        color=np.full(len(group), i),
                         colorscale='Viridis',
-                        symbol=[fp_symbols[fp] for fp in group.FPPOS],
-                        size=[
-                            10 if time > LP_MOVES[4] and lp == 3 else 6
-                            for lp, time in zip(group.LIFE_ADJ, Time(group.EXPSTART, format='mjd').to_datetime())
-                        ]  # Set the size to distinguish exposures taken at LP3 after the move to LP4; leaving this as-is but may need to update for LP5/LP6
+                        symbol=group.fp_symbol.values,
+                        size=group.marker_size.values
                     )
                 ),
                 row=2,
@@ -185,29 +173,22 @@ class BaseFuvOsmShiftMonitor(BaseMonitor):
             trace_number += 1
 
             # Plot outlier points in a different color
-            outlier_mainplot = df[df.apply(lambda x: x.ROOTNAME in outliers.ROOTNAME.values, axis=1)]
-            outlier_groups = outlier_mainplot.groupby(['OPT_ELEM', 'CENWAVE'])
-            for name, group in outlier_groups:
+            outlier_groups = df[df.outlier.values].groupby(['OPT_ELEM', 'CENWAVE'])
+            for (grating, cenwave), group in outlier_groups:
                 trace_number += 1
 
-                grating, cenwave = name
-                lamp_time = absolute_time(df=group)
-
                 self.figure.add_trace(
                     go.Scattergl(
-                        x=lamp_time.to_datetime(),
-                        y=group[shift],
+                        x=group.lamp_time.values,
+                        y=group[self.shift],
                         name=f'{grating}-{cenwave} Outliers',
                         mode='markers',
                         text=group.hover_text,
                         visible=False,
                         marker=dict(
                             color='red',
-                            symbol=[fp_symbols[fp] for fp in group.FPPOS],
-                            size=[
-                                10 if time > LP_MOVES[4] and lp == 3 else 6
-                                for lp, time in zip(group.LIFE_ADJ, Time(group.EXPSTART, format='mjd').to_datetime())
-                            ]  # Set the size to distinguish exposures taken at LP3 after the move to LP4; leaving this as-is but may need to update for LP5/LP6
+                            symbol=group.fp_symbol.values,
+                            size=group.marker_size.values
                         )
                     ),
                     row=2,
@@ -220,21 +201,30 @@ class BaseFuvOsmShiftMonitor(BaseMonitor):
         """Plot shift v time and A-B v time per cenwave, and with each FP-POS separate by button options."""
         outliers = self.results[self.outliers]
 
+        # Compute the plotted columns once; the traces for each button are made from slices of the data
+        data = self.data.assign(
+            lamp_time=absolute_datetime(df=self.data),
+            fp_symbol=self.data.FPPOS.map(self.fp_symbols).values,
+            # Set the size to distinguish exposures taken at LP3 after the move to LP4; leaving this as-is but may need
+            # to update for LP5/LP6
+            marker_size=np.where((self.data.EXPSTART > LP_CALENDAR.mjd_of('LP4')) & (self.data.LIFE_ADJ == 3), 10, 6),
+            outlier=self.data.ROOTNAME.isin(outliers.ROOTNAME).values
+        )
+
         # First set of traces for the "All FPPOS" button
-        all_n_traces = self._plot_per_cenwave(self.data, self.shift, outliers)
+        all_n_traces = self._plot_per_cenwave(data, self.results, outliers)
 
         # Plot traces per FPPOS for the other buttons
-        fp_groups = self.data.groupby('FPPOS')
+        fp_groups = data.groupby('FPPOS')
+        fp_diffs = self.results.groupby('FPPOS')
         fp_outliers = outliers.groupby('FPPOS')
         fp_trace_lengths = {}  # track the number of traces produced per fp; this differs between fp
         for fp, group in fp_groups:
+            # Collect matching differences and outliers if they exist
+            diff_group = fp_diffs.get_group(fp) if fp in fp_diffs.groups else self.results.iloc[:0]
+            outlier_group = fp_outliers.get_group(fp) if fp in fp_outliers.groups else None
 
-            try:  # Collect matching outliers if they exist
-                outlier_group = fp_outliers.get_group(fp)
-            except KeyError:
-                outlier_group = None
-
-            n_fp_traces = self._plot_per_cenwave(group, self.shift, outlier_group)
+            n_fp_traces = self._plot_per_cenwave(group, diff_group, outlier_group)
             fp_trace_lengths[fp] = n_fp_traces
 
         # For each fp, set the visibility to True for the appropriate number of traces in the appropriate position.
@@ -332,6 +322,7 @@ class BaseNuvOsmShiftMonitor(BaseMonitor):
     subplot_layout = (3, 1)
 
     shift = None  # SHIFT_DISP or SHIFT_XDISP
+    fp_corrected = False  # Whether the FP_PIXEL_SHIFT offsets are applied to the shift values
 
     def get_data(self):
         # Shift1 and Shift2 require different steps
@@ -339,23 +330,20 @@ class BaseNuvOsmShiftMonitor(BaseMonitor):
 
     def track(self) -> dict:
         """Track the difference in shift between stripes. B-C and C-A."""
+        diffs = self.model.view_data(OSMSegmentDiff, 'NUV')
+
         return {
-            'B-C': compute_segment_diff(self.data, self.shift, 'NUVB', 'NUVC'),
-            'C-A': compute_segment_diff(self.data, self.shift, 'NUVC', 'NUVA'),
+            'B-C': join_segment_diff(self.data, diffs, self.shift, 'NUVB', 'NUVC', self.fp_corrected),
+            'C-A': join_segment_diff(self.data, diffs, self.shift, 'NUVC', 'NUVA', self.fp_corrected),
         }
 
-    def _plot_per_grating(self, df: pd.DataFrame):
+    def _plot_per_grating(self, df: pd.DataFrame, diffs: dict, outliers: dict) -> int:
+        """Plot the stripe differences and shift v time per grating. df is the data (or a slice of it) with the columns
+        added in plot, and diffs and outliers have the B-C and C-A differences and outliers for the same data.
+        """
         trace_number = 0  # Keep track of the number of traces created and added
 
-        all_b_c_outliers = self.results['B-C'][self.outliers['B-C']]
-        all_c_a_outliers = self.results['C-A'][self.outliers['C-A']]
-
-        # Find matching stripe differences and outliers
-        b_c = match_dfs(self.results['B-C'], df, 'ROOTNAME')
-        c_a = match_dfs(self.results['C-A'], df, 'ROOTNAME')
-
-        b_c_outliers = match_dfs(all_b_c_outliers, df, 'ROOTNAME') if not all_b_c_outliers.empty else None
-        c_a_outliers = match_dfs(all_c_a_outliers, df, 'ROOTNAME') if not all_c_a_outliers.empty else None
+        b_c, c_a = diffs['B-C'], diffs['C-A']
 
         # Plot diffs v time
         if not b_c.empty:
@@ -390,30 +378,27 @@ class BaseNuvOsmShiftMonitor(BaseMonitor):
             )
             trace_number += 1
 
-        # Plot shift v time per grating group
+        # Plot shift v time per grating group; the data is sorted by time
         groups = df.groupby('OPT_ELEM')
+        n_gratings = df.OPT_ELEM.nunique()
 
         for i, (grating, group) in enumerate(groups):
             trace_number += 2
 
-            abstime = absolute_time(df=group)
-            group = group.set_index(abstime.to_datetime())
-            group = group.sort_index()
-
-            rolling_mean = group.rolling('180D').mean()
+            rolling_mean = group.set_index('lamp_time')[self.shift].rolling('180D').mean()
 
             self.figure.add_trace(
                 go.Scattergl(
-                    x=group.index,
+                    x=group.lamp_time.values,
                     y=group[self.shift],
                     name=grating,
                     mode='markers',
                     text=group.hover_text,
                     visible=False,
                     marker=dict(
-                        cmax=len(df.OPT_ELEM.unique()) - 1,  # Individual plots need to be on the same scale
+                        cmax=n_gratings - 1,  # Individual plots need to be on the same scale
                         cmin=0,
-                        color=list(repeat(i, len(group))),
+                        color=np.full(len(group), i),
                         colorscale='Viridis',
                         opacity=0.5
                     )
@@ -426,7 +411,7 @@ class BaseNuvOsmShiftMonitor(BaseMonitor):
             self.figure.add_trace(
                 go.Scattergl(
                     x=rolling_mean.index,
-                    y=rolling_mean[self.shift],
+                    y=rolling_mean.values,
                     name=f'{grating} Rolling Mean',
                     mode='lines',
                     visible=False
@@ -436,18 +421,17 @@ class BaseNuvOsmShiftMonitor(BaseMonitor):
             )
 
         # Plot each set of potential outliers
-        outlier_sets = [b_c_outliers, c_a_outliers]
         position = [(1, 1), (2, 1)]
         labels = ['B-C Outliers', 'C-A Outliers']
-        for outliers, (row, col), label in zip(outlier_sets, position, labels):
-            if outliers is not None and not outliers.empty:
+        for (key, diff_outliers), (row, col), label in zip(outliers.items(), position, labels):
+            if diff_outliers is not None and not diff_outliers.empty:
                 self.figure.add_trace(
                     go.Scattergl(
-                        x=outliers.lamp_time,
-                        y=outliers.seg_diff,
+                        x=diff_outliers.lamp_time,
+                        y=diff_outliers.seg_diff,
                         name=label,
                         mode='markers',
-                        text=outliers.hover_text,
+                        text=diff_outliers.hover_text,
                         visible=False,
                         marker=dict(color='red'),
                     ),
@@ -457,16 +441,13 @@ class BaseNuvOsmShiftMonitor(BaseMonitor):
                 trace_number += 1
 
                 # Plot outlier points in a different color
-                outliers_main = match_dfs(df, outliers, 'ROOTNAME')
-                outlier_groups = outliers_main.groupby('OPT_ELEM')
+                outlier_groups = df[df[f'{key} outlier'].values].groupby('OPT_ELEM')
                 for grating, group in outlier_groups:
                     trace_number += 1
 
-                    lamp_time = absolute_time(df=group)
-
                     self.figure.add_trace(
                         go.Scattergl(
-                            x=lamp_time.to_datetime(),
+                            x=group.lamp_time.values,
                             y=group[self.shift],
                             name=f'{grating} {label}',
                             mode='markers',
@@ -483,14 +464,33 @@ class BaseNuvOsmShiftMonitor(BaseMonitor):
 
     def plot(self):
         """Plot shift v time per grating/cenwave."""
-        all_stripes_traces = self._plot_per_grating(self.data)
+        diffs = {key: self.results[key] for key in ['B-C', 'C-A']}
+        outliers = {key: diff[self.outliers[key]] for key, diff in diffs.items()}
 
-        # Plot traces per FPPOS for the other buttons
-        stripe_groups = self.data.groupby('SEGMENT')  # Group keys are sorted
+        # Compute the plotted columns once, sorted by time; the traces for each button are made from slices of the data
+        data = self.data.assign(lamp_time=absolute_datetime(df=self.data))
+        data = data.assign(
+            **{f'{key} outlier': data.ROOTNAME.isin(diff_outliers.ROOTNAME).values
+               for key, diff_outliers in outliers.items()}
+        ).sort_values('lamp_time', kind='stable')
+
+        all_outliers = {key: value if not value.empty else None for key, value in outliers.items()}
+        all_stripes_traces = self._plot_per_grating(data, diffs, all_outliers)
+
+        # Plot traces per stripe for the other buttons
+        stripe_groups = data.groupby('SEGMENT')  # Group keys are sorted
 
         stripe_trace_lengths = []  # track the number of traces produced per stripe; this differs between stripe
         for stripe, group in stripe_groups:
-            n_stripe_traces = self._plot_per_grating(group)
+            # Find matching stripe differences and outliers
+            rootnames = group.ROOTNAME.unique()
+            stripe_diffs = {key: diff[diff.ROOTNAME.isin(rootnames)] for key, diff in diffs.items()}
+            stripe_outliers = {
+                key: diff_outliers[diff_outliers.ROOTNAME.isin(rootnames)] if not diff_outliers.empty else None
+                for key, diff_outliers in outliers.items()
+            }
+
+            n_stripe_traces = self._plot_per_grating(group, stripe_diffs, stripe_outliers)
             stripe_trace_lengths.append(n_stripe_traces)
 
         # For each stripe, set the visibility to True for the appropriate number of traces in the appropriate position.
@@ -527,32 +527,18 @@ class BaseNuvOsmShiftMonitor(BaseMonitor):
 class NuvOsmShift1Monitor(BaseNuvOsmShiftMonitor):
     """NUV OSM Shift1 (SHIFT_DISP) monitor."""
     shift = 'SHIFT_DISP'  # shift1
+    fp_corrected = True
 
     run = 'monthly'
 
     def get_data(self):
-        data = get_osm_data(self.model, 'NUV')
-
-        # Expand the data frame's data columns
-        exploded = explode_df(data, ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT'])
-
-        # Apply the OSM pixel offset to the SHIFT_DISP values. If there's no FP_PIXEL_SHIFT, do nothing (Some older
-        # reference files don't have the FP_PIXEL_SHIFT column).
-        # Note: the LAMPTAB_SEGMENT and FP_PIXEL_SHIFT arrays are in the same order, so the segment is used to find the
-        # offset to subtract.
-        exploded.SHIFT_DISP = exploded.apply(
-            (
-                lambda x: x.SHIFT_DISP - x.FP_PIXEL_SHIFT[np.where(x.LAMPTAB_SEGMENT == x.SEGMENT)][0]
-                if len(x.FP_PIXEL_SHIFT) == len(x.LAMPTAB_SEGMENT) else x.SHIFT_DISP
-            ),
-            axis=1
-        )
-
-        # "Unpack" the array items in the XC_RANGE column and SEARCH_OFFSET column
-        exploded.XC_RANGE = exploded.apply(lambda x: x.XC_RANGE[0], axis=1)
-        exploded.SEARCH_OFFSET = exploded.apply(lambda x: x.SEARCH_OFFSET[0], axis=1)
+        """Get the NUV data from the data model's exploded flash view, and apply the OSM pixel offset to the SHIFT_DISP
+        values. The offset is 0 if the matched LAMPTAB doesn't have FP_PIXEL_SHIFT.
+        """
+        data = self.model.view_data(OSMFlash, 'NUV')
+        data['SHIFT_DISP'] = data.SHIFT_DISP - data.FP_PIXEL_SHIFT
 
-        return exploded
+        return data
 
     def find_outliers(self) -> dict:
         bc_results = self.results['B-C'].seg_diff
@@ -568,6 +554,12 @@ class NuvOsmShift1Monitor(BaseNuvOsmShiftMonitor):
             item for item in self.data.groupby(['OPT_ELEM', 'SEARCH_OFFSET', 'XC_RANGE']).groups.keys() if item[-1] != 0
         ]
 
+        # Time span of each search range (for all gratings), converted once
+        spans = self.data.groupby(['SEARCH_OFFSET', 'XC_RANGE']).EXPSTART.agg(['min', 'max'])
+        spans = pd.DataFrame(
+            {column: Time(spans[column].values, format='mjd').to_datetime() for column in spans}, index=spans.index
+        )
+
         colors = {'G185M': 'purple', 'G225M': 'blue', 'G230L': 'green', 'G285M': 'yellow'}
 
         shapes = [
@@ -575,14 +567,8 @@ class NuvOsmShift1Monitor(BaseNuvOsmShiftMonitor):
                 type='rect',
                 xref='x3',
                 yref='y3',
-                x0=Time(
-                    self.data[(self.data.XC_RANGE == xc_range) & (self.data.SEARCH_OFFSET == offset)].EXPSTART.min(),
-                    format='mjd'
-                ).to_datetime(),
-                x1=Time(
-                    self.data[(self.data.XC_RANGE == xc_range) & (self.data.SEARCH_OFFSET == offset)].EXPSTART.max(),
-                    format='mjd'
-                ).to_datetime(),
+                x0=spans.at[(offset, xc_range), 'min'],
+                x1=spans.at[(offset, xc_range), 'max'],
                 y0=offset - xc_range,
                 y1=offset + xc_range,
                 line=dict(color=colors[grating]),
@@ -600,10 +586,8 @@ class NuvOsmShift2Monitor(BaseNuvOsmShiftMonitor):
     run = 'monthly'
 
     def get_data(self):
-        """Filter on detector."""
-        data = get_osm_data(self.model, 'NUV')
-
-        return explode_df(data, ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT'])
+        """Get the NUV data from the data model's exploded flash view."""
+        return self.model.view_data(OSMFlash, 'NUV')
 
     def find_outliers(self) -> dict:
         bc_results = self.results['B-C'].seg_diff
@@ -0,0 +1,184 @@
+import pandas as pd
+
+from peewee import Model, TextField, FloatField, IntegerField
+
+from ..monitor_helpers import RaggedArray, explode_df, explode_ragged
+
+# Segment pairs that are differenced in the OSM Shift monitors
+SEGMENT_PAIRS = (('FUVA', 'FUVB'), ('NUVB', 'NUVC'), ('NUVC', 'NUVA'))
+
+# Exposure-level columns carried along to the derived views
+EXPOSURE_COLUMNS = ['ROOTNAME', 'EXPSTART', 'DETECTOR', 'LIFE_ADJ', 'OPT_ELEM', 'CENWAVE', 'FPPOS', 'PROPOSID']
+
+# OSM data columns that the views are derived from
+SOURCE_COLUMNS = EXPOSURE_COLUMNS + [
+    'TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT', 'LAMPTAB_SEGMENT', 'FP_PIXEL_SHIFT', 'XC_RANGE', 'SEARCH_OFFSET',
+    'TSINCEOSM1', 'TSINCEOSM2'
+]
+
+
+class OSMViewModel(Model):
+    """Base model for the tables derived from the OSM data. The models are bound to the OSMDataModel's database when
+    they're used.
+    """
+    ROOTNAME = TextField(index=True)
+    EXPSTART = FloatField()
+    DETECTOR = TextField()
+    LIFE_ADJ = IntegerField()
+    OPT_ELEM = TextField()
+    CENWAVE = IntegerField()
+    FPPOS = IntegerField()
+    PROPOSID = IntegerField()
+
+
+class OSMFlash(OSMViewModel):
+    """Exploded lampflash data: one row per flash and segment."""
+    SEGMENT = TextField()
+    FLASH = IntegerField()
+    TIME = FloatField()
+    SHIFT_DISP = FloatField()
+    SHIFT_XDISP = FloatField()
+    FP_PIXEL_SHIFT = FloatField()  # Matched LAMPTAB FP_PIXEL_SHIFT for the segment; 0 if not available
+    XC_RANGE = FloatField()
+    SEARCH_OFFSET = FloatField()
+
+    class Meta:
+        indexes = ((('DETECTOR', 'SEGMENT', 'EXPSTART'), False), (('EXPSTART',), False))
+
+
+class OSMDrift(OSMViewModel):
+    """OSM drift data: one row per flash (excluding the first) and segment."""
+    SEGMENT = TextField()
+    TIME = FloatField()
+    SHIFT_DISP = FloatField()
+    SHIFT_XDISP = FloatField()
+    REL_SHIFT_DISP = FloatField()
+    REL_SHIFT_XDISP = FloatField()
+    SHIFT1_DRIFT = FloatField()
+    SHIFT2_DRIFT = FloatField()
+    TSINCEOSM1 = FloatField()
+    TSINCEOSM2 = FloatField()
+    REL_TSINCEOSM1 = FloatField()
+    REL_TSINCEOSM2 = FloatField()
+
+    class Meta:
+        indexes = ((('DETECTOR', 'SEGMENT', 'EXPSTART'), False), (('EXPSTART',), False))
+
+
+class OSMSegmentDiff(Model):
+    """Shift differences between segments (A-B, B-C and C-A): one row per flash and segment pair."""
+    ROOTNAME = TextField(index=True)
+    EXPSTART = FloatField()
+    DETECTOR = TextField()
+    FLASH = IntegerField()
+    SEGMENT1 = TextField()
+    SEGMENT2 = TextField()
+    SHIFT_DISP_DIFF = FloatField()
+    SHIFT_XDISP_DIFF = FloatField()
+    FP_PIXEL_SHIFT_DIFF = FloatField()
+
+    class Meta:
+        indexes = ((('DETECTOR', 'SEGMENT1', 'SEGMENT2', 'EXPSTART'), False),)
+
+
+OSM_VIEWS = [OSMFlash, OSMDrift, OSMSegmentDiff]
+
+
+def derive_flashes(data: pd.DataFrame) -> pd.DataFrame:
+    """Expand OSM data to one row per flash and segment, and resolve the matched reference file data to scalars."""
+    # "Unpack" the array items in the XC_RANGE column and SEARCH_OFFSET column for each exposure
+    data = data.assign(
+        XC_RANGE=RaggedArray.from_arrays(data.XC_RANGE.values).first(),
+        SEARCH_OFFSET=RaggedArray.from_arrays(data.SEARCH_OFFSET.values).first()
+    )
+
+    segments = RaggedArray.from_arrays(data.SEGMENT.values)
+    exploded = explode_df(
+        data,
+        ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT'],
+        columns=EXPOSURE_COLUMNS + ['XC_RANGE', 'SEARCH_OFFSET']
+    )
+
+    # Flashes are numbered in order for each segment of an exposure
+    exploded['FLASH'] = exploded.groupby(['ROOTNAME', 'SEGMENT']).cumcount()
+
+    # Find the OSM pixel offset for the segment from the matched LAMPTAB rows of each exposure. If there's no
+    # FP_PIXEL_SHIFT, there's no offset (Some older reference files don't have the FP_PIXEL_SHIFT column).
+    # Note: the LAMPTAB_SEGMENT and FP_PIXEL_SHIFT arrays are in the same order, so the segment is used to find the
+    # offset.
+    exploded['FP_PIXEL_SHIFT'] = RaggedArray.from_arrays(data.FP_PIXEL_SHIFT.values).match(
+        RaggedArray.from_arrays(data.LAMPTAB_SEGMENT.values), segments.row_ids, segments.flat, default=0.0
+    )
+
+    return exploded[[field.name for field in OSMFlash._meta.sorted_fields if field.name != 'id']]
+
+
+def derive_drift(data: pd.DataFrame) -> pd.DataFrame:
+    """Compute the OSM drift data: the shifts relative to the first flash and the drift rates."""
+    ragged = {
+        column: RaggedArray.from_arrays(data[column].values)
+        for column in ['TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT']
+    }
+
+    # Calculate the relative shift (relative to the first shift measurement for each set of flashes) for AD and XD
+    for shift in ['SHIFT_DISP', 'SHIFT_XDISP']:
+        ragged[f'REL_{shift}'] = ragged[shift].subtract_first()
+
+    # Drop the first value for all of the data columns and expand the dataframe
+    exploded = explode_ragged(
+        data,
+        {column: values.drop_first() for column, values in ragged.items()},
+        columns=EXPOSURE_COLUMNS + ['TSINCEOSM1', 'TSINCEOSM2']
+    )
+
+    # Add drift columns and time since OSM move columns
+    return exploded.assign(
+        SHIFT1_DRIFT=lambda x: x.REL_SHIFT_DISP / x.TIME,
+        SHIFT2_DRIFT=lambda x: x.REL_SHIFT_XDISP / x.TIME,
+        REL_TSINCEOSM1=lambda x: x.TIME + x.TSINCEOSM1,
+        REL_TSINCEOSM2=lambda x: x.TIME + x.TSINCEOSM2,
+    )
+
+
+def derive_segment_diffs(flashes: pd.DataFrame) -> pd.DataFrame:
+    """Compute the differences in the shifts between segments for each flash from the exploded flash data. The flashes
+    are pivoted once to one row per flash with the values of each segment, and each segment pair is differenced from
+    the columns. Flashes that don't have both segments of a pair are left out of that pair.
+    """
+    keys = ['ROOTNAME', 'EXPSTART', 'DETECTOR', 'FLASH']
+    values = ['SHIFT_DISP', 'SHIFT_XDISP', 'FP_PIXEL_SHIFT']
+
+    segments = set(flashes.SEGMENT.unique())
+
+    # PRESENT marks the segments that each flash has (values can be missing)
+    pivoted = flashes.assign(PRESENT=True).set_index(keys + ['SEGMENT'])[values + ['PRESENT']].unstack('SEGMENT')
+
+    results = []
+    for segment1, segment2 in SEGMENT_PAIRS:
+        if segment1 not in segments or segment2 not in segments:
+            continue
+
+        pair = pivoted[pivoted['PRESENT', segment1].notna().values & pivoted['PRESENT', segment2].notna().values]
+
+        results.append(
+            pair.index.to_frame(index=False).assign(
+                SEGMENT1=segment1,
+                SEGMENT2=segment2,
+                **{f'{value}_DIFF': (pair[value, segment1] - pair[value, segment2]).values for value in values}
+            )
+        )
+
+    if not results:
+        return pd.DataFrame(columns=keys + ['SEGMENT1', 'SEGMENT2'] + [f'{value}_DIFF' for value in values])
+
+    return pd.concat(results, ignore_index=True)
+
+
+def derive_osm_views(data: pd.DataFrame) -> dict:
+    """Derive the data for each of the OSM view tables from OSM data."""
+    if data.empty:
+        return {view: pd.DataFrame() for view in OSM_VIEWS}
+
+    flashes = derive_flashes(data)
+
+    return {OSMFlash: flashes, OSMDrift: derive_drift(data), OSMSegmentDiff: derive_segment_diffs(flashes)}
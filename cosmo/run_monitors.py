@@ -5,6 +5,7 @@ import shlex
 from argparse import ArgumentParser
 
 from . import monitors
+from .monitors.data_models import RUN_CACHE, BaseCosmoDataModel
 from .sms import SMSFinder
 
 
@@ -37,6 +38,15 @@ def collection() -> dict:
 COLLECTION = collection()
 
 
+@pytest.fixture(scope='session', autouse=True)
+def run_cache():
+    """Share DataModel data between monitors for the duration of the run, so that each DataModel's new data and stored
+    data are loaded once.
+    """
+    with RUN_CACHE.run():
+        yield
+
+
 @pytest.fixture
 def monitor():
     """Fixture-factory that creates a monitor instance from the input class."""
@@ -58,7 +68,7 @@ def monthly_monitor(request, monitor):
     # If run_ingest is not included in the test session, ingest any new data into the databases
     session_names = [item.name for item in request.session.items]  # names of "test" in the session object
 
-    if 'run_ingest' not in session_names:
+    if 'run_ingest' not in session_names and not active.model.history_only:
         active.model.ingest()
 
 
@@ -72,7 +82,7 @@ def daily_monitor(request, monitor):
     # If run_ingest is not included in the test session, ingest any new data into the databases
     session_names = [item.name for item in request.session.items]  # names of "test" in the session object
 
-    if 'run_ingest' not in session_names:
+    if 'run_ingest' not in session_names and not active.model.history_only:
         active.model.ingest()
 
 
@@ -92,6 +102,16 @@ def datamodel(request):
     return active_model
 
 
+@pytest.fixture(params=COLLECTION['datamodels'])
+def backfill_datamodel(request):
+    """Parametrized fixture for DataModels for use in bulk ingestion. New data is streamed during ingestion instead of
+    being collected up front.
+    """
+    active_model = request.param(find_new=False)
+
+    return active_model
+
+
 class RunIngestion:
 
     @pytest.mark.ingest
@@ -107,6 +127,13 @@ class RunIngestion:
         """Execute DataModel new data discovery and ingestion. Included in the "ingest" group."""
         datamodel.ingest()
 
+    @pytest.mark.backfill
+    def run_backfill(self, backfill_datamodel):
+        """Execute DataModel new data discovery and bulk ingestion for large backfills. Only included in the "backfill"
+        group.
+        """
+        backfill_datamodel.backfill()
+
 
 class RunMonitors:
     """Class for organizing runners."""
@@ -128,18 +155,37 @@ def runner():
 
     parser.add_argument('--monthly', '-mo', action='store_true', help='Execute Monitors marked as "monthly"')
     parser.add_argument('--ingest', '-in', action='store_true', help='Execute data ingestion for DataModels and SMS')
+    parser.add_argument(
+        '--backfill', '-bf', action='store_true', help='Execute bulk data ingestion for DataModels (for backfills)'
+    )
+    parser.add_argument(
+        '--history-only', '-ho', action='store_true',
+        help='Execute Monitors with the stored data only. New data is not searched for or ingested'
+    )
 
     args = parser.parse_args()
 
+    if args.history_only:
+        BaseCosmoDataModel.history_only = True
+
+        pytest.main(shlex.split(default_pytest_args + ' -m "not ingest and not backfill"'))
+
+        return
+
     # Execute pytest
     if args.monthly:
         pytest.main(shlex.split(default_pytest_args + ' -m monthly'))
 
         return
 
-    if args.ingestion:
+    if args.ingest:
         pytest.main(shlex.split(default_pytest_args + ' -m ingest'))
 
         return
 
-    pytest.main(shlex.split(default_pytest_args))
+    if args.backfill:
+        pytest.main(shlex.split(default_pytest_args + ' -m backfill'))
+
+        return
+
+    pytest.main(shlex.split(default_pytest_args + ' -m "not backfill"'))
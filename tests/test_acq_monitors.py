@@ -1,8 +1,12 @@
 import os
 import pytest
+import numpy as np
+import pandas as pd
 
-from cosmo.monitors.acq_monitors import AcqPeakdMonitor, AcqImageMonitor, AcqPeakxdMonitor
+from cosmo.monitors.acq_monitors import AcqPeakdMonitor, AcqImageMonitor, AcqPeakxdMonitor, AcqImageV2V3Monitor
 from cosmo.monitors.data_models import AcqDataModel
+from cosmo.monitors.acq_views import ACQ_VIEWS
+from cosmo.monitor_helpers import convert_day_of_year
 
 
 @pytest.fixture(params=[False, True])
@@ -36,6 +40,7 @@ class TestAcqMonitors:
         yield
 
         if request.cls.acqmonitor.model.model is not None:
+            request.cls.acqmonitor.model.model._meta.database.drop_tables(ACQ_VIEWS, safe=True)
             request.cls.acqmonitor.model.model.drop_table(safe=True)
 
     def test_monitor_steps(self):
@@ -46,3 +51,37 @@ class TestAcqMonitors:
         self.acqmonitor.store_results()
 
         assert os.path.exists(self.acqmonitor.output)
+
+
+class TestV2V3Fits:
+
+    def test_epoch_fits(self):
+        rng = np.random.default_rng(0)
+        n = 500
+        data = pd.DataFrame({
+            'FGS': rng.choice(['F1', 'F2', 'F3'], n), 'EXPSTART': np.sort(rng.uniform(55000, 59500, n)),
+            'V2SLEW': rng.normal(0, 0.1, n), 'V3SLEW': rng.normal(0, 0.1, n)
+        })
+
+        monitor = AcqImageV2V3Monitor.__new__(AcqImageV2V3Monitor)
+        monitor.data = data
+
+        fits, results = monitor.track()
+
+        # FGS2 epochs leave out the time that it was turned off
+        fgs2_off = data.EXPSTART.between(convert_day_of_year(2015.327).mjd, convert_day_of_year(2016.123).mjd)
+        assert len(fits) == len(data) - ((data.FGS == 'F2') & fgs2_off).sum()
+        assert fits.EPOCH.max() == 5
+
+        for (_, _), epoch in fits.groupby(['FGS', 'EPOCH']):
+            assert epoch.EXPSTART.is_monotonic_increasing
+
+            byear = 1900 + (epoch.EXPSTART + 2400000.5 - 2415020.31352) / 365.242198781
+            slope, intercept = np.polyfit(byear, -epoch.V2SLEW, 1)
+
+            assert np.allclose(epoch.V2SLOPE, slope)
+            assert np.allclose(epoch.V2FIT, slope * byear + intercept)
+
+        last = fits[(fits.FGS == 'F3') & (fits.EPOCH == 2)]
+        assert results['F3']['V3']['start'] == last.V3FIT.iloc[0]
+        assert results['F3']['V3']['end'] == last.V3FIT.iloc[-1]
@@ -0,0 +1,382 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+from types import SimpleNamespace
+from peewee import SqliteDatabase
+
+from cosmo.monitors import dark_monitors
+from cosmo.monitors.data_models import DarkDataModel
+from cosmo.monitors.dark_store import (
+    SKETCH_TABLES, RESULT_TABLES, DARK_TABLES, DarkSketch, DarkExposure, DarkTrack, load_sketch, update_sketch,
+    update_aggregate, store_track
+)
+from cosmo.monitors.dark_maps import (
+    DarkMap, update_dark_maps, load_dark_maps, load_pha_histograms, box_dark_rates
+)
+from cosmo.monitors.dark_monitors import (
+    RegionLookup, OrbitalGrid, SolarFluxProvider, bin_dark_events, compute_dark_rates, segment_dark_rates, DARK_REGIONS
+)
+
+
+@pytest.fixture
+def dark_data():
+    rng = np.random.default_rng(0)
+    nevents = 5000
+
+    return pd.DataFrame([
+        {
+            'ROOTNAME': 'test', 'SEGMENT': 'FUVA', 'EXPSTART': 58000.,
+            'XCORR': rng.integers(1000, 15300, nevents).astype(float),
+            'YCORR': rng.integers(250, 800, nevents).astype(float),
+            'PHA': rng.integers(0, 31, nevents),
+            'TIME': rng.uniform(0, 100, nevents),
+            'TIME_3': np.arange(101.),
+            'LATITUDE': np.zeros(101),
+            'LONGITUDE': np.zeros(101)
+        }
+    ])
+
+
+class TestRegionLookup:
+
+    def test_overlapping_boxes(self):
+        locations = DARK_REGIONS['FUVA']
+        lookup = RegionLookup(locations)
+
+        # Include positions that are on the box edges
+        x = np.array([1060, 1061, 1260, 1259.5, 15250, 5000, 5000, 0])
+        y = np.array([296, 297, 300, 376, 500, 375, 500, 0])
+
+        counts = lookup.counts(x, y, np.zeros(len(x), dtype=int), 1)[:, 0]
+        expected = [
+            sum((x0 < xi < x1) and (y0 < yi < y1) for xi, yi in zip(x, y)) for x0, x1, y0, y1 in locations
+        ]
+
+        assert counts.tolist() == expected
+
+
+class TestComputeDarkRates:
+
+    def test_matches_region_filtering(self, dark_data):
+        locations = DARK_REGIONS['FUVA']
+        rates = compute_dark_rates(dark_data, 'FUVA', locations)
+
+        assert len(rates) == len(locations) * 4  # 101 TIME_3 samples make 4 bins of 25
+
+        row = dark_data.iloc[0]
+        for region, (x0, x1, y0, y1) in enumerate(locations):
+            good = (
+                (row.XCORR > x0) & (row.XCORR < x1) & (row.YCORR > y0) & (row.YCORR < y1) &
+                (row.PHA > 2) & (row.PHA < 23)
+            )
+            counts = np.histogram(row.TIME[good], bins=row.TIME_3[::25])[0]
+
+            assert np.allclose(
+                rates[rates.region == region].darks, counts / ((x1 - x0) * (y1 - y0)) / 25
+            )
+
+
+class TestBinDarkEvents:
+
+    def test_bins(self):
+        time = np.array([0., 0.5, 1., 1.5, 2., 2.5, 3.])
+        xcorr = np.full(len(time), 5.)
+        ycorr = np.full(len(time), 5.)
+        pha = np.array([10, 10, 1, 10, 10, 10, 10])
+
+        orbit_time = np.arange(4.)
+        binned = bin_dark_events(
+            time, xcorr, ycorr, pha, [0., 1., 3.], [(0, 10, 0, 10)], orbit_time, [0., 10., 20., 30.],
+            [350., 0., 10., 20.]
+        )
+
+        # The PHA=1 event is removed, and the last bin includes its upper edge
+        assert binned.counts.tolist() == [[2, 4]]
+        assert np.allclose(binned.centers, [0.5, 2.])
+        assert np.allclose(binned.latitude, [5., 20.])
+
+        # Longitude is interpolated across 360
+        assert np.allclose(binned.longitude, [355., 10.])
+
+
+@pytest.fixture
+def solar_source(tmp_path):
+    source = tmp_path / 'indices.json'
+    source.write_text(json.dumps([{'time-tag': f'2019-{month:02d}', 'f10.7': 70. + month} for month in range(1, 13)]))
+
+    return source
+
+
+class TestSolarFluxProvider:
+
+    def test_cache(self, solar_source, tmp_path):
+        cache = tmp_path / 'cache.json'
+        provider = SolarFluxProvider(str(solar_source), str(cache), ttl=1, offline=False)
+
+        flux = provider.flux()
+        assert cache.exists()
+        assert len(flux) == 12 and 'box_convolved_f10.7' in flux
+
+        # The fresh cache is used instead of the source
+        solar_source.write_text('[]')
+        assert len(provider.flux()) == 12
+
+        # The stale cache is refreshed
+        provider.ttl = 0
+        assert provider.load() == []
+
+    def test_offline(self, solar_source, tmp_path):
+        cache = tmp_path / 'cache.json'
+
+        with pytest.raises(FileNotFoundError):
+            SolarFluxProvider(str(solar_source), str(cache), offline=True).load()
+
+        cache.write_text(solar_source.read_text())
+        offline = SolarFluxProvider('http://localhost:1/unreachable', str(cache), ttl=0, offline=True)
+
+        assert len(offline.flux().loc['2019-03':'2019-05']) == 3
+
+    def test_stale_fallback(self, solar_source, tmp_path):
+        cache = tmp_path / 'cache.json'
+        cache.write_text(solar_source.read_text())
+
+        provider = SolarFluxProvider(str(tmp_path / 'missing.json'), str(cache), ttl=0, offline=False)
+
+        with pytest.warns(Warning):
+            assert len(provider.load()) == 12
+
+
+class TestDarkSketches:
+
+    @pytest.fixture(autouse=True)
+    def database(self, tmp_path):
+        with SqliteDatabase(str(tmp_path / 'dark.db')).bind_ctx(SKETCH_TABLES):
+            yield
+
+    def test_update_sketch(self):
+        rates = pd.DataFrame({'rootname': ['a', 'a', 'b'], 'darks': [1e-6, 2e-6, 3e-6]})
+
+        assert update_sketch('test', rates).count == 3
+
+        # Exposures are only added once
+        more = pd.DataFrame({'rootname': ['b', 'c'], 'darks': [3e-6, 4e-6]})
+        sketch = update_sketch('test', more)
+
+        assert sketch.count == 4
+        assert load_sketch('test').count == 4
+        assert sketch.mean == pytest.approx(2.5e-6)
+        assert load_sketch('other').count == 0
+
+
+class TestOrbitalGrid:
+
+    @pytest.fixture
+    def rates(self):
+        rng = np.random.default_rng(1)
+        size = 10000
+
+        return pd.DataFrame({
+            'rootname': rng.choice(['a', 'b', 'c', 'd'], size),
+            'longitude': rng.uniform(0, 360, size),
+            'latitude': rng.uniform(-30, 30, size),
+            'darks': rng.lognormal(np.log(1e-6), 0.5, size)
+        })
+
+    def test_statistics(self, rates):
+        grid = OrbitalGrid(10, 10).add(rates.longitude, rates.latitude, rates.darks)
+        edges = (grid.lat_edges, grid.lon_edges)
+
+        counts = np.histogram2d(rates.latitude, rates.longitude, bins=edges)[0]
+        sums = np.histogram2d(rates.latitude, rates.longitude, bins=edges, weights=rates.darks)[0]
+
+        assert grid.statistic('count').tolist() == counts.tolist()
+        assert np.allclose(grid.statistic('mean')[counts > 0], (sums / np.where(counts > 0, counts, 1))[counts > 0])
+        assert np.isnan(grid.statistic('mean')[counts == 0]).all()
+
+        # The median is approximated by the rate histogram bucket
+        cell = (rates.latitude // 10 == 0) & (rates.longitude // 10 == 0)
+        assert grid.statistic('median')[9, 0] == pytest.approx(rates.darks[cell].median(), rel=0.06)
+
+        with pytest.raises(ValueError):
+            grid.statistic('max')
+
+    def test_json(self, rates):
+        grid = OrbitalGrid(5, 10).add(rates.longitude, rates.latitude, rates.darks)
+        restored = OrbitalGrid.from_json(grid.to_json())
+
+        assert restored.shape == grid.shape == (18, 72)
+        for kind in ('count', 'mean', 'median'):
+            assert np.allclose(restored.statistic(kind), grid.statistic(kind), equal_nan=True)
+
+    def test_incremental(self, rates, tmp_path):
+        def add(grid, new):
+            return grid.add(new.longitude, new.latitude, new.darks)
+
+        with SqliteDatabase(str(tmp_path / 'dark.db')).bind_ctx(SKETCH_TABLES):
+            first = rates[rates.rootname.isin(['a', 'b'])]
+            update_aggregate('orbital', first, OrbitalGrid, OrbitalGrid.from_json, add)
+
+            # Exposures that were already added are skipped
+            grid = update_aggregate('orbital', rates, OrbitalGrid, OrbitalGrid.from_json, add)
+
+        expected = OrbitalGrid().add(rates.longitude, rates.latitude, rates.darks)
+        assert grid.counts.sum() == len(rates)
+        assert np.allclose(grid.statistic('mean'), expected.statistic('mean'), equal_nan=True)
+
+
+class TestDarkMaps:
+
+    @pytest.fixture(autouse=True)
+    def database(self, tmp_path):
+        with SqliteDatabase(str(tmp_path / 'dark.db')).bind_ctx(SKETCH_TABLES):
+            yield
+
+    @pytest.fixture
+    def exposures(self, dark_data):
+        second = dark_data.assign(ROOTNAME='test2', EXPSTART=58040., EXPTIME=100.)
+
+        return pd.concat([dark_data.assign(EXPTIME=100.), second], ignore_index=True)
+
+    def test_box_counts(self, dark_data):
+        row = dark_data.iloc[0]
+        dark_map = DarkMap(binning=(32, 8)).add(row.XCORR, row.YCORR, 100)
+
+        # Boxes aligned with the binning are exact
+        x0, x1, y0, y1 = 1024, 2048, 256, 512
+        inside = (row.XCORR >= x0) & (row.XCORR < x1) & (row.YCORR >= y0) & (row.YCORR < y1)
+
+        assert dark_map.box_counts((x0, x1, y0, y1)) == inside.sum()
+        assert dark_map.box_counts((0, 16384, 0, 1024)) == len(row.XCORR)
+        assert dark_map.box_rate((x0, x1, y0, y1)) == pytest.approx(inside.sum() / ((x1 - x0) * (y1 - y0)) / 100)
+
+        restored = DarkMap.from_json(dark_map.to_json())
+        assert (restored.counts == dark_map.counts).all() and restored.exptime == 100
+
+    def test_update(self, exposures):
+        update_dark_maps(exposures.iloc[:1])
+        update_dark_maps(exposures)  # the first exposure isn't added again
+
+        maps = load_dark_maps('FUVA')
+        assert list(maps) == ['2017-09', '2017-10']
+        assert all(dark_map.exposures == 1 for dark_map in maps.values())
+
+        row = exposures.iloc[0]
+        good = (row.PHA > 2) & (row.PHA < 23)
+        assert maps['2017-09'].counts.sum() == good.sum()
+
+        location = DARK_REGIONS['FUVA'][0]
+        histograms = load_pha_histograms('FUVA', location)
+        x0, x1, y0, y1 = location
+        inside = (row.XCORR > x0) & (row.XCORR < x1) & (row.YCORR > y0) & (row.YCORR < y1)
+
+        assert histograms.shape == (2, 32)
+        assert histograms.loc['2017-09'].tolist() == np.bincount(row.PHA[inside], minlength=32).tolist()
+
+        rates = box_dark_rates('FUVA', (1024, 2048, 256, 512))
+        assert rates.index.tolist() == ['2017-09', '2017-10'] and rates.iloc[0] == rates.iloc[1]
+
+
+    def test_backfill(self, exposures, monkeypatch):
+        monkeypatch.setattr(DarkDataModel, 'iter_new_data', lambda model: iter(exposures.to_dict(orient='records')))
+        monkeypatch.setattr(DarkDataModel, 'map_batch_size', 1)
+
+        model = DarkDataModel(find_new=False)
+
+        try:
+            model.backfill(batch_bytes=1)
+
+            # The dark tables are stored in the data model's database
+            assert DarkSketch._meta.database is model.model._meta.database
+
+            # Backfilled exposures are added to the maps from the stored data
+            maps = load_dark_maps('FUVA')
+            assert list(maps) == ['2017-09', '2017-10']
+
+            row = exposures.iloc[0]
+            assert maps['2017-09'].counts.sum() == ((row.PHA > 2) & (row.PHA < 23)).sum()
+
+            # Nothing is added twice
+            model.update_views()
+            assert sum(dark_map.exposures for dark_map in load_dark_maps('FUVA').values()) == 2
+
+        finally:
+            if model.model is not None:
+                model.model._meta.database.drop_tables(DARK_TABLES + [model.model], safe=True)
+
+
+class TestDarkResults:
+
+    @pytest.fixture(autouse=True)
+    def database(self, tmp_path):
+        with SqliteDatabase(str(tmp_path / 'dark.db')).bind_ctx(RESULT_TABLES):
+            yield
+
+    @pytest.fixture
+    def exposures(self, dark_data):
+        second = dark_data.assign(ROOTNAME='test2', EXPSTART=58040.)
+
+        return pd.concat([dark_data, second], ignore_index=True).assign(EXPTIME=100.)
+
+    @pytest.fixture
+    def model(self):
+        model = DarkDataModel(find_new=False)
+
+        yield model
+
+        if model.model is not None:
+            model.model._meta.database.drop_tables(DARK_TABLES + [model.model], safe=True)
+
+    def test_stored_rates(self, exposures, model, monkeypatch):
+        model.new_data = exposures.iloc[:1]
+        model.ingest()
+        locations = DARK_REGIONS['FUVA']
+
+        computed = segment_dark_rates(model, 'FUVA', locations)
+        assert len(computed) == len(locations) * 4
+        assert DarkExposure.select().count() == len(locations)
+
+        # Exposures with stored results aren't processed again
+        calls = []
+        monkeypatch.setattr(dark_monitors, 'compute_dark_rates', lambda *args: calls.append(args))
+
+        stored = segment_dark_rates(model, 'FUVA', [locations[1], locations[0]])
+
+        assert not calls
+        assert np.allclose(
+            stored[stored.region == 1].darks.sort_values(), computed[computed.region == 0].darks.sort_values()
+        )
+        date_difference = stored[stored.region == 0].date.values - computed[computed.region == 1].date.values
+        assert (np.abs(date_difference) < np.timedelta64(1, 'ms')).all()
+
+    def test_stored_exposures(self, exposures, model, monkeypatch):
+        model.new_data = exposures
+        model.ingest()
+
+        # The monitor is run without new data, so the rates are calculated from the stored exposures
+        monkeypatch.setattr(DarkDataModel, 'get_new_data', lambda self: pd.DataFrame())
+        monkeypatch.setattr(DarkDataModel, 'rate_batch_size', 1)
+
+        rates = dark_monitors.FUVADarkMonitor().get_data()
+        expected = compute_dark_rates(exposures, 'FUVA', DARK_REGIONS['FUVA'])
+
+        assert DarkExposure.select().count() == 2 * len(DARK_REGIONS['FUVA'])
+        assert len(rates) == len(expected)
+        assert np.allclose(
+            rates.sort_values(['rootname', 'region', 'date']).darks,
+            expected.sort_values(['rootname', 'region', 'date']).darks
+        )
+
+    def test_unbound(self, dark_data):
+        # Nothing has been ingested, so the rates of the new data are returned without storing them
+        model = SimpleNamespace(new_data=dark_data, _bind_dark=lambda create=False: False)
+        locations = DARK_REGIONS['FUVA']
+
+        assert len(segment_dark_rates(model, 'FUVA', locations)) == len(locations) * 4
+        assert not DarkExposure.table_exists()
+
+    def test_track(self):
+        store_track('test', [1., 2., 3., 4., 5., 6., 7.])
+
+        assert DarkTrack.get(DarkTrack.NAME == 'test').DIST99 == 7.
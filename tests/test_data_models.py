@@ -2,7 +2,9 @@ import pandas as pd
 import numpy as np
 import pytest
 
-from cosmo.monitors.data_models import AcqDataModel, OSMDataModel
+from cosmo.monitors.data_models import AcqDataModel, OSMDataModel, RUN_CACHE, good_jitter_rows
+from cosmo.monitors.osm_views import OSM_VIEWS, OSMFlash, OSMDrift, OSMSegmentDiff
+from cosmo.monitors.acq_views import ACQ_VIEWS, AcqStatExposure, describe_summary, summarize_acqs, combine_summaries
 from cosmo.sms import SMSFinder
 
 
@@ -34,6 +36,7 @@ class TestOSMDataModel:
         yield
 
         if request.cls.osmmodel.model is not None:
+            request.cls.osmmodel.model._meta.database.drop_tables(OSM_VIEWS, safe=True)
             request.cls.osmmodel.model.drop_table(safe=True)
 
     def test_data_collection(self):
@@ -61,6 +64,12 @@ class TestOSMDataModel:
         # Check that entries that have no data have been removed
         assert not self.osmmodel.new_data.apply(lambda x: not bool(len(x.SHIFT_DISP)), axis=1).all()
 
+    def test_no_lampflashes(self, monkeypatch):
+        # All of the new files are dropped by the worker-side reducer
+        monkeypatch.setattr('cosmo.monitors.data_models.data_from_exposures', lambda *args, **kwargs: [])
+
+        assert self.osmmodel.get_new_data().empty
+
     def test_data_extension_data(self):
         data_extension_keys = ('TIME', 'SHIFT_DISP', 'SHIFT_XDISP', 'SEGMENT')
 
@@ -79,6 +88,105 @@ class TestOSMDataModel:
         assert self.osmmodel.model is not None
         assert len(list(self.osmmodel.model.select())) == 11
 
+    def test_query(self):
+        self.osmmodel.ingest()
+
+        # Indexes should be created with the table
+        table = self.osmmodel.model._meta.table_name
+        indexes = [index.name for index in self.osmmodel.model._meta.database.get_indexes(table)]
+        assert f'{table}_detector_expstart'.lower() in indexes
+
+        data = self.osmmodel.query(['ROOTNAME', 'EXPSTART', 'SHIFT_DISP'], DETECTOR='FUV')
+        all_fuv = self.osmmodel.new_data[self.osmmodel.new_data.DETECTOR == 'FUV']
+
+        assert sorted(data.columns) == ['EXPSTART', 'ROOTNAME', 'SHIFT_DISP']
+        assert len(data) == 2 * len(all_fuv)  # Stored data + new data
+        assert all(isinstance(value, np.ndarray) for value in data.SHIFT_DISP)
+
+        start = all_fuv.EXPSTART.median()
+        recent = self.osmmodel.query(['ROOTNAME'], start=start, include_new=False, DETECTOR=['FUV', 'NUV'])
+        assert len(recent) == (self.osmmodel.new_data.EXPSTART >= start).sum()
+
+    def test_data_backfill(self):
+        self.osmmodel.backfill(batch_bytes=1)  # One row per transaction
+
+        assert self.osmmodel.model is not None
+        assert len(list(self.osmmodel.model.select())) == 11
+        assert self.osmmodel.new_data.empty
+        assert OSMFlash.select().count() > 0
+
+    def test_views(self):
+        # Before ingestion, the view rows are derived from the new data
+        pending = {view: self.osmmodel.view_data(view, 'FUV') for view in OSM_VIEWS}
+
+        assert not pending[OSMFlash].empty
+        assert (pending[OSMFlash].DETECTOR == 'FUV').all()
+        new_fuv = self.osmmodel.new_data[self.osmmodel.new_data.DETECTOR == 'FUV']
+        assert len(pending[OSMFlash]) == new_fuv.SHIFT_DISP.str.len().sum()
+        assert (pending[OSMSegmentDiff].SEGMENT1 == 'FUVA').all()
+
+        self.osmmodel.ingest()
+
+        # Only stored data remains, and the view tables contain the same rows
+        stored_model = OSMDataModel(find_new=False)
+
+        for view, rows in pending.items():
+            stored = stored_model.view_data(view, 'FUV')
+
+            assert len(stored) == len(rows)
+            assert sorted(stored.columns) == sorted(rows.columns)
+
+        assert np.allclose(
+            stored_model.view_data(OSMDrift, 'FUV').sort_values(['ROOTNAME', 'SEGMENT', 'TIME']).SHIFT1_DRIFT,
+            pending[OSMDrift].sort_values(['ROOTNAME', 'SEGMENT', 'TIME']).SHIFT1_DRIFT
+        )
+
+        # Updating the views again doesn't duplicate any of the rows
+        self.osmmodel.update_views()
+        assert OSMFlash.select().count() == len(stored_model.view_data(OSMFlash, 'FUV')) + len(
+            stored_model.view_data(OSMFlash, 'NUV')
+        )
+
+    def test_view_filters(self):
+        self.osmmodel.ingest()
+
+        indexes = [index.name for index in OSMFlash._meta.database.get_indexes(OSMFlash._meta.table_name)]
+        assert 'osmflash_DETECTOR_SEGMENT_EXPSTART' in indexes
+
+        flashes = self.osmmodel.view_data(OSMFlash, 'FUV')
+        start = flashes.EXPSTART.median()
+
+        filtered = self.osmmodel.view_data(OSMFlash, 'FUV', ['ROOTNAME', 'SHIFT_DISP'], start=start, SEGMENT='FUVA')
+        expected = flashes[(flashes.EXPSTART >= start) & (flashes.SEGMENT == 'FUVA')]
+
+        assert sorted(filtered.columns) == ['ROOTNAME', 'SHIFT_DISP']
+        assert len(filtered) == len(expected)
+        assert np.allclose(np.sort(filtered.SHIFT_DISP), np.sort(expected.SHIFT_DISP))
+
+    def test_without_stored_views(self, monkeypatch):
+        monkeypatch.setattr(OSMDataModel, 'store_views', False)
+        pending = self.osmmodel.view_data(OSMFlash, 'NUV', SEGMENT=['NUVA', 'NUVB'])
+
+        self.osmmodel.ingest()
+
+        # The view rows are derived from the stored data instead
+        stored = OSMDataModel(find_new=False).view_data(OSMFlash, 'NUV', SEGMENT=['NUVA', 'NUVB'])
+
+        assert not self.osmmodel.model._meta.database.table_exists('osmflash')
+        assert len(stored) == len(pending) > 0
+
+    def test_history_only_reads(self, monkeypatch):
+        monkeypatch.setattr(OSMDataModel, 'store_views', False)
+        self.osmmodel.ingest()
+        monkeypatch.setattr(OSMDataModel, 'store_views', True)
+        monkeypatch.setattr(OSMDataModel, 'history_only', True)
+
+        # Reading the views doesn't create the view tables; the rows are derived from the stored data
+        flashes = OSMDataModel().view_data(OSMFlash, 'FUV')
+
+        assert not flashes.empty
+        assert not any(self.osmmodel.model._meta.database.table_exists(view._meta.table_name) for view in OSM_VIEWS)
+
 
 class TestAcqDataModel:
 
@@ -91,6 +199,7 @@ class TestAcqDataModel:
         yield
 
         if request.cls.acqmodel.model is not None:
+            request.cls.acqmodel.model._meta.database.drop_tables(ACQ_VIEWS, safe=True)
             request.cls.acqmodel.model.drop_table(safe=True)
 
     def test_data_collection(self):
@@ -119,3 +228,160 @@ class TestAcqDataModel:
 
         assert self.acqmodel.model is not None
         assert len(list(self.acqmodel.model.select())) == 9
+
+    def test_data_backfill(self):
+        self.acqmodel.backfill()
+
+        assert self.acqmodel.model is not None
+        assert len(list(self.acqmodel.model.select())) == 9
+
+        # A second backfill should not find anything new
+        self.acqmodel.backfill()
+        assert len(list(self.acqmodel.model.select())) == 9
+
+    def test_summary(self):
+        # Before ingestion, the statistics are computed from the new data
+        new_data = self.acqmodel.new_data
+        pending = self.acqmodel.summary()
+
+        self.acqmodel.ingest()
+        assert AcqStatExposure.select().count() == 9
+
+        # Only the stored running statistics remain, and they match
+        stored = AcqDataModel(find_new=False).summary()
+
+        assert stored.COUNT.tolist() == pending.COUNT.tolist()
+        assert np.allclose(
+            [sketch.std for sketch in stored.SKETCH], [sketch.std for sketch in pending.SKETCH], equal_nan=True
+        )
+
+        described = describe_summary(stored, 'ACQ/IMAGE', 'configuration', ['ACQSLEWX'])['ACQSLEWX']
+        images = new_data[new_data.EXPTYPE == 'ACQ/IMAGE']
+        expected = images.groupby(images.APERTURE.str.cat(images.OPT_ELEM, sep='-')).ACQSLEWX.describe()
+
+        for statistic in ['count', 'mean', 'std', 'min', 'max']:
+            assert np.allclose(described[statistic], expected[statistic], equal_nan=True)
+
+        # Updating the statistics again doesn't add any acquisitions twice
+        self.acqmodel.update_views(new_data)
+        assert AcqDataModel(find_new=False).summary().COUNT.tolist() == pending.COUNT.tolist()
+
+    def test_summary_read_only(self, monkeypatch):
+        # Acquisitions stored without statistics are summarized from the stored data, without writing the statistics
+        new_data = self.acqmodel.new_data
+        pending = self.acqmodel.summary()
+
+        monkeypatch.setattr(AcqDataModel, 'store_stats', False)
+        self.acqmodel.ingest()
+        monkeypatch.setattr(AcqDataModel, 'store_stats', True)
+
+        assert AcqDataModel(find_new=False).summary().COUNT.tolist() == pending.COUNT.tolist()
+        assert not AcqStatExposure.table_exists()
+
+        # Acquisitions that are missing from the stored statistics are included as well
+        self.acqmodel._bind_stats(create=True)
+        self.acqmodel._add_stats(new_data.iloc[:4])
+        assert AcqStatExposure.select().count() == 4
+
+        assert AcqDataModel(find_new=False).summary().COUNT.tolist() == pending.COUNT.tolist()
+        assert AcqStatExposure.select().count() == 4
+
+
+class TestDescribeSummary:
+
+    def test_precision(self):
+        # Large offsets with a small spread lose all precision with the sum of squares
+        rng = np.random.default_rng(0)
+        data = pd.DataFrame({
+            'ROOTNAME': [f'r{i}' for i in range(200)], 'EXPTYPE': 'ACQ/IMAGE', 'APERTURE': 'PSA', 'OPT_ELEM': 'MIRRORA',
+            'FGS': 'F1', 'ACQSLEWX': 1e8 + rng.normal(0, 0.01, 200), 'ACQSLEWY': rng.normal(0, 1, 200)
+        })
+
+        summary = combine_summaries(summarize_acqs(data.iloc[:50]), summarize_acqs(data.iloc[50:]))
+        described = describe_summary(summary, 'ACQ/IMAGE', 'FGS', ['ACQSLEWX'])['ACQSLEWX']
+
+        assert described['mean'].iloc[0] == pytest.approx(data.ACQSLEWX.mean(), abs=1e-6)
+        assert described['std'].iloc[0] == pytest.approx(data.ACQSLEWX.std(), rel=1e-6)
+
+
+class TestReducers:
+
+    def test_good_jitter_rows(self):
+        rows = [
+            {'EXPNAME': 'a', 'EXPTYPE': 'EXTERNAL/SCI', 'EXPSTART': 1., 'SI_V2_AVG_mean': 0.1},
+            {'EXPNAME': 'b', 'EXPTYPE': 'EXTERNAL/SCI', 'EXPSTART': np.nan, 'SI_V2_AVG_mean': 0.1},
+            {'EXPNAME': 'c', 'EXPTYPE': 'EXTERNAL/SCI', 'EXPSTART': 1., 'SI_V2_AVG_mean': np.inf},
+            {'EXPNAME': None, 'EXPTYPE': 'EXTERNAL/SCI', 'EXPSTART': 1., 'SI_V2_AVG_mean': 0.1},
+            {'EXPNAME': 'e', 'EXPTYPE': 'ACQ/IMAGE', 'EXPSTART': 1., 'SI_V2_AVG_mean': 0.1},
+        ]
+
+        # Rows with a missing or non-finite value in any column are removed, as with dropna
+        assert [row['EXPNAME'] for row in good_jitter_rows(rows)] == ['a']
+
+
+class TestRunCache:
+
+    @pytest.fixture(autouse=True)
+    def cleanup(self):
+        yield
+
+        model = AcqDataModel(find_new=False)
+
+        if model.model is not None:
+            model.model.drop_table(safe=True)
+
+    def test_shared_data(self, make_datamodel):
+        with RUN_CACHE.run():
+            first = make_datamodel(AcqDataModel)
+            second = make_datamodel(AcqDataModel)
+
+            # New data is only found once
+            assert first.new_data is second.new_data
+
+            query = first.query(['ROOTNAME', 'EXPSTART'], EXPTYPE='ACQ/IMAGE')
+            query['new_column'] = 1  # Adding columns to the result should not change the cached result
+
+            assert 'new_column' not in second.query(['ROOTNAME', 'EXPSTART'], EXPTYPE='ACQ/IMAGE')
+
+            first.ingest()
+
+            # After ingestion, the new data has been "used up" and the stored data is re-queried
+            third = make_datamodel(AcqDataModel)
+
+            assert third.new_data.empty
+            assert len(third.query(['ROOTNAME'])) == 9
+
+        assert not RUN_CACHE.active
+
+
+class TestNewDataDiscovery:
+
+    @pytest.fixture(autouse=True)
+    def find_calls(self, monkeypatch):
+        calls = []
+        get_new_data = AcqDataModel.get_new_data
+
+        def counted(model):
+            calls.append(model)
+
+            return get_new_data(model)
+
+        monkeypatch.setattr(AcqDataModel, 'get_new_data', counted)
+
+        return calls
+
+    def test_lazy(self, make_datamodel, find_calls):
+        model = make_datamodel(AcqDataModel)
+
+        # Nothing is found until the new data is used, and then only once
+        assert not find_calls
+        assert len(model.new_data) == 9
+        assert len(model.new_data) == 9
+        assert len(find_calls) == 1
+
+    def test_history_only(self, make_datamodel, find_calls, monkeypatch):
+        monkeypatch.setattr(AcqDataModel, 'history_only', True)
+        model = make_datamodel(AcqDataModel)
+
+        assert model.new_data is None
+        assert not find_calls
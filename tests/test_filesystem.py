@@ -14,10 +14,20 @@ from cosmo.filesystem import (
     JitterFileData,
     find_files,
     get_exposure_data,
-    get_jitter_data
+    get_jitter_data,
+    iter_data_from_exposures,
+    iter_data_from_jitters
 )
 
 
+def keep_ld_rootname(filedata):
+    return filedata['ROOTNAME'] if filedata['ROOTNAME'].startswith('ld') else None
+
+
+def first_extension(rows):
+    return rows[:1]
+
+
 @pytest.fixture(scope='class')
 def file_data(data_dir):
     file = os.path.join(data_dir, 'ld1ce4dkq_lampflash.fits.gz')
@@ -341,6 +351,35 @@ class TestDataFromExposures:
         assert test_data == actual
 
 
+    def test_reducer(self, data_dir, multi_exposure_data):
+        files = find_files('*rawacq*', data_dir=data_dir, subdir_pattern=None)
+        reduced = data_from_exposures(files, header_request={0: ['ROOTNAME']}, reducer=keep_ld_rootname)
+
+        assert sorted(reduced) == sorted(
+            filedata['ROOTNAME'] for filedata in multi_exposure_data if filedata['ROOTNAME'].startswith('ld')
+        )
+
+
+class TestIterDataFromExposures:
+
+    def test_data_collection(self, data_dir, multi_exposure_data):
+        files = find_files('*rawacq*', data_dir=data_dir, subdir_pattern=None)
+        streamed = list(iter_data_from_exposures(files, header_request={0: ['ROOTNAME']}))
+
+        assert sorted(filedata['ROOTNAME'] for filedata in streamed) == sorted(
+            filedata['ROOTNAME'] for filedata in multi_exposure_data
+        )
+
+    def test_chunks(self, data_dir):
+        files = find_files('*rawacq*', data_dir=data_dir, subdir_pattern=None)
+        streamed = iter_data_from_exposures(files, header_request={0: ['ROOTNAME']}, chunksize=4)
+
+        # Results are returned in the order of the files
+        assert [filedata['ROOTNAME'] for filedata in streamed] == [
+            filedata['ROOTNAME'] for filedata in data_from_exposures(files, header_request={0: ['ROOTNAME']})
+        ]
+
+
 class TestGetJitterData:
 
     def test_length(self, jitter_data):
@@ -364,3 +403,23 @@ class TestDataFromJitters:
     def test_data(self, multi_jitter_data):
         for data in multi_jitter_data:
             assert 'PROPOSID' in data and 'EXPNAME' in data
+
+
+    def test_reducer(self, data_dir):
+        files = find_files('*jit*', data_dir=data_dir, subdir_pattern=None)
+        reduced = data_from_jitters(files, ext_header_keys=['EXPNAME'], get_expstart=False, reducer=first_extension)
+
+        assert len(reduced) == len(files)
+
+
+class TestIterDataFromJitters:
+
+    def test_length(self, data_dir):
+        files = find_files('*jit*', data_dir=data_dir, subdir_pattern=None)
+        streamed = list(
+            iter_data_from_jitters(
+                files, primary_header_keys=['PROPOSID'], ext_header_keys=['EXPNAME'], get_expstart=False
+            )
+        )
+
+        assert len(streamed) == 6
@@ -1,8 +1,13 @@
 import pytest
 import pandas as pd
 import numpy as np
+import datetime
 
-from cosmo.monitor_helpers import convert_day_of_year, fit_line, explode_df, absolute_time, create_visibility, v2v3
+from cosmo.monitor_helpers import (
+    convert_day_of_year, EventCalendar, fit_line, fit_lines, RaggedArray, explode_df, explode_ragged, absolute_time,
+    absolute_datetime, ragged_absolute_datetime, create_visibility, v2v3, QuantileSketch, SignedQuantileSketch,
+    mjd_to_byear
+)
 
 
 @pytest.fixture(params=[2017.301, '2017.301'])
@@ -25,6 +30,33 @@ class TestConvertDayofYear:
             convert_day_of_year(bad_date)
 
 
+class TestEventCalendar:
+
+    @pytest.fixture
+    def calendar(self):
+        return EventCalendar(
+            {'first': 2011.172, 'second': '2013.205', 'third': datetime.datetime(2014, 2, 24)},
+            {'group': [(None, 2011.172), (2011.172, 2013.205), (2014.055, None)]}
+        )
+
+    def test_conversions(self, calendar):
+        assert calendar.names == ['first', 'second', 'third']
+        assert calendar.mjd_of('first') == convert_day_of_year(2011.172).mjd
+        assert calendar.datetime_of('third') == datetime.datetime(2014, 2, 24)
+        assert calendar.byear[1] == pytest.approx(convert_day_of_year('2013.205').byear)
+        assert calendar.datetime64.dtype == np.dtype('datetime64[ns]')
+
+    def test_assign_epochs(self, calendar):
+        mjd = [
+            calendar.mjd_of('first') - 1,
+            calendar.mjd_of('first') + 1,
+            calendar.mjd_of('second') + 1,  # Between epochs
+            calendar.mjd_of('third') + 1
+        ]
+
+        assert calendar.assign_epochs('group', mjd).tolist() == [0, 1, -1, 2]
+
+
 class TestFitLine:
 
     def test_simple_fit(self):
@@ -43,6 +75,47 @@ class TestFitLine:
             fit_line(test_x, test_y)
 
 
+class TestFitLines:
+
+    @pytest.fixture
+    def points(self):
+        x = np.array([2010., 2011., 2012., 2013., 2010., 2011., 2012.])
+        y = np.array([1., 3., 5., 7., 0., -1., -2.])
+        groups = np.array(['a', 'a', 'a', 'a', 'b', 'b', 'b'])
+
+        return x, y, groups
+
+    def test_grouped(self, points):
+        x, y, groups = points
+        fits = fit_lines(x, y, groups)
+
+        assert fits.slope['a'] == pytest.approx(2)
+        assert fits.slope['b'] == pytest.approx(-1)
+        assert fits.intercept['b'] == pytest.approx(2010)
+        assert fits.line == pytest.approx(y)
+
+    def test_matches_polyfit(self, points):
+        x, y, _ = points
+        weights = np.array([1., 2., 1., 3., 1., 1., 2.])
+
+        fits = fit_lines(x, y, weights=weights)
+        expected = np.polyfit(x, y, 1, w=np.sqrt(weights))  # polyfit weights are applied to the residuals
+
+        assert fits.slope[0] == pytest.approx(expected[0])
+        assert fits.intercept[0] == pytest.approx(expected[1])
+
+    def test_windows(self, points):
+        x, y, groups = points
+        expanding = fit_lines(x, y, groups, window='expanding')
+        rolling = fit_lines(x, y + np.array([0., 0., 0., 10., 0., 0., 0.]), groups, window=2)
+
+        assert np.isnan(expanding.slope[0]) and np.isnan(expanding.slope[4])  # A single point has no fit
+        assert expanding.slope[1:4] == pytest.approx(2)
+        assert expanding.slope[5:] == pytest.approx(-1)
+        assert rolling.slope[2] == pytest.approx(2)
+        assert rolling.slope[3] == pytest.approx(12)
+
+
 @pytest.fixture
 def test_df():
     return pd.DataFrame({'a': 1, 'b': [[1, 2, 3]]})
@@ -68,6 +141,114 @@ class TestExplodeDf:
         with pytest.raises(ValueError):
             explode_df(test_df, ['b', 'c'])
 
+    def test_carried_columns(self):
+        test_df = pd.DataFrame(
+            {'a': [1, 2], 'b': [np.array([1., 2.]), np.array([3.])], 'c': ['x', 'y'], 'd': pd.Categorical(['u', 'v'])}
+        )
+
+        exploded = explode_df(test_df, ['b'], columns=['a', 'd'])
+
+        assert list(exploded.columns) == ['b', 'a', 'd']
+        assert exploded.a.tolist() == [1, 1, 2]
+        assert exploded.b.tolist() == [1., 2., 3.]
+        assert exploded.a.dtype == test_df.a.dtype and exploded.d.dtype == test_df.d.dtype
+
+
+class TestRaggedArray:
+
+    @pytest.fixture
+    def ragged(self):
+        return RaggedArray.from_arrays([np.array([1., 2., 4.]), np.array([]), np.array([5., 7.])])
+
+    def test_rows(self, ragged):
+        assert len(ragged) == 3
+        assert ragged.lengths.tolist() == [3, 0, 2]
+        assert ragged[2].tolist() == [5., 7.]
+        assert ragged.flat.base is ragged.values or ragged.flat is ragged.values  # No copy for contiguous rows
+
+    def test_from_json(self, ragged):
+        from_json = RaggedArray.from_json(['[1.0, 2.0, 4.0]', '[]', '[5.0, 7.0]'])
+
+        assert from_json.lengths.tolist() == ragged.lengths.tolist()
+        assert from_json.flat.tolist() == ragged.flat.tolist()
+
+    def test_offset_operations(self, ragged):
+        dropped = ragged.drop_first()
+
+        assert dropped.values is ragged.values
+        assert dropped.lengths.tolist() == [2, 0, 1]
+        assert dropped.flat.tolist() == [2., 4., 7.]
+        assert dropped.row_ids.tolist() == [0, 0, 2]
+
+        nonempty = RaggedArray.from_arrays([np.array([1., 2., 4.]), np.array([5., 7.])])
+        assert nonempty.subtract_first().flat.tolist() == [0., 1., 3., 0., 2.]
+
+        # Empty rows don't have a first element, wherever they are
+        assert nonempty.first().tolist() == [1., 5.]
+        assert ragged.subtract_first().flat.tolist() == [0., 1., 3., 0., 2.]
+
+        for empty_row in [ragged, RaggedArray.from_arrays([np.array([1.]), np.array([])])]:
+            with pytest.raises(ValueError):
+                empty_row.first()
+
+    def test_explode(self, ragged):
+        df = pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z']})
+        exploded = explode_ragged(df, {'values': ragged.drop_first()})
+
+        assert exploded.values.tolist() == [[2., 1, 'x'], [4., 1, 'x'], [7., 3, 'z']]
+        assert [series.tolist() for series in ragged.to_series()] == [[1., 2., 4.], [], [5., 7.]]
+
+        with pytest.raises(ValueError):
+            explode_ragged(df, {'values': ragged, 'dropped': ragged.drop_first()})
+
+    def test_match(self, ragged):
+        keys = RaggedArray.from_arrays([np.array(['a', 'b', 'a']), np.array(['a']), np.array(['b', 'c'])])
+
+        # Rows 0 and 2 have a value for each key; row 1 doesn't have values, and 'd' isn't a key of row 2
+        matched = ragged.match(keys, [0, 0, 1, 2, 2, 2], ['a', 'b', 'a', 'b', 'c', 'd'], default=0.)
+
+        assert matched.tolist() == [1., 2., 0., 5., 7., 0.]
+        assert ragged.match(keys, [], []).size == 0
+
+
+class TestQuantileSketch:
+
+    @pytest.fixture
+    def values(self):
+        rng = np.random.default_rng(0)
+
+        return np.concatenate([rng.lognormal(-12, 1, 20000), np.zeros(1000)])
+
+    def test_quantiles(self, values):
+        sketch = QuantileSketch(alpha=0.01).add(values)
+        quantiles = [0.5, 0.95, 0.99]
+
+        assert np.allclose(sketch.quantile(quantiles), np.quantile(values, quantiles), rtol=0.02)
+        assert sketch.quantile(0.01) == 0  # The zeros are counted
+        assert sketch.count == len(values)
+        assert sketch.mean == pytest.approx(values.mean())
+        assert sketch.std == pytest.approx(values.std(ddof=1))
+        assert (sketch.min, sketch.max) == (values.min(), values.max())
+
+    def test_merge(self, values):
+        merged = QuantileSketch().add(values[:5000]).merge(QuantileSketch().add(values[5000:]))
+        single = QuantileSketch().add(values)
+
+        assert np.array_equal(merged.counts, single.counts) and merged.zero_count == single.zero_count
+        assert merged.std == pytest.approx(single.std)
+
+    def test_json(self, values):
+        sketch = QuantileSketch().add(values)
+        loaded = QuantileSketch.from_json(sketch.to_json())
+
+        assert loaded.quantile(0.9) == sketch.quantile(0.9)
+        assert np.array_equal(loaded.histogram(10)[0], sketch.histogram(10)[0])
+        assert np.isnan(QuantileSketch.from_json(QuantileSketch().to_json()).quantile(0.5))
+
+    def test_negative_fails(self):
+        with pytest.raises(ValueError):
+            QuantileSketch().add([-1.])
+
 
 ABSTIME_BAD_INPUT = [
     (pd.DataFrame({'EXPSTART': [58484.0, 58485.0, 58486.0], }), None, None, AttributeError),
@@ -107,6 +288,30 @@ def good_input(request):
     return request.param
 
 
+class TestSignedQuantileSketch:
+
+    def test_statistics(self):
+        values = np.random.default_rng(0).normal(0.2, 1, 10000)
+        sketch = SignedQuantileSketch().add(values[:4000]).merge(SignedQuantileSketch().add(values[4000:]))
+
+        assert sketch.count == len(values)
+        assert sketch.mean == pytest.approx(values.mean())
+        assert sketch.std == pytest.approx(values.std(ddof=1))
+        assert (sketch.min, sketch.max) == (values.min(), values.max())
+
+        # Quantiles on either side of zero are within the relative accuracy of the buckets
+        for q in [0.01, 0.25, 0.75, 0.99]:
+            assert sketch.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.03)
+
+    def test_json(self):
+        sketch = SignedQuantileSketch().add([-2., -1., 0., 1., 3.])
+        restored = SignedQuantileSketch.from_json(sketch.to_json())
+
+        assert restored.count == 5
+        assert restored.quantile(0.5) == sketch.quantile(0.5) == 0
+        assert restored.min == -2 and restored.max == 3
+
+
 class TestAbsoluteTime:
 
     def test_ingest_fails(self, bad_input):
@@ -119,6 +324,38 @@ class TestAbsoluteTime:
         df, expstart, time, time_key = good_input
         absolute_time(df=df, expstart=expstart, time=time, time_key=time_key)
 
+    def test_datetime_ingest_fails(self, bad_input):
+        df, expstart, time, error = bad_input
+
+        with pytest.raises(error):
+            absolute_datetime(df=df, expstart=expstart, time=time)
+
+    def test_datetime_matches(self, good_input):
+        df, expstart, time, time_key = good_input
+
+        expected = absolute_time(df=df, expstart=expstart, time=time, time_key=time_key).to_datetime()
+        result = absolute_datetime(df=df, expstart=expstart, time=time, time_key=time_key)
+
+        assert result.dtype == np.dtype('datetime64[ns]')
+        assert (np.abs(result - expected.astype('datetime64[ns]')) < np.timedelta64(1, 'ms')).all()
+
+    def test_ragged(self):
+        expstart = [58484.0, 58485.5]
+        times = [np.array([0., 60.]), np.array([30.])]
+
+        result = ragged_absolute_datetime(expstart, times)
+
+        assert len(result) == 2
+        assert result[0].tolist() == absolute_datetime(expstart=58484.0, time=times[0]).tolist()
+        assert result[1][0] == np.datetime64('2019-01-02T12:00:30')
+
+    def test_byear(self):
+        from astropy.time import Time
+
+        mjd = np.array([55000.25, 58484., 59500.75])
+
+        assert np.allclose(mjd_to_byear(mjd), Time(mjd, format='mjd').byear, rtol=0, atol=1e-9)
+
 
 class TestCreateVisibility:
 
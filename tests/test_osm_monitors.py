@@ -1,13 +1,16 @@
 import os
 import pytest
+import numpy as np
+import pandas as pd
 
 from cosmo.monitors.osm_drift_monitors import FUVOSMDriftMonitor, NUVOSMDriftMonitor
 
 from cosmo.monitors.osm_shift_monitors import (
-    FuvOsmShift1Monitor, FuvOsmShift2Monitor, NuvOsmShift1Monitor, NuvOsmShift2Monitor
+    FuvOsmShift1Monitor, FuvOsmShift2Monitor, NuvOsmShift1Monitor, NuvOsmShift2Monitor, join_segment_diff
 )
 
 from cosmo.monitors.data_models import OSMDataModel
+from cosmo.monitors.osm_views import derive_segment_diffs
 from cosmo.sms import SMSFinder
 
 
@@ -90,3 +93,41 @@ class TestOsmShiftMonitors:
                     f'{self.osmshiftmonitor._filename}-outliers.csv'
                 )
             )
+
+
+class TestSegmentDiff:
+
+    def test_diff(self):
+        segments = ['FUVB', 'FUVA', 'FUVA', 'FUVA', 'FUVB', 'FUVB', 'FUVA']
+        flashes = pd.DataFrame({
+            'ROOTNAME': ['b', 'b', 'a', 'a', 'a', 'a', 'c'],
+            'SEGMENT': segments,
+            'FLASH': [0, 0, 0, 1, 0, 1, 0],
+            'EXPSTART': [58001., 58001., 58000., 58000., 58000., 58000., 58002.],
+            'TIME': [0., 0., 0., 100., 0., 100., 0.],
+            'SHIFT_DISP': [1., 4., 10., 20., 3., 5., 7.],
+            'SHIFT_XDISP': np.zeros(7),
+            'FP_PIXEL_SHIFT': [0., 1., 1., 1., 0., 0., 1.],
+            'DETECTOR': 'FUV',
+            'hover_text': [f'a<br>SEGMENT          {segment}' for segment in segments]
+        })
+
+        diffs = derive_segment_diffs(flashes)
+
+        # Flashes are matched for each rootname; c doesn't have FUVB
+        assert sorted(zip(diffs.ROOTNAME, diffs.FLASH, diffs.SHIFT_DISP_DIFF)) == [
+            ('a', 0, 7.), ('a', 1, 15.), ('b', 0, 3.)
+        ]
+        assert (diffs.SEGMENT1 == 'FUVA').all() and (diffs.SEGMENT2 == 'FUVB').all()
+
+        result = join_segment_diff(flashes, diffs, 'SHIFT_DISP', 'FUVA', 'FUVB')
+
+        assert result.sort_values(['ROOTNAME', 'FLASH']).seg_diff.tolist() == [7., 15., 3.]
+        assert (result.hover_text == 'a').all()
+        assert result.set_index(['ROOTNAME', 'FLASH']).lamp_time['a', 1] == np.datetime64('2017-09-04T00:01:40')
+        assert 'SEGMENT' not in result
+
+        fp_corrected = join_segment_diff(flashes, diffs, 'SHIFT_DISP', 'FUVA', 'FUVB', fp_corrected=True)
+        assert fp_corrected.sort_values(['ROOTNAME', 'FLASH']).seg_diff.tolist() == [6., 14., 2.]
+
+        assert join_segment_diff(flashes, diffs, 'SHIFT_DISP', 'FUVA', 'NUVA') is None